@@ -1,27 +1,101 @@
 import logging
-from typing import Dict, List, Optional, TYPE_CHECKING
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, TYPE_CHECKING
 
 from desertbot.ircbase import ModeType
+from desertbot.utils.casemapping import CaseMappedDict
 
 if TYPE_CHECKING:
     from desertbot.desertbot import DesertBot
     from desertbot.user import IRCUser
 
 
+class ChannelSets(object):
+    """
+    The distinct sets of channels that a bot's users are in, so every user in the same channels shares one tuple.
+    Like rank strings there are far fewer of them than users. Each set counts the users in it and is dropped
+    when the last of them leaves, so it never keeps a channel the bot has left alive.
+    """
+    def __init__(self):
+        # the channels, in any order -> the tuple shared by the users in them
+        self.sets: Dict[FrozenSet['IRCChannel'], Tuple['IRCChannel', ...]] = {}
+        # shared tuple -> how many users have it
+        self.userCounts: Dict[Tuple['IRCChannel', ...], int] = {}
+
+    def move(self, user: 'IRCUser', channels: Tuple['IRCChannel', ...]) -> None:
+        """
+        Sets the channels the user is in, to the tuple shared by everyone else in exactly those channels.
+        """
+        userCounts = self.userCounts
+        old = user.channels
+        if old:
+            count = userCounts.get(old, 0) - 1
+            if count > 0:
+                userCounts[old] = count
+            else:
+                userCounts.pop(old, None)
+                self.sets.pop(frozenset(old), None)
+        if channels:
+            channels = self.sets.setdefault(frozenset(channels), channels)
+            userCounts[channels] = userCounts.get(channels, 0) + 1
+        user.channels = channels
+
+
 class IRCChannel(object):
+    __slots__ = ('name', 'bot', 'modes', 'users', 'ranks', 'topic', 'topicSetter', 'topicTimestamp',
+                 'creationTime', 'userlistComplete', '__weakref__')
+
+    # shared by all channels, rather than registering a logger per channel that never goes away
+    logger = logging.getLogger('desertbot.core.channel')
+
     def __init__(self, name: str, bot: 'DesertBot'):
-        self.logger = logging.getLogger('desertbot.core.{}'.format(name))
         self.name = name
         self.bot = bot
         self.modes = {}
-        self.users = {}
-        self.ranks = {}
+        self.users = CaseMappedDict(bot.supportHelper.caseMapping)
+        self.ranks = CaseMappedDict(bot.supportHelper.caseMapping)
         self.topic = None
         self.topicSetter = None
         self.topicTimestamp = 0
         self.creationTime = 0
         self.userlistComplete = True
 
+    def addUser(self, user: 'IRCUser', ranks: str = '') -> None:
+        self.users[user.nick] = user
+        self.ranks[user.nick] = sys.intern(ranks)
+        if self not in user.channels:
+            self.bot.channelSets.move(user, user.channels + (self,))
+
+    def addUsers(self, members: Iterable[Tuple['IRCUser', str]]) -> None:
+        """
+        Adds a whole NAMES burst worth of (user, ranks) at once.
+        """
+        users = self.users
+        ranks = self.ranks
+        intern = sys.intern
+        move = self.bot.channelSets.move
+        for user, userRanks in members:
+            users[user.nick] = user
+            ranks[user.nick] = intern(userRanks)
+            if self not in user.channels:
+                move(user, user.channels + (self,))
+
+    def removeUser(self, nick: str) -> None:
+        user = self.users.pop(nick)
+        del self.ranks[nick]
+        self.bot.channelSets.move(user, tuple(channel for channel in user.channels if channel is not self))
+
+    def renameUser(self, oldNick: str, newNick: str) -> None:
+        self.users[newNick] = self.users.pop(oldNick)
+        self.ranks[newNick] = self.ranks.pop(oldNick)
+
+    def clearUsers(self) -> None:
+        move = self.bot.channelSets.move
+        for user in self.users.values():
+            move(user, tuple(channel for channel in user.channels if channel is not self))
+        self.users.clear()
+        self.ranks.clear()
+
     def setModes(self, modes: str, params: List) -> Optional[Dict]:
         adding = True
         supportedChanModes = self.bot.supportHelper.chanModes
@@ -36,7 +110,8 @@ class IRCChannel(object):
             elif mode == "-":
                 adding = False
             elif mode not in supportedChanModes and mode not in supportedStatuses:
-                self.logger.warning('Received unknown MODE char {} in MODE string {}'.format(mode, modes))
+                self.logger.warning('Received unknown MODE char {} in MODE string {} for channel {}'
+                                    .format(mode, modes, self.name))
                 # We received a mode char that's unknown to use, so we abort parsing to prevent desync.
                 return None
             elif mode in supportedStatuses:
@@ -48,11 +123,12 @@ class IRCChannel(object):
                     self.logger.warning("Received status MODE for unknown user {} in channel {}.".format(user, self.name))
                 else:
                     if adding:
-                        self.ranks[user] += mode
+                        # rank strings are interned, as there are only ever a handful of distinct ones
+                        self.ranks[user] = sys.intern(self.ranks[user] + mode)
                         modesAdded.append(mode)
                         paramsAdded.append(user)
                     elif not adding and mode in self.ranks[user]:
-                        self.ranks[user] = self.ranks[user].replace(mode, "")
+                        self.ranks[user] = sys.intern(self.ranks[user].replace(mode, ""))
                         modesRemoved.append(mode)
                         paramsRemoved.append(user)
             elif supportedChanModes[mode] == ModeType.LIST:
@@ -1,34 +1,347 @@
+import contextlib
 import json
+import logging
 import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from twisted.internet import reactor, threads
+from twisted.python.failure import Failure
+
+
+class _TrackedDict(dict):
+    """
+    A dict that tells its owner (the DataStore, or the part of one it's in) when it's changed,
+    so in-place changes to nested data get saved too.
+    Anything put in it is converted to tracked containers with the same owner.
+    Changes are made while holding the store's lock, so a save never sees one half made.
+    """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner, items):
+        dict.__init__(self, items)
+        self._owner = owner
+
+    def __setitem__(self, key, value):
+        value = _track(self._owner, value)
+        with self._owner.lock:
+            dict.__setitem__(self, key, value)
+            self._owner.markDirty()
+
+    def __delitem__(self, key):
+        with self._owner.lock:
+            dict.__delitem__(self, key)
+            self._owner.markDirty()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __reduce_ex__(self, protocol):
+        # copies (and pickles) are plain dicts, they don't belong to the store
+        return dict, (dict(self),)
+
+    def clear(self):
+        with self._owner.lock:
+            dict.clear(self)
+            self._owner.markDirty()
+
+    def pop(self, *args):
+        with self._owner.lock:
+            value = dict.pop(self, *args)
+            self._owner.markDirty()
+            return value
+
+    def popitem(self):
+        with self._owner.lock:
+            item = dict.popitem(self)
+            self._owner.markDirty()
+            return item
+
+    def setdefault(self, key, default=None):
+        with self._owner.lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        items = {key: _track(self._owner, value) for key, value in dict(*args, **kwargs).items()}
+        with self._owner.lock:
+            dict.update(self, items)
+            self._owner.markDirty()
+
+
+class _TrackedList(list):
+    """
+    A list that tells its owner when it's changed, see _TrackedDict.
+    """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner, items):
+        list.__init__(self, items)
+        self._owner = owner
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [_track(self._owner, item) for item in value]
+        else:
+            value = _track(self._owner, value)
+        with self._owner.lock:
+            list.__setitem__(self, index, value)
+            self._owner.markDirty()
+
+    def __delitem__(self, index):
+        with self._owner.lock:
+            list.__delitem__(self, index)
+            self._owner.markDirty()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, count):
+        with self._owner.lock:
+            list.__imul__(self, count)
+            self._owner.markDirty()
+        return self
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+    def append(self, value):
+        value = _track(self._owner, value)
+        with self._owner.lock:
+            list.append(self, value)
+            self._owner.markDirty()
+
+    def extend(self, values):
+        values = [_track(self._owner, value) for value in values]
+        with self._owner.lock:
+            list.extend(self, values)
+            self._owner.markDirty()
+
+    def insert(self, index, value):
+        value = _track(self._owner, value)
+        with self._owner.lock:
+            list.insert(self, index, value)
+            self._owner.markDirty()
+
+    def pop(self, *args):
+        with self._owner.lock:
+            value = list.pop(self, *args)
+            self._owner.markDirty()
+            return value
+
+    def remove(self, value):
+        with self._owner.lock:
+            list.remove(self, value)
+            self._owner.markDirty()
+
+    def clear(self):
+        with self._owner.lock:
+            list.clear(self)
+            self._owner.markDirty()
+
+    def sort(self, *args, **kwargs):
+        with self._owner.lock:
+            list.sort(self, *args, **kwargs)
+            self._owner.markDirty()
+
+    def reverse(self):
+        with self._owner.lock:
+            list.reverse(self)
+            self._owner.markDirty()
+
+
+def _track(owner, value: Any) -> Any:
+    """
+    Returns the value with every dict and list in it swapped for a tracked copy belonging to the given owner.
+    Containers that already belong to it are returned as they are.
+    """
+    if isinstance(value, (_TrackedDict, _TrackedList)) and value._owner == owner:
+        return value
+    if isinstance(value, dict):
+        return _TrackedDict(owner, ((key, _track(owner, item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return _TrackedList(owner, (_track(owner, item) for item in value))
+    return value
+
+
+class _DetachedOwner(object):
+    """
+    Owns the tracked containers taken out of a store (deleted, popped, or left behind by a reload),
+    so changing them afterwards doesn't mark anything dirty.
+    """
+    lock = contextlib.nullcontext()
+
+    def markDirty(self):
+        pass
+
+
+_detached = _DetachedOwner()
+
+
+def _detach(value: Any) -> None:
+    """
+    Hands every tracked container in the value over to _detached.
+    """
+    if isinstance(value, _TrackedDict):
+        value._owner = _detached
+        for item in value.values():
+            _detach(item)
+    elif isinstance(value, _TrackedList):
+        value._owner = _detached
+        for item in value:
+            _detach(item)
+
+
+# active is set on the persistence service's thread while it writes a batch of stores
+backgroundSaving = threading.local()
+
+
+# stands in for a missing value where None could be a real one
+_missing = object()
+
+
+def _snapshot(value: Any) -> Any:
+    """
+    Returns a copy of the value's dicts and lists, sharing everything else (which JSON data can't change in place).
+    Taken under the store's lock, it's a consistent view of the data that can be encoded after the lock is let go.
+    """
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_snapshot(item) for item in value]
+    return value
+
+
+def syncDirectory(path: str) -> None:
+    """
+    Fsyncs a directory, so files renamed into it are still there after a crash.
+    """
+    directory = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
 
 
 class DataStore(object):
-    def __init__(self, storagePath, defaultsPath):
+    """
+    A module's JSON data file, loaded into memory.
+
+    Changes aren't written straight away. Setting, deleting or changing anything in the store
+    (including inside the dicts and lists it holds) marks it dirty, and flush() writes it once it's been
+    left alone for flushDelay seconds, or once it's been dirty for maxFlushDelay seconds if it never is,
+    so a burst of changes costs one write instead of one per change.
+    Values put in the store are copied into tracked containers, so keep using the ones read back out of it.
+
+    Handlers change the store from the dispatch threads while it's saved from another one. Every change is
+    made while holding the store's lock, which saving only holds while it copies the data, encoding and
+    writing the copy after letting go, so saves see every change either whole or not at all without holding
+    anything up for long. Reading never takes the lock. To make several changes that should be saved together,
+    hold the lock while making them:
+        with self.storage.lock:
+            self.storage['count'] += 1
+            self.storage['entries'].append(entry)
+    """
+    def __init__(self, storagePath, defaultsPath, flushDelay: float = 5.0, maxFlushDelay: float = 60.0):
         self.storagePath = storagePath
         self.defaultsPath = defaultsPath
-        self.data = {}
+        self.flushDelay = flushDelay
+        self.maxFlushDelay = maxFlushDelay
+        # called with the store whenever it goes from having no unsaved changes to having some, from any thread
+        self.onDirty: Optional[Callable[['DataStore'], None]] = None
+        # held while changing the data, and while save takes its copy of it
+        self.lock = threading.RLock()
+        # held for the whole of a save, so the store is never written from two threads at once
+        self.saveLock = threading.RLock()
+        self.data = _track(self, {})
+        self.dirty = False
+        # when the first unsaved change was made, and the latest one
+        self.dirtySince = 0.0
+        self.lastChange = 0.0
+        # how many times the data was written to disk, and how long that took in total
+        self.saveCount = 0
+        self.saveSeconds = 0.0
         self.load()
 
     def load(self):
+        data = {}
         # if a file data/defaults/<module>.json exists, it has priority on load
         if os.path.exists(self.defaultsPath):
             with open(self.defaultsPath) as storageFile:
-                self.data = json.load(storageFile)
+                data = json.load(storageFile)
         # if not, use data/<network>/<module>.json instead
         elif os.path.exists(self.storagePath):
             with open(self.storagePath) as storageFile:
-                self.data = json.load(storageFile)
+                data = json.load(storageFile)
         # if there's nothing, make sure the folder at least exists for the server-specific data files
         else:
             os.makedirs(os.path.dirname(self.storagePath), exist_ok=True)
+        with self.lock:
+            for value in self.data.values():
+                _detach(value)
+            self.data = _track(self, data)
+            self.dirty = False
 
-    def save(self):
-        # don't save empty files, to keep the data directories from filling up with pointless files
-        if len(self.data) != 0:
-            tmpFile = f"{self.storagePath}.tmp"
-            with open(tmpFile, "w") as storageFile:
-                storageFile.write(json.dumps(self.data, indent=4))
-            os.rename(tmpFile, self.storagePath)
+    def save(self, sync: bool = True):
+        """
+        Writes the data to disk. If sync is set, it's fsynced before it replaces the old file.
+        Syncing the directory it's in, so the replacement itself survives a crash, is left to the caller.
+        """
+        with self.saveLock:
+            start = time.perf_counter()
+            with self.lock:
+                # clear the flag with the copy taken, so anything changed after it gets written next time
+                self.dirty = False
+                data = _snapshot(self.data)
+            # don't save empty files, to keep the data directories from filling up with pointless files,
+            # unless there's a file already that would otherwise keep the last thing removed from the store
+            if len(data) != 0 or os.path.exists(self.storagePath):
+                tmpFile = f"{self.storagePath}.tmp"
+                try:
+                    with open(tmpFile, "w") as storageFile:
+                        storageFile.write(json.dumps(data, indent=4))
+                        if sync:
+                            storageFile.flush()
+                            os.fsync(storageFile.fileno())
+                    os.rename(tmpFile, self.storagePath)
+                except Exception:
+                    self.markDirty()
+                    raise
+                self.saveCount += 1
+                self.saveSeconds += time.perf_counter() - start
+
+    def markDirty(self):
+        now = time.monotonic()
+        self.lastChange = now
+        if not self.dirty:
+            self.dirtySince = now
+            self.dirty = True
+            if self.onDirty is not None:
+                self.onDirty(self)
+
+    def isDue(self, now: float) -> bool:
+        """
+        Returns whether the store has unsaved changes that should be written by now (a time.monotonic() value).
+        """
+        return self.dirty and (now - self.lastChange >= self.flushDelay or now - self.dirtySince >= self.maxFlushDelay)
+
+    def flush(self, force: bool = False, sync: bool = True) -> bool:
+        """
+        Writes the data to disk if it has unsaved changes that are due to be written (or any at all, if forced).
+        Returns whether it wrote anything.
+        """
+        if not self.dirty or not (force or self.isDue(time.monotonic())):
+            return False
+        self.save(sync)
+        return True
+
+    def close(self):
+        pass
 
     def __len__(self):
         return len(self.data)
@@ -41,13 +354,13 @@ class DataStore(object):
 
     def __setitem__(self, key, value):
         self.data[key] = value
-        self.save()
- 
+
     def __contains__(self, key):
         return key in self.data
 
     def __delitem__(self, key):
-        del self.data[key]
+        with self.lock:
+            _detach(self.data.pop(key))
 
     def items(self):
         return self.data.items()
@@ -62,6 +375,403 @@ class DataStore(object):
         return self.data.get(key, defaultValue)
 
     def pop(self, key):
-        data = self.data.pop(key)
+        with self.lock:
+            value = self.data.pop(key)
+            _detach(value)
+            return value
+
+
+class _KeyOwner(object):
+    """
+    Owns the tracked containers under one key of a _KeyedDataStore, so changing them marks only that key dirty.
+    """
+    __slots__ = ('store', 'key')
+
+    def __init__(self, store: '_KeyedDataStore', key: str):
+        self.store = store
+        self.key = key
+
+    def __eq__(self, other):
+        return isinstance(other, _KeyOwner) and other.store is self.store and other.key == self.key
+
+    def __hash__(self):
+        return hash((id(self.store), self.key))
+
+    @property
+    def lock(self):
+        return self.store.lock
+
+    def markDirty(self):
+        self.store.markKeyDirty(self.key)
+
+
+class _KeyedDataStore(DataStore):
+    """
+    A DataStore that keeps track of which of its top level keys changed since it was last saved,
+    for backends that save keys one by one. They implement _write to save the changed and deleted keys.
+    """
+    def __init__(self, storagePath, defaultsPath, flushDelay: float = 5.0, maxFlushDelay: float = 60.0):
+        self.logger = logging.getLogger('desertbot.datastore')
+        self.dirtyKeys = set()
+        self.deletedKeys = set()
+        super(_KeyedDataStore, self).__init__(storagePath, defaultsPath, flushDelay, maxFlushDelay)
+
+    def _reset(self) -> None:
+        for value in self.data.values():
+            _detach(value)
+        self.data = {}
+        self.dirtyKeys = set()
+        self.deletedKeys = set()
+        self.dirty = False
+
+    def _track(self, key: str, value: Any) -> Any:
+        return _track(_KeyOwner(self, key), value)
+
+    def save(self, sync: bool = True):
+        with self.saveLock:
+            start = time.perf_counter()
+            dirtyKeys, deletedKeys = set(), set()
+            try:
+                with self.lock:
+                    dirtyKeys, deletedKeys = self.dirtyKeys, self.deletedKeys
+                    self.dirtyKeys, self.deletedKeys = set(), set()
+                    self.dirty = False
+                    if not dirtyKeys and not deletedKeys:
+                        return
+                    # only the keys being written are copied, and only if they're still in the store
+                    changed = {key: _snapshot(self.data[key]) for key in dirtyKeys if key in self.data}
+                self._write(changed, deletedKeys, sync)
+            except Exception:
+                with self.lock:
+                    # leave out keys deleted since, and keys deleted then but set again since
+                    self.dirtyKeys |= (dirtyKeys - self.deletedKeys) & self.data.keys()
+                    self.deletedKeys |= deletedKeys - self.dirtyKeys
+                    self.markDirty()
+                raise
+            self.saveCount += 1
+            self.saveSeconds += time.perf_counter() - start
+
+    def _write(self, changed: Dict[str, Any], deleted: Set[str], sync: bool) -> None:
+        raise NotImplementedError
+
+    def markKeyDirty(self, key: str) -> None:
+        with self.lock:
+            # a container can outlive its key, if it was read out before the key was deleted
+            if key not in self.data:
+                return
+            self.dirtyKeys.add(key)
+            self.markDirty()
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = self._track(key, value)
+            self.deletedKeys.discard(key)
+            self.markKeyDirty(key)
+
+    def __delitem__(self, key):
+        with self.lock:
+            _detach(self.data.pop(key))
+            self.dirtyKeys.discard(key)
+            self.deletedKeys.add(key)
+            self.markDirty()
+
+    def pop(self, key):
+        with self.lock:
+            value = self[key]
+            del self[key]
+            return value
+
+
+class SQLiteDataStore(_KeyedDataStore):
+    """
+    A module's data kept in a SQLite database next to where its JSON file would be (<module>.db),
+    with one row per top level key holding that key's value as JSON.
+
+    Values are only read from the database when they're first used, and flushing only writes the keys
+    that changed, so a module with lots of data under lots of keys (eg. a list of quotes per channel)
+    doesn't have to hold all of it in memory, or rewrite all of it to save one change.
+    The first time a module's database is made, whatever is in its JSON file is imported into it.
+    """
+    def __init__(self, storagePath, defaultsPath, flushDelay: float = 5.0, maxFlushDelay: float = 60.0):
+        self.databasePath = f"{os.path.splitext(storagePath)[0]}.db"
+        self.connection = None
+        # set once the store is closed, after which it's never written again
+        self.closed = False
+        # the connection is shared by saves and reads of keys that haven't been used yet.
+        # it has its own lock, so handlers changing the data never wait on the database
+        self.connectionLock = threading.Lock()
+        # every key in the store, in the order they were added (the values are unused)
+        self.storedKeys: Dict[str, None] = {}
+        super(SQLiteDataStore, self).__init__(storagePath, defaultsPath, flushDelay, maxFlushDelay)
+
+    def _connect(self):
+        self.connection = sqlite3.connect(self.databasePath, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # in WAL mode this can only lose the last few commits on power loss, never corrupt the database
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS store (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def load(self):
+        with self.saveLock, self.lock:
+            self._disconnect()
+            # values are read from the database as they're needed
+            self._reset()
+            self.storedKeys = {}
+            # data/defaults/<module>.json still has priority on load
+            if os.path.exists(self.defaultsPath):
+                with open(self.defaultsPath) as storageFile:
+                    for key, value in json.load(storageFile).items():
+                        self.data[key] = self._track(key, value)
+                        self.storedKeys[key] = None
+            elif os.path.exists(self.databasePath):
+                self._connect()
+                self.storedKeys = dict.fromkeys(row[0] for row in
+                                                self.connection.execute('SELECT key FROM store ORDER BY rowid'))
+            elif os.path.exists(self.storagePath):
+                self.importJSON(self.storagePath)
+            else:
+                os.makedirs(os.path.dirname(self.storagePath), exist_ok=True)
+
+    def importJSON(self, jsonPath: str) -> None:
+        """
+        Copies everything from the given JSON data file into the database, which is made if it doesn't exist.
+        The JSON file is left as it was.
+        """
+        with open(jsonPath) as storageFile:
+            imported = json.load(storageFile)
+        with self.lock:
+            for key, value in imported.items():
+                self[key] = value
         self.save()
+        self.logger.info(f"Imported {len(imported)} keys from {jsonPath} into {self.databasePath}")
+
+    def _write(self, changed: Dict[str, Any], deleted: Set[str], sync: bool) -> None:
+        # in WAL mode with synchronous=NORMAL, commits are only synced at checkpoints, whatever sync says
+        rows = [(key, json.dumps(value)) for key, value in changed.items()]
+        with self.connectionLock:
+            if self.connection is None:
+                self._connect()
+            with self.connection:
+                self.connection.executemany('INSERT INTO store (key, value) VALUES (?, ?) '
+                                            'ON CONFLICT (key) DO UPDATE SET value = excluded.value', rows)
+                self.connection.executemany('DELETE FROM store WHERE key = ?', [(key,) for key in deleted])
+
+    def save(self, sync: bool = True):
+        with self.saveLock:
+            # a batch the persistence service queued before the store was unloaded mustn't open the database again
+            if self.closed:
+                return
+            super(SQLiteDataStore, self).save(sync)
+
+    def _disconnect(self) -> None:
+        with self.connectionLock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def close(self):
+        # waits for a save that's under way to finish
+        with self.saveLock:
+            self.closed = True
+            self._disconnect()
+
+    def _fetch(self, key: str) -> Any:
+        value = self.data.get(key, _missing)
+        if value is not _missing:
+            return value
+        if key not in self.storedKeys:
+            raise KeyError(key)
+        with self.connectionLock:
+            row = self.connection.execute('SELECT value FROM store WHERE key = ?', (key,)).fetchone()
+        value = self._track(key, json.loads(row[0])) if row is not None else _missing
+        with self.lock:
+            # the key can only have been set or deleted since by going through the store
+            if key in self.data:
+                return self.data[key]
+            if key not in self.storedKeys or value is _missing:
+                raise KeyError(key)
+            self.data[key] = value
+            return value
+
+    def __len__(self):
+        return len(self.storedKeys)
+
+    def __iter__(self):
+        return iter(self.storedKeys)
+
+    def __getitem__(self, item):
+        return self._fetch(item)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super(SQLiteDataStore, self).__setitem__(key, value)
+            self.storedKeys[key] = None
+
+    def __contains__(self, key):
+        return key in self.storedKeys
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.storedKeys[key]
+            # it might never have been read
+            _detach(self.data.pop(key, None))
+            self.dirtyKeys.discard(key)
+            self.deletedKeys.add(key)
+            self.markDirty()
+
+    def items(self):
+        return [(key, self._fetch(key)) for key in list(self.storedKeys)]
+
+    def values(self):
+        return [self._fetch(key) for key in list(self.storedKeys)]
+
+    def keys(self):
+        return self.storedKeys.keys()
+
+    def get(self, key, defaultValue=None):
+        try:
+            return self._fetch(key)
+        except KeyError:
+            return defaultValue
+
+
+class JournalDataStore(_KeyedDataStore):
+    """
+    A module's data kept in its JSON file as before, plus a journal (<module>.journal) that changes are appended to.
+
+    Flushing appends one compact line per changed (or deleted) top level key to the journal instead of rewriting
+    the JSON file, and loading replays the journal over the JSON file. Once the journal outgrows the JSON file,
+    it's set aside and folded into a new JSON file in a thread, while new changes go to a fresh journal.
+    Since the JSON file is only ever rewritten from files on disk, compacting never touches the data in memory,
+    and a crash can only lose the line being appended, which loading skips.
+    """
+    # the journal is compacted once it's bigger than the JSON file, or this many bytes, whichever's larger
+    minCompactSize = 64 * 1024
+
+    def __init__(self, storagePath, defaultsPath, flushDelay: float = 5.0, maxFlushDelay: float = 60.0):
+        basePath = os.path.splitext(storagePath)[0]
+        self.journalPath = f"{basePath}.journal"
+        # the journal being folded into the JSON file, if it's being compacted (or a compaction was interrupted)
+        self.compactingPath = f"{basePath}.journal.compacting"
+        self.journalSize = 0
+        self.snapshotSize = 0
+        self.compacting = False
+        super(JournalDataStore, self).__init__(storagePath, defaultsPath, flushDelay, maxFlushDelay)
+
+    def load(self):
+        with self.saveLock, self.lock:
+            self._reset()
+            # data/defaults/<module>.json still has priority on load
+            if os.path.exists(self.defaultsPath):
+                with open(self.defaultsPath) as storageFile:
+                    data = json.load(storageFile)
+            else:
+                data = self._replay()
+                os.makedirs(os.path.dirname(self.storagePath), exist_ok=True)
+                self._trimJournal()
+            self.data = {key: self._track(key, value) for key, value in data.items()}
+            self.snapshotSize = os.path.getsize(self.storagePath) if os.path.exists(self.storagePath) else 0
+            self.journalSize = os.path.getsize(self.journalPath) if os.path.exists(self.journalPath) else 0
+
+    def _replay(self, journalPaths=None) -> Dict[str, Any]:
+        """
+        Returns the data in the JSON file, with the given journals (or all of them) applied in order.
+        """
+        data = {}
+        if os.path.exists(self.storagePath):
+            with open(self.storagePath) as storageFile:
+                data = json.load(storageFile)
+        for journalPath in journalPaths or (self.compactingPath, self.journalPath):
+            if not os.path.exists(journalPath):
+                continue
+            with open(journalPath, encoding='utf-8') as journalFile:
+                for lineNumber, line in enumerate(journalFile, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # only the last line can be cut short, by a crash while it was being written
+                        self.logger.warning(f"Skipping unreadable line {lineNumber} of {journalPath}")
+                        continue
+                    if record[0] == 'set':
+                        data[record[1]] = record[2]
+                    else:
+                        data.pop(record[1], None)
         return data
+
+    def _trimJournal(self) -> None:
+        # cut off a line left half written by a crash, or the next line appended would be joined onto it
+        if not os.path.exists(self.journalPath) or os.path.getsize(self.journalPath) == 0:
+            return
+        with open(self.journalPath, 'rb+') as journalFile:
+            journalFile.seek(-1, os.SEEK_END)
+            if journalFile.read(1) != b'\n':
+                journalFile.seek(0)
+                journalFile.truncate(journalFile.read().rfind(b'\n') + 1)
+
+    def _write(self, changed: Dict[str, Any], deleted: Set[str], sync: bool) -> None:
+        lines = [json.dumps(['set', key, value], separators=(',', ':')) for key, value in changed.items()]
+        lines.extend(json.dumps(['del', key], separators=(',', ':')) for key in deleted)
+        # written as bytes, so the journal's size is counted the same way as the JSON file's it's compared with
+        journalBytes = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open(self.journalPath, 'ab') as journalFile:
+            journalFile.write(journalBytes)
+            if sync:
+                journalFile.flush()
+                os.fsync(journalFile.fileno())
+        self.journalSize += len(journalBytes)
+        if self.journalSize >= max(self.snapshotSize, self.minCompactSize) and not self.compacting:
+            self._startCompaction()
+
+    def _startCompaction(self) -> None:
+        self.compacting = True
+        # the persistence service's thread is only there to write stores, so it can just get on with it.
+        # anywhere else (the reactor, or a handler saving directly on the dispatch pool) it's handed to the reactor's
+        # thread pool, unless the reactor isn't running to do that
+        if getattr(backgroundSaving, 'active', False) or not reactor.running:
+            try:
+                self.compact()
+            except Exception:
+                self._compactionFailed(Failure())
+        else:
+            reactor.callFromThread(self._deferCompaction)
+
+    def _deferCompaction(self) -> None:
+        d = threads.deferToThread(self.compact)
+        d.addErrback(self._compactionFailed)
+
+    def compact(self) -> None:
+        """
+        Folds the journal into the JSON file. Safe to call from any thread, changes can carry on being saved meanwhile.
+        """
+        # appending to the journal holds this too, so nothing's appended to it while it's being moved
+        with self.saveLock:
+            self.compacting = True
+            # if a compaction was interrupted, finish that one first, the journal will get its turn next time
+            if not os.path.exists(self.compactingPath):
+                if not os.path.exists(self.journalPath):
+                    self.compacting = False
+                    return
+                os.rename(self.journalPath, self.compactingPath)
+                self.journalSize = 0
+        try:
+            data = self._replay([self.compactingPath])
+            tmpFile = f"{self.storagePath}.tmp"
+            with open(tmpFile, "w") as storageFile:
+                storageFile.write(json.dumps(data, indent=4))
+                storageFile.flush()
+                os.fsync(storageFile.fileno())
+            os.rename(tmpFile, self.storagePath)
+            syncDirectory(os.path.dirname(self.storagePath))
+            # replaying the set-aside journal again is harmless if this doesn't happen, every line is idempotent
+            os.unlink(self.compactingPath)
+            self.snapshotSize = os.path.getsize(self.storagePath)
+        finally:
+            self.compacting = False
+
+    def _compactionFailed(self, failure: Failure) -> None:
+        self.logger.error(f"Compacting {self.journalPath} failed",
+                          exc_info=(failure.type, failure.value, failure.getTracebackObject()))
+
+
+# the classes for the storage_backend config setting
+storageBackends = {'json': DataStore, 'sqlite': SQLiteDataStore, 'journal': JournalDataStore}
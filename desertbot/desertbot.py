@@ -1,18 +1,25 @@
 import logging
 import os
+import re
 from datetime import datetime
 from typing import Dict, Optional, List, TYPE_CHECKING
-from weakref import WeakValueDictionary
 
 from twisted.internet import reactor
 from twisted.internet.interfaces import ISSLTransport
+from twisted.internet.protocol import connectionDone
+from twisted.python.failure import Failure
+from twisted.python.threadable import isInIOThread
 
+from desertbot.channel import ChannelSets
 from desertbot.config import Config
 from desertbot.input import InputHandler
 from desertbot.ircbase import IRCBase
 from desertbot.modulehandler import ModuleHandler
 from desertbot.output import OutputHandler
+from desertbot.protocoltrace import ProtocolTrace
+from desertbot.sendqueue import SendQueue
 from desertbot.support import ISupport
+from desertbot.utils.casemapping import CaseMappedDict, CaseMappedWeakValueDict
 from desertbot.utils.string import isNumber
 
 if TYPE_CHECKING:
@@ -27,10 +34,15 @@ class DesertBot(IRCBase, object):
         self.config = config
         self.input = InputHandler(self)
         self.output = OutputHandler(self)
+        self.sendQueue = SendQueue(self)
+        traceSize = self.config.getWithDefault('protocol_trace_size', 200)
+        self.protocolTrace = ProtocolTrace(traceSize) if traceSize > 0 else None
         self.supportHelper = ISupport()
-        self.channels = {}
+        self.channels = CaseMappedDict(self.supportHelper.caseMapping)
         self.userModes = {}
-        self.users = WeakValueDictionary()
+        self.users = CaseMappedWeakValueDict(self.supportHelper.caseMapping)
+        # the channel tuples shared by the users, see IRCChannel
+        self.channelSets = ChannelSets()
         self.loggedIn = False
         self.secureConnection = False
         self.quitting = False
@@ -71,11 +83,25 @@ class DesertBot(IRCBase, object):
         reactor.addSystemEventTrigger('before', 'shutdown', self.cleanup)
 
         self.moduleHandler = ModuleHandler(self)
+        # modules that load in a thread or asynchronously carry on warming up while we connect
         self.moduleHandler.loadAll()
 
         # set start time after modules have loaded, some take a while
         self.startTime = datetime.utcnow()
 
+    @property
+    def nick(self) -> Optional[str]:
+        return self._nick
+
+    @nick.setter
+    def nick(self, nick: Optional[str]) -> None:
+        self._nick = nick
+        # matches messages addressed to us by name, eg: "DesertBot: help"
+        if nick:
+            self.nickMatcher = re.compile('{}[:,]?'.format(re.escape(nick)), re.IGNORECASE)
+        else:
+            self.nickMatcher = None
+
     def cleanup(self) -> None:
         if self.config.getWithDefault("save_on_exit", True):
             self.config.writeConfig()
@@ -114,21 +140,42 @@ class DesertBot(IRCBase, object):
         self.output.cmdNICK(self.nick)
         self.output.cmdUSER(self.ident, self.gecos)
 
+    def lineReceived(self, data: bytes) -> None:
+        if self.protocolTrace is not None:
+            self.protocolTrace.received(data)
+        IRCBase.lineReceived(self, data)
+
     def handleCommand(self, command: str, params: List[str],
                       prefix: str, tags: Dict[str, Optional[str]]) -> None:
-        self.logger.debug('IN: {} {} {} {}'.format(tags, prefix, command, ' '.join(params)))
+        # formatting these is expensive enough to matter on every line, so only do it if it'll be logged
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('IN: {} {} {} {}'.format(tags, prefix, command, ' '.join(params)))
         if isNumber(command):
             self.input.handleNumeric(command, prefix, params, tags)
         else:
             self.input.handleCommand(command, prefix, params, tags)
 
     def sendMessage(self, command, *parameter_list, **prefix):
-        self.logger.debug('OUT: {} {}'.format(command, ' '.join(parameter_list)))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('OUT: {} {}'.format(command, ' '.join(parameter_list)))
         IRCBase.sendMessage(self, command, *parameter_list, **prefix)
 
+    def sendLine(self, line: str) -> None:
+        self.sendQueue.enqueue(line)
+
+    def connectionLost(self, reason: Failure = connectionDone) -> None:
+        self.sendQueue.clear()
+        IRCBase.connectionLost(self, reason)
+
     def disconnect(self, reason: str = '') -> None:
+        if not isInIOThread():
+            reactor.callFromThread(self.disconnect, reason)
+            return
         self.quitting = True
+        # get anything still waiting in the send queue out before we quit
+        self.sendQueue.flush()
         self.output.cmdQUIT(reason)
+        self.sendQueue.flush()
         self.transport.loseConnection()
 
     def setUserModes(self, modes: str) -> Optional[Dict]:
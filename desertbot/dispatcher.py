@@ -0,0 +1,300 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+from twisted.internet import defer, reactor, task, threads
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+from twisted.python.threadable import isInIOThread
+from twisted.python.threadpool import ThreadPool
+
+if TYPE_CHECKING:
+    from desertbot.desertbot import DesertBot
+
+
+class DispatchJob(object):
+    def __init__(self, lane: str, callback: Callable, func: Callable, args: tuple, kw: Dict[str, Any]):
+        self.lane = lane
+        self.callback = callback
+        self.func = func
+        self.args = args
+        self.kw = kw
+        self.queuedAt = time.monotonic()
+        # (action name, handler, when it started, when its budget runs out) for the handler the job is running,
+        # set by the worker thread and read by the watchdog
+        self.current = None
+        # the longest budget of the handlers that returned Deferreds or coroutines, which the lane waits on
+        self.responseBudget = None
+        # set once the watchdog has given up waiting on the job
+        self.abandoned = False
+
+
+class DispatchEngine(object):
+    """
+    Runs message handlers on a dedicated, bounded pool of worker threads.
+
+    Every job belongs to a lane (a channel name, or a nick for private messages).
+    Jobs within a lane run strictly one after the other, in the order they arrived,
+    and a lane only moves on once the previous job's responses have been sent.
+    Different lanes run in parallel, up to the configured number of workers.
+
+    A watchdog checks every second for handlers that have run past their time budget.
+    Threads can't be killed, so it stops waiting on the job instead: the lane moves on,
+    the job's eventual result is thrown away, and the pool gets an extra thread until the stuck one comes back,
+    so a few runaway commands can't slowly use up all of the workers.
+    """
+    def __init__(self, bot: 'DesertBot'):
+        self.bot = bot
+        self.logger = logging.getLogger('desertbot.dispatcher')
+
+        self.workers = max(1, bot.config.getWithDefault('dispatch_workers', 10))
+        self.queueLimit = bot.config.getWithDefault('dispatch_queue_limit', 500)
+        self.overflowPolicy = bot.config.getWithDefault('dispatch_overflow', 'reject')
+        if self.overflowPolicy not in ('reject', 'drop'):
+            self.logger.warning('Unknown dispatch_overflow policy {!r}, falling back to reject'
+                                .format(self.overflowPolicy))
+            self.overflowPolicy = 'reject'
+
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=self.workers, name='desertbot-dispatch')
+        reactor.callWhenRunning(self.threadpool.start)
+        reactor.addSystemEventTrigger('during', 'shutdown', self.threadpool.stop)
+
+        # lane -> pending jobs, for every lane that is queued or running
+        self.lanes = {}
+        # lanes with pending jobs that are waiting for a free worker, in FIFO order
+        self.readyLanes = deque()
+        self.queued = 0
+        self.busy = 0
+
+        self.dispatched = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.maxWait = 0.0
+        self.recentWaits = deque(maxlen=1000)
+
+        self.timeout = bot.config.getWithDefault('handler_timeout', 30)
+        self.timeouts = bot.config.getWithDefault('handler_timeouts', {})
+        # (action name, handler) -> its budget in seconds, so the overrides aren't looked up on every call
+        self.budgets = {}
+        self.local = threading.local()
+        # jobs currently on a worker thread
+        self.running = set()
+        # extra threads the pool has been given to make up for abandoned jobs that are still running
+        self.compensation = 0
+        self.overruns = 0
+        self.watchdog = task.LoopingCall(self._checkOverruns)
+        reactor.callWhenRunning(self.watchdog.start, 1.0, now=False)
+
+    def dispatch(self, lane: str, callback: Callable, func: Callable, *args: Any, **kw: Any) -> bool:
+        """
+        Queues func(*args, **kw) to run on a worker thread in the given lane.
+        callback is called on the reactor thread with the result, and may return a Deferred,
+        in which case the lane waits for it before starting its next job.
+        Returns False if the job was rejected because the queue is full.
+        """
+        if not isInIOThread():
+            reactor.callFromThread(self.dispatch, lane, callback, func, *args, **kw)
+            return True
+
+        if self.queueLimit and self.queued >= self.queueLimit:
+            if self.overflowPolicy != 'drop' or not self._dropOldest():
+                self.rejected += 1
+                self.logger.warning('Dispatch queue full ({} jobs queued), rejected job for {}'
+                                    .format(self.queued, lane))
+                return False
+
+        job = DispatchJob(lane, callback, func, args, kw)
+        if lane in self.lanes:
+            self.lanes[lane].append(job)
+        else:
+            self.lanes[lane] = deque([job])
+            self.readyLanes.append(lane)
+        self.queued += 1
+
+        self._pump()
+        return True
+
+    def _dropOldest(self) -> bool:
+        # drop the oldest waiting job of the lane with the most waiting jobs,
+        # so one flooded channel doesn't starve all the others
+        longestLane = None
+        longestLength = 0
+        for lane, jobs in self.lanes.items():
+            if len(jobs) > longestLength:
+                longestLane = lane
+                longestLength = len(jobs)
+        if longestLane is None:
+            return False
+
+        job = self.lanes[longestLane].popleft()
+        self.queued -= 1
+        self.dropped += 1
+        if not self.lanes[longestLane] and longestLane in self.readyLanes:
+            self.readyLanes.remove(longestLane)
+            del self.lanes[longestLane]
+        self.logger.warning('Dispatch queue full, dropped a job for {} that waited {:.2f}s'
+                            .format(longestLane, time.monotonic() - job.queuedAt))
+        return True
+
+    def _pump(self) -> None:
+        while self.readyLanes and self.busy < self.workers:
+            lane = self.readyLanes.popleft()
+            job = self.lanes[lane].popleft()
+            self.queued -= 1
+            self._recordWait(time.monotonic() - job.queuedAt)
+
+            self.busy += 1
+            self.dispatched += 1
+            self.running.add(job)
+            d = threads.deferToThreadPool(reactor, self.threadpool, self._runJob, job)
+            d.addBoth(self._workerFinished, job)
+
+    def _runJob(self, job: DispatchJob) -> Any:
+        self.local.job = job
+        try:
+            return job.func(*job.args, **job.kw)
+        finally:
+            self.local.job = None
+
+    def _workerFinished(self, result: Any, job: DispatchJob) -> Optional[Deferred]:
+        if job.abandoned:
+            # the watchdog already moved the lane on, so all that's left is to take back the extra thread
+            self.compensation -= 1
+            self.threadpool.adjustPoolsize(maxthreads=self.workers + self.compensation)
+            self.logger.warning('Abandoned job for {} finished {:.1f}s after it was queued, discarding its result'
+                                .format(job.lane, time.monotonic() - job.queuedAt))
+            return None
+
+        # the thread is free again, even if the lane is still waiting on the job's responses
+        self.running.discard(job)
+        self.busy -= 1
+        self._pump()
+
+        d = defer.fail(result) if isinstance(result, Failure) else defer.succeed(result)
+        d.addCallback(self._runCallback, job)
+        d.addErrback(self.bot.moduleHandler._deferredError)
+        d.addBoth(self._laneFinished, job.lane)
+        return d
+
+    def _runCallback(self, result: Any, job: DispatchJob) -> Any:
+        d = job.callback(result)
+        # the handlers returned Deferreds or coroutines, and the lane waits on those too, for as long as the
+        # handlers that returned them were allowed.
+        # those can be cancelled for real, which also stops any web requests they're waiting on
+        timeout = job.responseBudget or self.timeout
+        if isinstance(d, Deferred) and timeout:
+            d.addTimeout(timeout, reactor, onTimeoutCancel=lambda _, timeout: self._responsesOverran(job, timeout))
+        return d
+
+    def watch(self, actionName: str, handler: Callable) -> Optional[Tuple[DispatchJob, Optional[tuple]]]:
+        """
+        Called on a worker thread when the job running on it is about to call the given handler.
+        Starts the handler's budget, and returns what unwatch needs to put back the job's current handler
+        from before once the handler returns.
+        Returns None if the thread isn't running a job or the handler has no budget.
+        """
+        job = getattr(self.local, 'job', None)
+        if job is None:
+            return None
+        budget = self.budgets.get((actionName, handler))
+        if budget is None:
+            budget = self._budget(actionName, handler)
+        if not budget:
+            return None
+        outer = job.current
+        now = time.monotonic()
+        job.current = (actionName, handler, now, now + budget)
+        return job, outer, now, budget
+
+    def unwatch(self, watched: Tuple[DispatchJob, Optional[tuple], float, float], returnedAsync: bool) -> None:
+        """
+        Called on the worker thread once a handler that watch gave a budget to has returned.
+        returnedAsync says whether it returned a Deferred or coroutine, which then gets the same budget.
+        """
+        job, outer, started, budget = watched
+        if returnedAsync and budget > (job.responseBudget or 0):
+            job.responseBudget = budget
+        if outer is not None:
+            # the handler had a budget of its own, which can be longer than the one of the handler that ran it,
+            # so the time it took doesn't count against that one
+            actionName, handler, outerStarted, deadline = outer
+            outer = (actionName, handler, outerStarted, deadline + time.monotonic() - started)
+        job.current = outer
+
+    def _budget(self, actionName: str, handler: Callable) -> float:
+        # a module's budget is more specific than its action's, which is more specific than the default
+        moduleName = type(getattr(handler, '__self__', handler)).__name__
+        budget = self.timeouts.get(moduleName, self.timeouts.get(actionName, self.timeout))
+        self.budgets[(actionName, handler)] = budget
+        return budget
+
+    def _checkOverruns(self) -> None:
+        now = time.monotonic()
+        for job in list(self.running):
+            current = job.current
+            if current is not None and now > current[3]:
+                self._abandon(job, current, now)
+
+    def _abandon(self, job: DispatchJob, current: tuple, now: float) -> None:
+        actionName, handler, started, deadline = current
+        job.abandoned = True
+        self.running.discard(job)
+        self.busy -= 1
+        self.overruns += 1
+        if self.compensation < self.workers:
+            self.compensation += 1
+            self.threadpool.adjustPoolsize(maxthreads=self.workers + self.compensation)
+        else:
+            self.logger.error('{} abandoned jobs are still running, not adding any more threads for them'
+                              .format(self.compensation))
+
+        self.bot.moduleHandler.handlerOverran(job, actionName, handler, now - started, deadline - started)
+        self._laneFinished(None, job.lane)
+
+    def _responsesOverran(self, job: DispatchJob, timeout: float) -> None:
+        self.overruns += 1
+        self.bot.moduleHandler.handlerOverran(job, None, None, timeout, timeout)
+
+    def _laneFinished(self, _: Any, lane: str) -> None:
+        if self.lanes[lane]:
+            self.readyLanes.append(lane)
+        else:
+            del self.lanes[lane]
+        self._pump()
+
+    def _recordWait(self, wait: float) -> None:
+        self.recentWaits.append(wait)
+        if wait > self.maxWait:
+            self.maxWait = wait
+
+    def laneDepth(self, lane: str) -> int:
+        if lane not in self.lanes:
+            return 0
+        return len(self.lanes[lane])
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self.recentWaits)
+        return {
+            'workers': self.workers,
+            'busy': self.busy,
+            'queued': self.queued,
+            'lanes': len(self.lanes),
+            'dispatched': self.dispatched,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'avgWait': sum(waits) / len(waits) if waits else 0.0,
+            'maxWait': self.maxWait,
+            'overruns': self.overruns,
+            'abandoned': self.compensation,
+        }
+
+    def resetStats(self) -> None:
+        self.dispatched = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.maxWait = 0.0
+        self.recentWaits.clear()
+        self.overruns = 0
+
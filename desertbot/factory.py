@@ -17,6 +17,7 @@ class DesertBotFactory(protocol.ReconnectingClientFactory):
         self.logger = logging.getLogger('desertbot.factory')
         self.exitStatus = 0
         self.connectionAttempts = 0
+        self.connectionsLost = 0
 
         self.bot = DesertBot(self, config)
         self.protocol = self.bot
@@ -47,6 +48,7 @@ class DesertBotFactory(protocol.ReconnectingClientFactory):
         return self.bot
 
     def clientConnectionLost(self, connector, reason):
+        self.connectionsLost += 1
         if not self.bot.quitting and self.connectionAttempts < 10:
             self.logger.error('Connection lost! - {}'.format(reason))
             protocol.ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
@@ -0,0 +1,90 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from desertbot.utils.histogram import LatencyHistogram
+
+
+class HandlerStats(object):
+    """
+    Times every module action handler the ModuleHandler runs, per (action, module).
+
+    Each handler gets a latency histogram for the current time window and the one before it,
+    so the numbers reflect the last one to two windows rather than everything since startup.
+    Handlers run on the dispatch pool's worker threads, so recording takes a lock,
+    but it's held only long enough to bump a few counters.
+    """
+    def __init__(self, window: float, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.windowStart = clock()
+        # (action, module) -> [current window's histogram, previous window's histogram]
+        self.histograms: Dict[Tuple[str, str], List[LatencyHistogram]] = {}
+        # (action, module) -> calls and total seconds spent in them since startup (or the last reset)
+        self.calls: Dict[Tuple[str, str], int] = {}
+        self.seconds: Dict[Tuple[str, str], float] = {}
+
+    def record(self, actionName: str, handler: Callable, duration: float) -> None:
+        # looked up on every call rather than cached by handler, which would keep unloaded modules alive
+        key = (actionName, type(getattr(handler, '__self__', handler)).__name__)
+
+        with self.lock:
+            if self.clock() - self.windowStart >= self.window:
+                self._rotate()
+            histograms = self.histograms.get(key)
+            if histograms is None:
+                histograms = [LatencyHistogram(), LatencyHistogram()]
+                self.histograms[key] = histograms
+                self.calls[key] = 0
+                self.seconds[key] = 0.0
+            histograms[0].record(duration)
+            self.calls[key] += 1
+            self.seconds[key] += duration
+
+    def _rotate(self) -> None:
+        now = self.clock()
+        # if a whole window went by with nothing recorded, the previous window is empty too
+        stale = now - self.windowStart >= self.window * 2
+        for histograms in self.histograms.values():
+            histograms[1] = LatencyHistogram() if stale else histograms[0]
+            histograms[0] = LatencyHistogram()
+        self.windowStart = now
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+            self.calls.clear()
+            self.seconds.clear()
+            self.windowStart = self.clock()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Returns the stats for every handler that ran in the last two windows, slowest (by p95) first.
+        """
+        with self.lock:
+            if self.clock() - self.windowStart >= self.window:
+                self._rotate()
+            merged = {key: histograms[0].merge(histograms[1]) for key, histograms in self.histograms.items()}
+            calls = dict(self.calls)
+            seconds = dict(self.seconds)
+
+        summary = []
+        for (actionName, moduleName), histogram in merged.items():
+            if histogram.count == 0:
+                continue
+            p50, p95, p99 = histogram.percentiles(50, 95, 99)
+            summary.append({
+                'action': actionName,
+                'module': moduleName,
+                'count': histogram.count,
+                'calls': calls[(actionName, moduleName)],
+                'seconds': seconds[(actionName, moduleName)],
+                'mean': histogram.mean,
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'max': histogram.max,
+            })
+        summary.sort(key=lambda stats: (stats['p95'], stats['max']), reverse=True)
+        return summary
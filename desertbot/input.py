@@ -1,3 +1,4 @@
+import sys
 from base64 import b64encode
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
@@ -5,6 +6,7 @@ from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 from desertbot.channel import IRCChannel
 from desertbot.ircbase import ModeType
 from desertbot.message import IRCMessage
+from desertbot.support import whoxToken
 from desertbot.user import IRCUser
 
 if TYPE_CHECKING:
@@ -14,6 +16,8 @@ if TYPE_CHECKING:
 class InputHandler(object):
     def __init__(self, bot: 'DesertBot'):
         self.bot = bot
+        # channel -> the names from a NAMES burst that hasn't ended yet
+        self.pendingNames: Dict[IRCChannel, List[str]] = {}
 
     def handleCommand(self, command: str, prefix: str, params: List[str], tags: Dict[str, Optional[str]]) -> None:
         parsedPrefix = parseUserPrefix(prefix)
@@ -157,8 +161,7 @@ class InputHandler(object):
             self.bot.channels[params[0]] = channel
         else:
             channel = self.bot.channels[params[0]]
-        channel.users[nick] = user
-        channel.ranks[nick] = ''
+        channel.addUser(user)
         message = IRCMessage('JOIN', user, channel, '', self.bot, {}, tags)
         self.handleMessage(message)
 
@@ -185,10 +188,11 @@ class InputHandler(object):
 
         # We need to run the action before we actually get rid of the user
         if kicked.nick == self.bot.nick:
+            channel.clearUsers()
+            self.pendingNames.pop(channel, None)
             del self.bot.channels[params[0]]
         else:
-            del channel.users[kicked.nick]
-            del channel.ranks[kicked.nick]
+            channel.removeUser(kicked.nick)
 
     def _handleMODE(self, nick, ident, host, params, tags):
         message = None
@@ -226,17 +230,16 @@ class InputHandler(object):
         user = self.bot.users[nick]
         newNick = params[0]
         user.nick = newNick
-        self.bot.users[newNick] = user
+        # delete first, a nick that only changes case folds to the same key
         del self.bot.users[nick]
-        for channel in self.bot.channels.values():
-            if nick in channel.users:
-                channel.users[newNick] = user
-                channel.ranks[newNick] = channel.ranks[nick]
-                del channel.users[nick]
-                del channel.ranks[nick]
+        self.bot.users[newNick] = user
+        nickChannels = list(user.channels)
+        for channel in nickChannels:
+            channel.renameUser(nick, newNick)
         if nick == self.bot.nick:
             self.bot.nick = newNick
-        message = IRCMessage('NICK', user, None, newNick, self.bot, {'oldnick': nick}, tags)
+        message = IRCMessage('NICK', user, None, newNick, self.bot,
+                             {'oldnick': nick, 'nickChannels': nickChannels}, tags)
         self.handleMessage(message)
 
     def _handleNOTICE(self, nick, ident, host, params, tags):
@@ -278,10 +281,11 @@ class InputHandler(object):
         message = IRCMessage('PART', user, channel, reason, self.bot, {}, tags)
         self.handleMessage(message)
         if nick == self.bot.nick:
+            channel.clearUsers()
+            self.pendingNames.pop(channel, None)
             del self.bot.channels[params[0]]
         else:
-            del channel.users[nick]
-            del channel.ranks[nick]
+            channel.removeUser(nick)
 
     def _handlePING(self, nick, ident, host, params, tags):
         self.bot.moduleHandler.handlePing()
@@ -332,13 +336,11 @@ class InputHandler(object):
         if len(params) > 0:
             reason = params[0]
         user = self.bot.users[nick]
-        quitChannels = [chan for _, chan in self.bot.channels.items() if nick in chan.users]
+        quitChannels = list(user.channels)
         message = IRCMessage('QUIT', user, None, reason, self.bot, {'quitChannels': quitChannels}, tags)
         self.handleMessage(message)
-        for channel in self.bot.channels.values():
-            if nick in channel.users:
-                del channel.users[nick]
-                del channel.ranks[nick]
+        for channel in quitChannels:
+            channel.removeUser(nick)
 
     def _handleTOPIC(self, nick, ident, host, params, tags):
         if params[0] not in self.bot.channels:
@@ -400,6 +402,8 @@ class InputHandler(object):
                 self.bot.supportHelper.chanModes[mode] = ModeType.PARAM_SET
             for mode in groups[3]:
                 self.bot.supportHelper.chanModes[mode] = ModeType.NO_PARAM
+        if 'CASEMAPPING' in tokens:
+            self.bot.supportHelper.caseMapping.setMapping(tokens['CASEMAPPING'] or 'rfc1459')
         if 'NETWORK' in tokens:
             self.bot.supportHelper.network = tokens['NETWORK']
         if 'PREFIX' in tokens:
@@ -440,60 +444,93 @@ class InputHandler(object):
 
     def _handleNumeric352(self, prefix, params, tags):
         # 352: RPL_WHOREPLY
-        if params[5] not in self.bot.users:
-            self.bot.logger.warning(f'Received WHO reply for unknown user {params[5]}.')
-            return
-        user = self.bot.users[params[5]]
-        user.ident = params[2]
-        user.host = params[3]
-        user.server = params[4]
-        flags = list(params[6])
-        if flags.pop(0) == 'G':
-            user.isAway = True
-        if len(flags) > 0 and flags[0] == '*':
-            user.isOper = True
-            flags.pop(0)
-        if params[1] in self.bot.channels:
-            channel = self.bot.channels[params[1]]
-            channel.ranks[params[5]] = ''
-            for status in flags:
-                channel.ranks[params[5]] += self.bot.supportHelper.statusSymbols[status]
-        hopsGecos = params[7].split()
-        user.hops = int(hopsGecos[0])
-        if len(hopsGecos) > 1:
-            user.gecos = hopsGecos[1]
-        else:
-            user.gecos = 'No info'
+        # <me> <channel> <ident> <host> <server> <nick> <flags> :<hops> <gecos>
+        hops, _, gecos = params[7].partition(' ')
+        self._updateFromWho(params[1], params[5], params[2], params[3], params[4], params[6], hops, gecos)
 
     def _handleNumeric353(self, prefix, params, tags):
         # 353: RPL_NAMREPLY
-        channel = self.bot.channels[params[2]]
-        if channel.userlistComplete:
+        # the names are only collected here, the whole burst is added to the channel at once on 366
+        channel = self.bot.channels.get(params[2])
+        if channel is None:
+            return
+        if channel.userlistComplete or channel not in self.pendingNames:
             channel.userlistComplete = False
-            channel.users.clear()
-            channel.ranks.clear()
-        for userPrefix in params[3].split():
-            parsedPrefix = parseUserPrefix(userPrefix)
-            nick = parsedPrefix[0]
-            ranks = ''
-            while nick[0] in self.bot.supportHelper.statusSymbols:
-                ranks += self.bot.supportHelper.statusSymbols[nick[0]]
-                nick = nick[1:]
-            if nick in self.bot.users:
-                user = self.bot.users[nick]
-                user.ident = parsedPrefix[1]
-                user.host = parsedPrefix[2]
-            else:
-                user = IRCUser(nick, parsedPrefix[1], parsedPrefix[2])
-                self.bot.users[nick] = user
-            channel.users[nick] = user
-            channel.ranks[nick] = ranks
+            self.pendingNames[channel] = []
+        self.pendingNames[channel].extend(params[3].split())
+
+    def _handleNumeric354(self, prefix, params, tags):
+        # 354: RPL_WHOSPCRPL, the WHOX reply to OutputHandler.cmdWHO
+        # <me> <token> <channel> <ident> <host> <server> <nick> <flags> <hops> <account> :<gecos>
+        if params[1] != whoxToken or len(params) < 11:
+            return
+        user = self._updateFromWho(params[2], params[6], params[3], params[4], params[5], params[7], params[8],
+                                   params[10])
+        if user is not None:
+            user.account = params[9] if params[9] != '0' else None
+
+    def _updateFromWho(self, chanName: str, nick: str, ident: str, host: str, server: str, flags: str, hops: str,
+                       gecos: str) -> Optional[IRCUser]:
+        user = self.bot.users.get(nick)
+        if user is None:
+            self.bot.logger.warning(f'Received WHO reply for unknown user {nick}.')
+            return None
+        user.ident = ident
+        user.host = host
+        user.server = server
+        user.hops = int(hops) if hops.isdigit() else 0
+        user.gecos = gecos or 'No info'
+        # flags are H(ere) or G(one), then * for opers, then the user's status symbols in the channel
+        user.isAway = flags[:1] == 'G'
+        user.isOper = flags[1:2] == '*'
+        # only the ranks of users already in the channel are updated, joining it is left to JOIN and NAMES
+        channel = self.bot.channels.get(chanName)
+        if channel is not None and nick in channel.users:
+            statusSymbols = self.bot.supportHelper.statusSymbols
+            channel.ranks[nick] = sys.intern(''.join([statusSymbols[flag] for flag in flags[1:]
+                                                      if flag in statusSymbols]))
+        return user
 
     def _handleNumeric366(self, prefix, params, tags):
         # 366: RPL_ENDOFNAMES
-        channel = self.bot.channels[params[1]]
+        channel = self.bot.channels.get(params[1])
+        if channel is None:
+            return
+        names = self.pendingNames.pop(channel, None)
+        if names is not None:
+            self._addNames(channel, names)
         channel.userlistComplete = True
 
+    def _addNames(self, channel: IRCChannel, names: List[str]) -> None:
+        # this can be tens of thousands of names for big channels or netjoins, so it's kept tight
+        users = self.bot.users
+        statusSymbols = self.bot.supportHelper.statusSymbols
+        symbolChars = ''.join(statusSymbols)
+        members = []
+        for name in names:
+            nick = name.lstrip(symbolChars)
+            if len(nick) == len(name):
+                ranks = ''
+            else:
+                ranks = ''.join([statusSymbols[symbol] for symbol in name[:len(name) - len(nick)]])
+            # with userhost-in-names, the names are full nick!ident@host prefixes
+            ident = host = None
+            if '!' in nick:
+                nick, _, userHost = nick.partition('!')
+                ident, _, host = userHost.partition('@')
+            if not nick:
+                continue
+            user = users.get(nick)
+            if user is None:
+                user = IRCUser(nick, ident, host)
+                users[nick] = user
+            elif ident is not None:
+                user.ident = ident
+                user.host = host
+            members.append((user, ranks))
+        channel.clearUsers()
+        channel.addUsers(members)
+
     def _handleNumeric401(self, prefix, params, tags):
         # This is assuming the numeric is even sent to begin with, which some unsupported IRCds don't even seem to do.
         if params[0] == 'CAP':
@@ -26,6 +26,7 @@ ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 """
+import re
 import unicodedata
 from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple, Union
@@ -40,56 +41,72 @@ class ModeType(Enum):
     NO_PARAM = 3
 
 
+# IRCv3 message tag value escapes; any other escaped character is itself,
+# and a lone trailing backslash is dropped
+_tagEscape = re.compile(r"\\(.?)", re.DOTALL)
+_tagUnescapes = {
+    "\\": "\\",
+    ":": ";",
+    "r": "\r",
+    "n": "\n",
+    "s": " ",
+}
+
+
+def _unescapeTagChar(match: "re.Match") -> str:
+    char = match.group(1)
+    return _tagUnescapes.get(char, char)
+
+
 # Taken from txircd:
 # https://github.com/ElementalAlchemist/txircd/blob/26dd2ee9d21b846cbd33cd5bd6e8abe7df712034/txircd/ircbase.py
 class IRCBase(LineOnlyReceiver):
     delimiter = b"\n"  # Default to splitting by \n, and then we'll also split \r in the handler
+    linesReceived = 0
 
     def lineReceived(self, data: bytes) -> None:
         for lineRaw in data.split(b"\r"):
+            if not lineRaw:
+                continue
+            self.linesReceived += 1
             line = lineRaw.decode("utf-8", "replace")
-            line = unicodedata.normalize("NFC", line)
+            # pure ASCII lines are always already NFC, which is the vast majority of traffic
+            if not line.isascii():
+                line = unicodedata.normalize("NFC", line)
             command, params, prefix, tags = self._parseLine(line)
             if command:
                 self.handleCommand(command, params, prefix, tags)
 
     def _parseLine(self, line: str) -> Union[Tuple[str, List[str], str, Dict[str, Optional[str]]], Tuple[None, None, None, None]]:
-        line = line.replace("\0", "")
+        if "\0" in line:
+            line = line.replace("\0", "")
         if not line:
             return None, None, None, None
 
         if line[0] == "@":
-            if " " not in line:
+            tagLine, space, line = line.partition(" ")
+            if not space:
                 return None, None, None, None
-            tagLine, line = line.split(" ", 1)
             tags = self._parseTags(tagLine[1:])
         else:
             tags = {}
 
         prefix = None
-        if line[0] == ":":
-            if " " not in line:
+        if line and line[0] == ":":
+            prefix, space, line = line.partition(" ")
+            if not space:
                 return None, None, None, None
-            prefix, line = line.split(" ", 1)
             prefix = prefix[1:]
 
-        if " :" in line:
-            linePart, lastParam = line.split(" :", 1)
-        else:
-            linePart = line
-            lastParam = None
+        linePart, trailing, lastParam = line.partition(" :")
         if not linePart:
             return None, None, None, None
 
-        if " " in linePart:
-            command, paramLine = linePart.split(" ", 1)
-            params = paramLine.split(" ")
-        else:
-            command = linePart
-            params = []
-        while "" in params:
-            params.remove("")
-        if lastParam is not None:
+        command, _, paramLine = linePart.partition(" ")
+        params = paramLine.split(" ") if paramLine else []
+        if "" in params:
+            params = [param for param in params if param]
+        if trailing:
             params.append(lastParam)
         return command.upper(), params, prefix, tags
 
@@ -98,35 +115,14 @@ class IRCBase(LineOnlyReceiver):
         for tagval in tagLine.split(";"):
             if not tagval:
                 continue
-            if "=" in tagval:
-                tag, escapedValue = tagval.split("=", 1)
-                escaped = False
-                valueChars = []
-                for char in escapedValue:
-                    if escaped:
-                        if char == "\\":
-                            valueChars.append("\\")
-                        elif char == ":":
-                            valueChars.append(";")
-                        elif char == "r":
-                            valueChars.append("\r")
-                        elif char == "n":
-                            valueChars.append("\n")
-                        elif char == "s":
-                            valueChars.append(" ")
-                        else:
-                            valueChars.append(char)
-                        escaped = False
-                        continue
-                    if char == "\\":
-                        escaped = True
-                        continue
-                    valueChars.append(char)
-                value = "".join(valueChars)
+            tag, equals, value = tagval.partition("=")
+            if not equals:
+                tags[tag] = None
+            elif "\\" in value:
+                tags[tag] = _tagEscape.sub(_unescapeTagChar, value)
             else:
-                tag = tagval
-                value = None
-            tags[tag] = value
+                # nothing to unescape, which is the case for nearly every tag value
+                tags[tag] = value
         return tags
 
     def handleCommand(self, command: str, params: List[str], prefix: str, tags: Dict[str, Optional[str]]) -> None:
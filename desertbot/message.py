@@ -1,6 +1,5 @@
-import re
 from enum import Enum
-from typing import Dict, Optional, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from desertbot.channel import IRCChannel
 from desertbot.user import IRCUser
@@ -15,6 +14,11 @@ class TargetTypes(Enum):
             
 
 class IRCMessage(object):
+    # 'chained' is only set on messages run by the Chain module
+    __slots__ = ('metadata', 'tags', 'type', 'messageString', 'user', 'channel', 'replyTo', 'targetType', 'chained',
+                 '_text', '_commandChar', '_nickMatcher',
+                 '_messageList', '_command', '_parameters', '_parameterList')
+
     def __init__(self, msgType: str, user: IRCUser, channel: Optional[IRCChannel], message: str, bot: 'DesertBot',
                  metadata: Dict=None, tags: Dict=None):
         if metadata is None:
@@ -29,7 +33,6 @@ class IRCMessage(object):
         else:  # Already utf-8?
             unicodeMessage = message
         self.type = msgType
-        self.messageList = unicodeMessage.strip().split(' ')
         self.messageString = unicodeMessage
         self.user = user
 
@@ -43,28 +46,92 @@ class IRCMessage(object):
             self.replyTo = channel.name
             self.targetType = TargetTypes.CHANNEL
 
-        self.command = ''
-        self.parameters = ''
-        self.parameterList = []
-
-        if len(self.messageList) == 1 and self.messageList[0] == bot.commandChar:
-            self.command = ''
-        elif self.messageList[0].startswith(bot.commandChar) and self.messageList[0][:3].count(bot.commandChar) == 1:
-            self.command = self.messageList[0][len(bot.commandChar):]
-            if self.command == '':
-                self.command = self.messageList[1]
-                self.parameters = u' '.join(self.messageList[2:])
-            else:
-                self.parameters = u' '.join(self.messageList[1:])
-        elif re.match('{}[:,]?'.format(re.escape(bot.nick)), self.messageList[0], re.IGNORECASE):
-            if len(self.messageList) > 1:
-                self.command = self.messageList[1]
-                self.parameters = u' '.join(self.messageList[2:])
-        self.command = self.command.lower()
-        if self.parameters.strip():
-            self.parameterList = self.parameters.split(' ')
-
-            self.parameterList = [param for param in self.parameterList if param != '']
-
-            if len(self.parameterList) == 1 and not self.parameterList[0]:
-                self.parameterList = []
+        # the message is only split up into a command and parameters when something asks for them,
+        # most messages are just chat that nothing ever looks at that way
+        self._text = unicodeMessage
+        self._commandChar = bot.commandChar
+        self._nickMatcher = bot.nickMatcher
+        self._messageList = None
+        self._command = None
+        self._parameters = None
+        self._parameterList = None
+
+    @property
+    def messageList(self) -> List[str]:
+        if self._messageList is None:
+            self._messageList = self._text.strip().split(' ')
+        return self._messageList
+
+    @messageList.setter
+    def messageList(self, messageList: List[str]) -> None:
+        self._messageList = messageList
+
+    @property
+    def command(self) -> str:
+        if self._command is None:
+            self._parseCommand()
+        return self._command
+
+    @command.setter
+    def command(self, command: str) -> None:
+        if self._command is None:
+            self._parseCommand()
+        self._command = command
+
+    @property
+    def parameters(self) -> str:
+        if self._command is None:
+            self._parseCommand()
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, parameters: str) -> None:
+        if self._command is None:
+            self._parseCommand()
+        self._parameters = parameters
+
+    @property
+    def parameterList(self) -> List[str]:
+        if self._command is None:
+            self._parseCommand()
+        return self._parameterList
+
+    @parameterList.setter
+    def parameterList(self, parameterList: List[str]) -> None:
+        if self._command is None:
+            self._parseCommand()
+        self._parameterList = parameterList
+
+    def _parseCommand(self) -> None:
+        command = ''
+        parameters = ''
+        parameterList = []
+
+        text = self._text.strip()
+        commandChar = self._commandChar
+        # quick check before splitting anything, most lines aren't addressed to us
+        if text.startswith(commandChar) or (self._nickMatcher is not None and self._nickMatcher.match(text)):
+            messageList = text.split(' ')
+            if self._messageList is None:
+                self._messageList = messageList
+
+            if len(messageList) == 1 and messageList[0] == commandChar:
+                command = ''
+            elif messageList[0].startswith(commandChar) and messageList[0][:3].count(commandChar) == 1:
+                command = messageList[0][len(commandChar):]
+                if command == '':
+                    command = messageList[1]
+                    parameters = u' '.join(messageList[2:])
+                else:
+                    parameters = u' '.join(messageList[1:])
+            elif self._nickMatcher is not None and self._nickMatcher.match(messageList[0]):
+                if len(messageList) > 1:
+                    command = messageList[1]
+                    parameters = u' '.join(messageList[2:])
+
+        if parameters.strip():
+            parameterList = [param for param in parameters.split(' ') if param != '']
+
+        self._command = command.lower()
+        self._parameters = parameters
+        self._parameterList = parameterList
@@ -1,19 +1,27 @@
 import importlib
 import inspect
+import itertools
 import logging
 import os
+import threading
+import time
 from enum import Enum
-from typing import Any, List, TYPE_CHECKING
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, TYPE_CHECKING
 
-from twisted.internet import reactor
-from twisted.internet import threads
+from twisted.internet import defer, reactor, threads
+from twisted.internet.defer import Deferred
 from twisted.plugin import getPlugins
+from twisted.python.failure import Failure
 from twisted.python.rebuild import rebuild
 
 import desertbot.modules
+from desertbot.dispatcher import DispatchEngine
+from desertbot.handlerstats import HandlerStats
 from desertbot.message import IRCMessage, TargetTypes
 from desertbot.moduleinterface import IModule
-from desertbot.response import ResponseType
+from desertbot.persistence import PersistenceService
+from desertbot.ratelimit import CommandRateLimiter
+from desertbot.response import IRCResponse, ResponseType
 
 if TYPE_CHECKING:
     from desertbot.desertbot import DesertBot
@@ -30,18 +38,96 @@ class ModuleHandler(object):
         self.actions = {}
         self.mappedTriggers = {}
 
-    def loadModule(self, name: str, rebuild_: bool=True) -> str:
-        for module in getPlugins(IModule, desertbot.modules):
-            if module.__class__.__name__ and module.__class__.__name__.lower() == name.lower():
-                if rebuild_:
-                    rebuild(importlib.import_module(module.__module__))
-                self._loadModuleData(module)
+        # lower case module name -> plugin, built from one getPlugins scan and only rebuilt when module files change
+        self.plugins: Optional[Dict[str, Any]] = None
+        self.pluginsStamp: Optional[FrozenSet[Tuple[str, int]]] = None
+        # module name -> seconds its last load took
+        self.loadTimes: Dict[str, float] = {}
+        # module name -> module, for modules whose onLoad is still running in a thread or asynchronously
+        self.loading: Dict[str, Any] = {}
 
-                self.logger.info('Module {} loaded'.format(module.__class__.__name__))
+        self.dispatcher = DispatchEngine(bot)
+        self.rateLimiter = CommandRateLimiter(bot)
+        self.persistence = PersistenceService(bot)
 
-                return module.__class__.__name__
+        statsWindow = bot.config.getWithDefault('handler_stats_window', 300)
+        self.handlerStats = HandlerStats(statsWindow) if statsWindow > 0 else None
+        # trigger -> times it was used, for the triggers that are mapped to a module
+        self.commandCounts: Dict[str, int] = {}
+        self.commandCountsLock = threading.Lock()
 
-    def _loadModuleData(self, module: Any) -> None:
+    def loadModule(self, name: str, rebuild_: bool=True) -> str:
+        """
+        Loads the named module, returning its name, or None if there's no such module.
+        A module that loads in a thread or has an async onLoad is only hooked into the bot once that finishes.
+        """
+        module = self._pluginIndex().get(name.lower())
+        if module is None:
+            return None
+        self._loadPlugin(module, rebuild_)
+        return module.__class__.__name__
+
+    def _loadPlugin(self, module: Any, rebuild_: bool) -> Deferred:
+        """
+        Starts loading the given plugin, returning a Deferred that fires once it has been hooked into the bot.
+        That's straight away, unless the module has loadInThread set or an async onLoad.
+        """
+        start = time.perf_counter()
+        if rebuild_:
+            pythonModule = rebuild(importlib.import_module(module.__module__))
+            self._updatePlugin(pythonModule, module.__class__.__name__)
+
+        self._prepareModule(module)
+        className = module.__class__.__name__
+        try:
+            if module.loadInThread:
+                result = threads.deferToThread(module.onLoad)
+            else:
+                result = module.onLoad()
+        except Exception:
+            self._abandonModule(module)
+            raise
+
+        if not _isAsyncResult(result):
+            self._registerModule(module, start)
+            return defer.succeed(className)
+
+        self.loading[className] = module
+        self.logger.info('Module {} is warming up'.format(className))
+        d = _toDeferred(result)
+        d.addCallback(lambda _: self._registerModule(module, start))
+        d.addErrback(lambda failure: self._loadFailed(module, failure))
+        return d
+
+    def _pluginIndex(self) -> Dict[str, Any]:
+        stamp = self._moduleFilesStamp()
+        if self.plugins is None or stamp != self.pluginsStamp:
+            self.plugins = {module.__class__.__name__.lower(): module
+                            for module in getPlugins(IModule, desertbot.modules)}
+            self.pluginsStamp = stamp
+        return self.plugins
+
+    @staticmethod
+    def _moduleFilesStamp() -> FrozenSet[Tuple[str, int]]:
+        stamp = []
+        for modulesPath in desertbot.modules.__path__:
+            for root, dirs, files in os.walk(modulesPath):
+                dirs[:] = [directory for directory in dirs if directory != '__pycache__']
+                for fileName in files:
+                    if fileName.endswith('.py'):
+                        filePath = os.path.join(root, fileName)
+                        stamp.append((filePath, os.stat(filePath).st_mtime_ns))
+        return frozenset(stamp)
+
+    def _updatePlugin(self, pythonModule: Any, className: str) -> None:
+        # rebuilding re-runs the module's code, which makes a fresh plugin instance.
+        # getPlugins would hand that one out next time, so the index does too
+        for value in vars(pythonModule).values():
+            if not isinstance(value, type) and value.__class__.__name__ == className and IModule.providedBy(value):
+                self.plugins[className.lower()] = value
+                return
+
+    def _prepareModule(self, module: Any) -> None:
         if not IModule.providedBy(module):
             raise ModuleLoaderError(module.__class__.__name__,
                                     "Module doesn't implement the module interface.",
@@ -50,10 +136,19 @@ class ModuleHandler(object):
             raise ModuleLoaderError(module.__class__.__name__,
                                     "Module is already loaded.",
                                     ModuleLoadType.LOAD)
+        if module.__class__.__name__ in self.loading:
+            raise ModuleLoaderError(module.__class__.__name__,
+                                    "Module is still loading.",
+                                    ModuleLoadType.LOAD)
 
         module.hookBot(self.bot)
         module.loadDataStore()
 
+    def _registerModule(self, module: Any, start: float) -> str:
+        # onLoad has finished by now, so the module is ready for its actions and triggers to be used
+        className = module.__class__.__name__
+        self.loading.pop(className, None)
+
         actions = {}
         for action in module.actions():
             if action[0] not in actions:
@@ -72,24 +167,36 @@ class ModuleHandler(object):
                 else:
                     self.actions[action].append(actionData)
 
-        # do this before loading actions or triggers, in case the
-        # module wants to do anything to them
-        module.onLoad()
-
         # map triggers to modules so we can call them via dict lookup
         if hasattr(module, 'triggers'):
             for trigger in module.triggers():
-                self.mappedTriggers[trigger] = module
+                self.mapTrigger(trigger, module)
 
-        className = module.__class__.__name__
         fileName = inspect.getsourcefile(module.__class__).split(os.path.sep)[-1]
         self.modules.update({className: module})
         self.fileMap.update({fileName: className})
         self.caseMap.update({className.lower(): className})
 
+        elapsed = time.perf_counter() - start
+        self.loadTimes[className] = elapsed
+        self.logger.info('Module {} loaded in {:.1f}ms'.format(className, elapsed * 1000))
+
+        return className
+
+    def _loadFailed(self, module: Any, failure: Failure) -> None:
+        self.logger.error('Exception when loading module {!r}'.format(module),
+                          exc_info=(failure.type, failure.value, failure.getTracebackObject()))
+        self._abandonModule(module)
+        self._stopIfDebug()
+
+    def _abandonModule(self, module: Any) -> None:
+        # a module that failed to load shouldn't keep saving its data
+        self.loading.pop(module.__class__.__name__, None)
+        if module.storage is not None:
+            self.persistence.unregister(module.storage)
+
     def saveAllModuleData(self) -> None:
-        for module in self.modules.values():
-            module.saveDataStore()
+        self.persistence.flushAll()
 
     def unloadModule(self, name: str) -> str:
         if name.lower() not in self.caseMap:
@@ -103,13 +210,16 @@ class ModuleHandler(object):
         # unmap module triggers
         if hasattr(self.modules[name], 'triggers'):
             for trigger in self.modules[name].triggers():
-                del self.mappedTriggers[trigger]
+                self.unmapTrigger(trigger, self.modules[name])
 
         # do this after removing actions and triggers,
         # so the module can't leave some dangling
         self.modules[name].onUnload()
 
         del self.modules[name]
+        self.loadTimes.pop(name, None)
+        # the cached handler budgets would keep the old module's bound methods alive
+        self.dispatcher.budgets.clear()
         for k, v in list(self.fileMap.items()):
             if v.lower() == name.lower():
                 del self.fileMap[k]
@@ -119,6 +229,24 @@ class ModuleHandler(object):
 
         return name
 
+    def mapTrigger(self, trigger: str, module: Any) -> None:
+        trigger = trigger.lower()
+        if trigger in self.mappedTriggers and self.mappedTriggers[trigger] is not module:
+            self.logger.warning('Trigger {!r} of module {} is already mapped to module {}, overriding it'
+                                .format(trigger, module.__class__.__name__,
+                                        self.mappedTriggers[trigger].__class__.__name__))
+        self.mappedTriggers[trigger] = module
+
+    def unmapTrigger(self, trigger: str, module: Any) -> None:
+        trigger = trigger.lower()
+        # only remove the mapping if it's ours, another module may have overridden it
+        if self.mappedTriggers.get(trigger) is module:
+            del self.mappedTriggers[trigger]
+
+    def countCommand(self, trigger: str) -> None:
+        with self.commandCountsLock:
+            self.commandCounts[trigger] = self.commandCounts.get(trigger, 0) + 1
+
     def reloadModule(self, name: str) -> str:
         self.unloadModule(name)
         return self.loadModule(name)
@@ -127,10 +255,7 @@ class ModuleHandler(object):
         self.bot.output.cmdPRIVMSG(destination, message)
 
     def handlePing(self) -> None:
-        action = (lambda: "ping")()
-        d = threads.deferToThread(self.runGatheringAction, action)
-        d.addCallback(self.sendResponses)
-        d.addErrback(self._deferredError)
+        self.dispatcher.dispatch('*', self.sendResponses, self.runGatheringAction, 'ping')
 
     def handleMessage(self, message: IRCMessage) -> None:
         isChannel = message.targetType == TargetTypes.CHANNEL
@@ -151,12 +276,30 @@ class ModuleHandler(object):
             "324": lambda: "modes-channel"
         }
         action = typeActionMap[message.type]()
-        # fire off a thread for every incoming message
-        d = threads.deferToThread(self.runGatheringAction, action, message)
-        d.addCallback(self.sendResponses)
-        d.addErrback(self._deferredError)
+        # turn away commands from anyone using them too quickly before they take up any space in the queue
+        if message.type == "PRIVMSG" and not self.rateLimiter.allow(message):
+            return
+        # queue the message on its channel's (or user's) lane in the dispatch pool,
+        # so messages from one source are handled in order without holding up anyone else
+        self.dispatcher.dispatch(self._laneForMessage(message), self.sendResponses,
+                                 self.runGatheringAction, action, message)
+
+    @staticmethod
+    def _laneForMessage(message: IRCMessage) -> str:
+        if message.channel is not None:
+            return message.channel.name
+        if message.user is not None:
+            return message.user.nick
+        return '*'
+
+    def sendResponses(self, responses: List) -> Optional[Deferred]:
+        # handlers may return Deferreds or coroutines instead of responses,
+        # wait for those to finish without tying up a thread, then send everything in order
+        if any(_isAsyncResult(response) for response in responses):
+            d = self._gatherResponses(responses)
+            d.addCallback(self.sendResponses)
+            return d
 
-    def sendResponses(self, responses: List) -> None:
         typeActionMap = {
             ResponseType.Say: "response-message",
             ResponseType.Do: "response-action",
@@ -187,19 +330,60 @@ class ModuleHandler(object):
                                       .format(responses))
                 self.bot.reraiseIfDebug(e)
 
+    def _gatherResponses(self, responses: List) -> Deferred:
+        deferreds = []
+        for response in responses:
+            if _isAsyncResult(response):
+                d = _toDeferred(response)
+                d.addErrback(self._responseError)
+            else:
+                d = defer.succeed(response)
+            deferreds.append(d)
+
+        d = defer.gatherResults(deferreds)
+        d.addCallback(_flattenResponses)
+        return d
+
+    def _responseError(self, error):
+        self.logger.error("Python Execution Error in asynchronous response {!r}".format(error))
+        self.logger.error(error.getTraceback())
+        if self.bot.logLevel == logging.DEBUG:
+            self.bot.factory.exitStatus = 1
+            reactor.stop()
+
+    def waitForResult(self, result: Any) -> Any:
+        """
+        Blocks until the given Deferred or coroutine has a result, and returns it.
+        Plain values are returned as they are.
+        Only for use from worker threads, eg: a command that calls another command's execute directly.
+        """
+        if not _isAsyncResult(result):
+            return result
+        return threads.blockingCallFromThread(reactor, _toDeferred, result)
+
     def _deferredError(self, error):
         self.logger.exception("Python Execution Error in deferred call {!r}".format(error))
         self.logger.exception(error)
+        self._stopIfDebug()
+
+    def _stopIfDebug(self) -> None:
         # if we're in debug mode, let the exception kill the bot
         if self.bot.logLevel == logging.DEBUG:
             # we can't just re-raise because twisted will eat the deferred error
             self.bot.factory.exitStatus = 1
-            reactor.stop()
+            if reactor.running:
+                reactor.stop()
+            else:
+                # modules are loaded before the reactor starts
+                reactor.callWhenRunning(reactor.stop)
 
-    def loadAll(self) -> None:
+    def loadAll(self) -> Deferred:
+        """
+        Loads every module the config asks for, returning a Deferred that fires once they've all finished loading.
+        """
         configModulesToLoad = self.bot.config.getWithDefault('modules', ['all'])
         moduleNamesToLoad = set()
-        allModules = [module for module in getPlugins(IModule, desertbot.modules)]
+        allModules = list(self._pluginIndex().values())
 
         if 'all' in configModulesToLoad:
             moduleNamesToLoad.update(set([module.__class__.__name__ for module in allModules]))
@@ -214,27 +398,86 @@ class ModuleHandler(object):
 
         modulesToLoad = sorted([module for module in allModules if module.__class__.__name__ in moduleNamesToLoad],
                                key=lambda module: module.loadingPriority, reverse=True)
-        for module in modulesToLoad:
-            try:
-                self.loadModule(module.__class__.__name__, rebuild_=False)
-            except Exception as e:
-                # ^ dirty, but we don't want any modules to kill the bot
-                self.logger.exception("Exception when loading module {!r}".format(module))
-                self.bot.reraiseIfDebug(e)
+        d = defer.ensureDeferred(self._loadModules(modulesToLoad))
+        d.addErrback(self._deferredError)
+        return d
+
+    async def _loadModules(self, modulesToLoad: List[Any]) -> None:
+        start = time.perf_counter()
+        # modules only depend on modules with a higher loadingPriority, so each priority's modules load together,
+        # and the next priority starts once any of them that load in a thread or asynchronously have finished
+        for _, modules in itertools.groupby(modulesToLoad, key=lambda module: module.loadingPriority):
+            loads = []
+            for module in modules:
+                try:
+                    # straight from the index we just got, checking the module files haven't changed for each one adds up
+                    loads.append(self._loadPlugin(module, rebuild_=False))
+                except Exception as e:
+                    # ^ dirty, but we don't want any modules to kill the bot
+                    self.logger.exception("Exception when loading module {!r}".format(module))
+                    self.bot.reraiseIfDebug(e)
+            await defer.DeferredList(loads, consumeErrors=True)
+
+        slowest = sorted(self.loadTimes.items(), key=lambda item: item[1], reverse=True)[:5]
+        self.logger.info('Loaded {} modules in {:.0f}ms, slowest: {}'.format(
+            len(self.modules), (time.perf_counter() - start) * 1000,
+            ', '.join('{} {:.1f}ms'.format(name, seconds * 1000) for name, seconds in slowest)))
+
+    def runHandler(self, actionName: str, handler: Any, *params: Any, **kw: Any) -> Any:
+        """
+        Runs a single handler the way the action runners do, timed and watched by the dispatcher's watchdog.
+        """
+        return self._runHandler(actionName, handler, params, kw)
+
+    def _runHandler(self, actionName: str, handler: Any, params: tuple, kw: dict) -> Any:
+        watched = self.dispatcher.watch(actionName, handler)
+        result = None
+        try:
+            if self.handlerStats is None:
+                result = handler(*params, **kw)
+            else:
+                start = time.perf_counter()
+                try:
+                    result = handler(*params, **kw)
+                finally:
+                    self.handlerStats.record(actionName, handler, time.perf_counter() - start)
+            return result
+        finally:
+            if watched is not None:
+                # handlers can run other actions, so this puts back the budget of the handler that ran this one
+                self.dispatcher.unwatch(watched, _isAsyncResult(result))
+
+    def handlerOverran(self, job: Any, actionName: Optional[str], handler: Any, elapsed: float, budget: float) -> None:
+        """
+        Called by the dispatcher's watchdog when it gives up waiting on a handler, or on the responses
+        a job's handlers returned (in which case actionName and handler are None).
+        """
+        message = next((arg for arg in job.args if isinstance(arg, IRCMessage)), None)
+        if handler is None:
+            culprit = "responses"
+        else:
+            culprit = "{} handler {}".format(actionName, type(getattr(handler, '__self__', handler)).__name__)
+        self.logger.warning('Gave up waiting on the {} for {!r} after {:.1f}s ({:g}s allowed)'.format(
+            culprit, message.messageString if message is not None else job.args, elapsed, budget))
+
+        if (message is not None and message.command
+                and self.bot.config.getWithDefault('handler_timeout_reply', True)):
+            self.sendResponses([IRCResponse("'{}{}' took too long, so I gave up on it.".format(
+                self.bot.commandChar, message.command), message.replyTo)])
 
     def runGenericAction(self, actionName: str, *params: Any, **kw: Any) -> None:
         actionList = []
         if actionName in self.actions:
             actionList = self.actions[actionName]
         for action in actionList:
-            action[0](*params, **kw)
+            self._runHandler(actionName, action[0], params, kw)
 
     def runProcessingAction(self, actionName: str, data: Any, *params: Any, **kw: Any) -> None:
         actionList = []
         if actionName in self.actions:
             actionList = self.actions[actionName]
         for action in actionList:
-            action[0](data, *params, **kw)
+            self._runHandler(actionName, action[0], (data,) + params, kw)
             if not data:
                 return
 
@@ -244,7 +487,7 @@ class ModuleHandler(object):
             actionList = self.actions[actionName]
         responses = []
         for action in actionList:
-            response = action[0](*params, **kw)
+            response = self._runHandler(actionName, action[0], params, kw)
             if not response:
                 continue
             if isinstance(response, list):
@@ -259,7 +502,7 @@ class ModuleHandler(object):
         if actionName in self.actions:
             actionList = self.actions[actionName]
         for action in actionList:
-            if action[0](*params, **kw):
+            if self._runHandler(actionName, action[0], params, kw):
                 return True
         return False
 
@@ -268,7 +511,7 @@ class ModuleHandler(object):
         if actionName in self.actions:
             actionList = self.actions[actionName]
         for action in actionList:
-            if not action[0](*params, **kw):
+            if not self._runHandler(actionName, action[0], params, kw):
                 return True
         return False
 
@@ -277,11 +520,54 @@ class ModuleHandler(object):
         if actionName in self.actions:
             actionList = self.actions[actionName]
         for action in actionList:
-            value = action[0](*params, **kw)
+            value = self._runHandler(actionName, action[0], params, kw)
             if value:
                 return value
         return None
 
+    def runDeferredActionUntilValue(self, actionName: str, *params: Any, **kw: Any) -> Deferred:
+        return defer.ensureDeferred(self._runActionUntilValueAsync(actionName, *params, **kw))
+
+    async def _runActionUntilValueAsync(self, actionName: str, *params: Any, **kw: Any) -> Any:
+        actionList = []
+        if actionName in self.actions:
+            actionList = self.actions[actionName]
+        for action in actionList:
+            start = time.perf_counter()
+            try:
+                value = action[0](*params, **kw)
+                if _isAsyncResult(value):
+                    value = await _toDeferred(value)
+            finally:
+                # includes the time spent waiting on the result, which is the latency that matters here
+                if self.handlerStats is not None:
+                    self.handlerStats.record(actionName, action[0], time.perf_counter() - start)
+            if value:
+                return value
+        return None
+
+
+def _isAsyncResult(value: Any) -> bool:
+    return isinstance(value, Deferred) or inspect.iscoroutine(value)
+
+
+def _toDeferred(value: Any) -> Deferred:
+    if inspect.iscoroutine(value):
+        return defer.ensureDeferred(value)
+    return value
+
+
+def _flattenResponses(results: List) -> List:
+    responses = []
+    for result in results:
+        if not result:
+            continue
+        if isinstance(result, list):
+            responses.extend(result)
+        else:
+            responses.append(result)
+    return responses
+
 
 class ModuleLoadType(Enum):
     LOAD = 0
@@ -1,14 +1,13 @@
-from twisted.internet.task import LoopingCall
+from twisted.internet.defer import Deferred
 from zope.interface import Interface
 from functools import wraps
 from fnmatch import fnmatch
 import os
-import random
 from typing import Any, Callable, List, Tuple, Union, TYPE_CHECKING
 import logging
 
 from desertbot.message import IRCMessage
-from desertbot.datastore import DataStore
+from desertbot.datastore import DataStore, storageBackends
 
 if TYPE_CHECKING:
     from desertbot.desertbot import DesertBot
@@ -29,6 +28,8 @@ class IModule(Interface):
     def onLoad() -> None:
         """
         Called when the module is loaded. Typically loading data, API keys, etc.
+        It can be a coroutine or return a Deferred, in which case the module's actions and triggers
+        are only hooked up once it finishes.
         """
 
     def hookBot(bot: 'DesertBot') -> None:
@@ -85,6 +86,14 @@ class IModule(Interface):
         and runs each of them until a value is returned.
         """
 
+    def mhRunDeferredActionUntilValue(actionName: str, *params: Any, **kw: Any) -> Deferred:
+        """
+        Convenience wrapper around action system call.
+        Queries the ModuleHandler for modules that handle actionName,
+        and runs each of them until a value is returned, waiting on any that return a Deferred or coroutine.
+        Returns a Deferred that fires with the value.
+        """
+
     def mhRunActionUntilTrue(actionName: str, *params: Any, **kw: Any) -> bool:
         """
         Convenience wrapper around action system call.
@@ -115,11 +124,17 @@ class BotModule(object):
         self.logger = logging.getLogger('desertbot.{}'.format(self.__class__.__name__))
         self.bot = None
         self.storage = None
-        self.storageSync = None
 
         self.loadingPriority = 1
         """
         Increase this number in the module's class if the module should be loaded before other modules.
+        Modules with the same priority load at the same time, so only rely on modules with a higher one.
+        """
+
+        self.loadInThread = False
+        """
+        Set this to True in the module's class if its onLoad blocks for a while (web requests, big files),
+        so it runs in a thread alongside the other modules' and the bot can connect without waiting for it.
         """
 
     def actions(self) -> List[Tuple[str, int, Callable]]:
@@ -135,17 +150,19 @@ class BotModule(object):
         dataRootPath = self.bot.dataPath
         defaultRootPath = os.path.join(self.bot.rootDir, 'data', 'defaults')
 
-        self.storage = DataStore(storagePath=os.path.join(dataRootPath, f'{self.__class__.__name__}.json'),
-                                 defaultsPath=os.path.join(defaultRootPath, f'{self.__class__.__name__}.json'))
+        config = self.bot.config
+        storeClass = storageBackends.get(config.getWithDefault('storage_backend', 'json'), DataStore)
+        self.storage = storeClass(storagePath=os.path.join(dataRootPath, f'{self.__class__.__name__}.json'),
+                                  defaultsPath=os.path.join(defaultRootPath, f'{self.__class__.__name__}.json'),
+                                  flushDelay=config.getWithDefault('storage_flush_delay', 5),
+                                  maxFlushDelay=config.getWithDefault('storage_save_interval', 60))
 
-        # ensure storage is periodically synced to disk - DataStore.__set__() does call DataStore.save(), but you never know
-        self.storageSync = LoopingCall(self.storage.save)
-        # since each module has its own LoopingCall,
-        # space them out over a second using random.random() to add 0-1 seconds to each module's storage save interval
-        self.storageSync.start(self.bot.config.getWithDefault('storage_save_interval', 60) + random.random(), now=False)
+        # changes to the storage are written to disk by the persistence service once they're due
+        self.bot.moduleHandler.persistence.register(self.storage)
 
     def saveDataStore(self):
-        self.storage.save()
+        # only writes if something changed
+        self.storage.flush(force=True, sync=self.bot.moduleHandler.persistence.sync)
 
     def displayHelp(self, query: Union[List[str], None]) -> str:
         if query is not None and query[0].lower() == self.__class__.__name__.lower():
@@ -155,7 +172,10 @@ class BotModule(object):
         return 'This module has no help text'
 
     def onUnload(self) -> None:
-        self.storage.save()
+        persistence = self.bot.moduleHandler.persistence
+        persistence.unregister(self.storage)
+        self.storage.flush(force=True, sync=persistence.sync)
+        self.storage.close()
 
     def checkIgnoreList(self, message: IRCMessage) -> bool:
         for ignore in self.bot.config.getWithDefault('ignored', []):
@@ -175,6 +195,9 @@ class BotModule(object):
     def mhRunActionUntilValue(self, actionName: str, *params: Any, **kw: Any) -> Any:
         return self.bot.moduleHandler.runActionUntilValue(actionName, *params, **kw)
 
+    def mhRunDeferredActionUntilValue(self, actionName: str, *params: Any, **kw: Any) -> Deferred:
+        return self.bot.moduleHandler.runDeferredActionUntilValue(actionName, *params, **kw)
+
     def mhRunActionUntilTrue(self, actionName: str, *params: Any, **kw: Any) -> bool:
         return self.bot.moduleHandler.runActionUntilTrue(actionName, *params, **kw)
 
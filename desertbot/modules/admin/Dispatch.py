@@ -0,0 +1,36 @@
+from twisted.plugin import IPlugin
+from zope.interface import implementer
+
+from desertbot.message import IRCMessage
+from desertbot.moduleinterface import IModule
+from desertbot.modules.commandinterface import BotCommand, admin
+from desertbot.response import IRCResponse
+
+
+@implementer(IPlugin, IModule)
+class Dispatch(BotCommand):
+    def triggers(self):
+        return ['dispatch']
+
+    def help(self, query):
+        return ("dispatch (reset) - shows the message dispatch pool's queue depth and wait times,"
+                " or resets the collected statistics")
+
+    def execute(self, message: IRCMessage):
+        if len(message.parameterList) > 0 and message.parameterList[0].lower() == 'reset':
+            return self._reset(message)
+
+        stats = self.bot.moduleHandler.dispatcher.stats()
+        return IRCResponse("Workers: {busy}/{workers} busy | Queued: {queued} jobs in {lanes} lanes"
+                           " | Dispatched: {dispatched}, dropped: {dropped}, rejected: {rejected}"
+                           " | Wait: {avgWait:.3f}s avg, {maxWait:.3f}s max"
+                           " | Timed out: {overruns}, {abandoned} still running".format(**stats),
+                           message.replyTo)
+
+    @admin("Only my admins may reset the dispatch statistics!")
+    def _reset(self, message: IRCMessage):
+        self.bot.moduleHandler.dispatcher.resetStats()
+        return IRCResponse("Dispatch statistics reset.", message.replyTo)
+
+
+dispatch = Dispatch()
@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+
+from twisted.plugin import IPlugin
+from zope.interface import implementer
+
+from desertbot.message import IRCMessage
+from desertbot.moduleinterface import IModule
+from desertbot.modules.commandinterface import BotCommand, admin
+from desertbot.response import IRCResponse
+
+
+def _formatDuration(seconds: float) -> str:
+    if seconds < 0.001:
+        return '{:.0f}µs'.format(seconds * 1000000)
+    if seconds < 1:
+        return '{:.1f}ms'.format(seconds * 1000)
+    return '{:.2f}s'.format(seconds)
+
+
+@implementer(IPlugin, IModule)
+class Latency(BotCommand):
+    def triggers(self):
+        return ['latency']
+
+    def help(self, query):
+        return ("latency (dump/reset) - shows the slowest module handlers by 95th percentile time,"
+                " writes the times for every handler to a file in the log folder, or resets them")
+
+    def execute(self, message: IRCMessage):
+        stats = self.bot.moduleHandler.handlerStats
+        if stats is None:
+            return IRCResponse("Handler timing is disabled, set handler_stats_window to enable it.",
+                               message.replyTo)
+
+        if len(message.parameterList) > 0:
+            subCommand = message.parameterList[0].lower()
+            if subCommand == 'dump':
+                return self._dump(message)
+            if subCommand == 'reset':
+                return self._reset(message)
+
+        summary = stats.summary()
+        if not summary:
+            return IRCResponse("No module handlers have run recently.", message.replyTo)
+        slowest = ['{action}/{module}: p50 {p50}, p95 {p95}, max {max} ({count} calls)'.format(
+            action=handler['action'], module=handler['module'], count=handler['count'],
+            p50=_formatDuration(handler['p50']), p95=_formatDuration(handler['p95']),
+            max=_formatDuration(handler['max'])) for handler in summary[:5]]
+        return IRCResponse("Slowest handlers: {}".format(' | '.join(slowest)), message.replyTo)
+
+    @admin("Only my admins may dump the handler latency statistics!")
+    def _dump(self, message: IRCMessage):
+        summary = self.bot.moduleHandler.handlerStats.summary()
+        lines = ['{:<24} {:<20} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'action', 'module', 'count', 'calls', 'mean', 'p50', 'p95', 'p99', 'max')]
+        for handler in summary:
+            lines.append('{:<24} {:<20} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+                handler['action'], handler['module'], handler['count'], handler['calls'],
+                _formatDuration(handler['mean']), _formatDuration(handler['p50']), _formatDuration(handler['p95']),
+                _formatDuration(handler['p99']), _formatDuration(handler['max'])))
+
+        dumpPath = os.path.join(self.bot.logPath, self.bot.server,
+                                'latency-{}.log'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+        os.makedirs(os.path.dirname(dumpPath), exist_ok=True)
+        with open(dumpPath, 'w', encoding='utf-8') as dumpFile:
+            dumpFile.write('\n'.join(lines) + '\n')
+
+        self.logger.info('Dumped latency statistics for {} handlers to {}'.format(len(summary), dumpPath))
+        return IRCResponse("Dumped latency statistics for {} handlers to {}".format(len(summary), dumpPath),
+                           message.replyTo)
+
+    @admin("Only my admins may reset the handler latency statistics!")
+    def _reset(self, message: IRCMessage):
+        self.bot.moduleHandler.handlerStats.reset()
+        return IRCResponse("Handler latency statistics reset.", message.replyTo)
+
+
+latency = Latency()
@@ -6,6 +6,7 @@ Created on Dec 07, 2014
 import os
 
 from twisted.conch.manhole_tap import makeService
+from twisted.internet import threads
 from twisted.internet.error import CannotListenError
 from twisted.plugin import IPlugin
 from zope.interface import implementer
@@ -27,18 +28,20 @@ class Manhole(BotCommand):
     manhole = None
     port = 4040
 
-    def onLoad(self):
+    async def onLoad(self):
         while self.manhole is None or not self.manhole.running:
+            # loading (or the first time, generating) the SSH key takes a while, so do that in a thread,
+            # but listening on the port has to happen on the reactor thread
+            self.manhole = await threads.deferToThread(makeService, {
+                "namespace": {"bot": self.bot},
+                "passwd": os.path.join("data", "manhole.passwd"),
+                "telnetPort": None,
+                "sshPort": "tcp:{}:interface=127.0.0.1".format(self.port),
+                "sshKeyDir": os.path.join("data"),
+                "sshKeyName": "manhole.sshkey",
+                "sshKeySize": 4096
+            })
             try:
-                self.manhole = makeService({
-                    "namespace": {"bot": self.bot},
-                    "passwd": os.path.join("data", "manhole.passwd"),
-                    "telnetPort": None,
-                    "sshPort": "tcp:{}:interface=127.0.0.1".format(self.port),
-                    "sshKeyDir": os.path.join("data"),
-                    "sshKeyName": "manhole.sshkey",
-                    "sshKeySize": 4096
-                })
                 self.manhole.startService()
             except CannotListenError:
                 self.port += 1
@@ -93,7 +93,7 @@ class ModuleLoader(BotCommand):
                 try:
                     success = moduleHandler.reloadModule(moduleName)
                     if success:
-                        successes.append(moduleHandler.caseMap[moduleName])
+                        successes.append(success)
                     else:
                         failures.append(moduleNameCaseMap[moduleName])
 
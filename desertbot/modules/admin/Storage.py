@@ -1,5 +1,3 @@
-import random
-
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -20,18 +18,24 @@ class Storage(BotCommand):
 
     def help(self, query):
         helpDict = {
-            "storage": f"{self.bot.commandChar}storage stopsync/startsync/load/save <modulename> - Manage bot storage files.",
-            "stopsync": f"{self.bot.commandChar}storage stopsync <modulename> - Halts the periodic autosave for the specified modules storage file.",
-            "startsync": f"{self.bot.commandChar}storage startsync <modulename> - Start periodic autosave for the specified modules storage file.",
+            "storage": f"{self.bot.commandChar}storage stopsync/startsync/load/save <modulename>, or status - Manage bot storage files.",
+            "stopsync": f"{self.bot.commandChar}storage stopsync <modulename> - Halts writing changes to the specified modules storage file."
+                        f" Until startsync, changes are only written by {self.bot.commandChar}storage save or at shutdown,"
+                        f" and are lost if the bot crashes.",
+            "startsync": f"{self.bot.commandChar}storage startsync <modulename> - Start writing changes to the specified modules storage file again,"
+                         f" including any made while it was stopped.",
             "load": f"{self.bot.commandChar}storage load <modulename> - Manually load the specified modules storage from file.",
-            "save": f"{self.bot.commandChar}storage save <modulename> - Manually save the specified modules storage to file."
+            "save": f"{self.bot.commandChar}storage save <modulename> - Manually save the specified modules storage to file.",
+            "status": f"{self.bot.commandChar}storage status - Shows how many storage files have unsaved changes, and how long saving them takes."
         }
         if len(query) > 1 and query[1].lower() in helpDict:
             return helpDict[query[1].lower()]
         else:
-            return f"{self.bot.commandChar}storage stopsync/startsync/load/save <modulename> - Manage bot storage files."
+            return helpDict["storage"]
 
     def execute(self, message: IRCMessage):
+        if len(message.parameterList) == 1 and message.parameterList[0].lower() == "status":
+            return self.storageStatus(message)
         if len(message.parameterList) < 2:
             return IRCResponse(self.help(["storage"]), message.replyTo)
         else:
@@ -45,13 +49,25 @@ class Storage(BotCommand):
             elif subcommand == "save":
                 return self.saveStorage(message)
 
+    def storageStatus(self, message: IRCMessage):
+        stats = self.bot.moduleHandler.persistence.stats()
+        if stats['flushes'] == 0:
+            timings = "Nothing has been saved yet."
+        else:
+            timings = (f"Saved {stats['written']} files in {stats['flushes']} batches, "
+                       f"taking {stats['p50'] * 1000:.1f}ms (median), {stats['p95'] * 1000:.1f}ms (95th percentile), "
+                       f"{stats['max'] * 1000:.1f}ms at most.")
+        return IRCResponse(f"{stats['dirty']} of {stats['stores']} storage files have unsaved changes "
+                           f"({stats['paused']} paused, {stats['failures']} failed saves). {timings}", message.replyTo)
+
     @admin("[Storage] Only my admins may stop my storage sync!")
     def stopStorageSync(self, message: IRCMessage):
         moduleNames = self._getValidModuleNames(message.parameterList[1:])
         for moduleName in moduleNames:
             self._stopDataSync(moduleName)
         return IRCResponse(
-            f"Stopped storage sync for modules {', '.join(moduleNames)}. They will no longer periodically autosave to file!",
+            f"Stopped storage sync for modules {', '.join(moduleNames)}. Their changes will no longer be saved to file"
+            f" until startsync, a manual save or shutdown, and will be lost if I crash!",
             message.replyTo)
 
     @admin("[Storage] Only my admins may start up my storage sync!")
@@ -60,7 +76,7 @@ class Storage(BotCommand):
         for moduleName in moduleNames:
             self._startDataSync(moduleName)
         return IRCResponse(
-            f"Started storage sync for modules {', '.join(moduleNames)}. They will periodically autosave to file.",
+            f"Started storage sync for modules {', '.join(moduleNames)}. Their changes will be saved to file again.",
             message.replyTo)
 
     @admin("[Storage] Only my admins can reload my storage file!")
@@ -87,16 +103,13 @@ class Storage(BotCommand):
         """
         Given a valid, Proper Caps module name, enable storage sync for that module
         """
-        # since each module has its own LoopingCall,
-        # space them out over a second using random.random() to add 0-1 seconds to each module's storage save interval
-        saveInterval = self.bot.config.getWithDefault("storage_save_interval", 60) + random.random()
-        self.bot.moduleHandler.modules[moduleName].storageSync.start(saveInterval, now=True)
+        self.bot.moduleHandler.persistence.resume(self.bot.moduleHandler.modules[moduleName].storage)
 
     def _stopDataSync(self, moduleName):
         """
         Given a valid, Proper Caps module name, disable storage sync for that module
         """
-        self.bot.moduleHandler.modules[moduleName].storageSync.stop()
+        self.bot.moduleHandler.persistence.pause(self.bot.moduleHandler.modules[moduleName].storage)
 
     def _saveModuleData(self, moduleName):
         """
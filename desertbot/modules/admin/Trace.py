@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+
+from twisted.plugin import IPlugin
+from zope.interface import implementer
+
+from desertbot.message import IRCMessage
+from desertbot.moduleinterface import IModule
+from desertbot.modules.commandinterface import BotCommand, admin
+from desertbot.response import IRCResponse
+
+
+@implementer(IPlugin, IModule)
+class Trace(BotCommand):
+    def triggers(self):
+        return ['trace']
+
+    def help(self, query):
+        return ("trace (<lines>) - writes the last <lines> (default all) raw lines the bot sent and received"
+                " to a file in its log folder, with passwords removed")
+
+    @admin("Only my admins may dump the protocol trace!")
+    def execute(self, message: IRCMessage):
+        if self.bot.protocolTrace is None:
+            return IRCResponse("Protocol tracing is disabled, set protocol_trace_size to enable it.",
+                               message.replyTo)
+
+        count = None
+        if len(message.parameterList) > 0:
+            try:
+                count = int(message.parameterList[0])
+            except ValueError:
+                return IRCResponse("The number of lines to dump must be a whole number.", message.replyTo)
+
+        lines = self.bot.protocolTrace.dump(count)
+        tracePath = os.path.join(self.bot.logPath, self.bot.server,
+                                 'trace-{}.log'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+        os.makedirs(os.path.dirname(tracePath), exist_ok=True)
+        with open(tracePath, 'w', encoding='utf-8') as traceFile:
+            traceFile.write('\n'.join(lines) + '\n')
+
+        self.logger.info('Dumped {} protocol trace lines to {}'.format(len(lines), tracePath))
+        return IRCResponse("Dumped {} lines to {}".format(len(lines), tracePath), message.replyTo)
+
+
+trace = Trace()
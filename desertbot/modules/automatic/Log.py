@@ -37,7 +37,7 @@ logSelfFuncs = {
 }
 
 targetFuncs = {
-    'NICK': lambda bot, msg: [name for name, chan in bot.channels.items() if msg.user.nick in chan.users],
+    'NICK': lambda bot, msg: [chan.name for chan in msg.metadata['nickChannels']],
     'QUIT': lambda bot, msg: [chan.name for chan in msg.metadata['quitChannels']],
 }
 
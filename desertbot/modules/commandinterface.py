@@ -4,9 +4,12 @@ Created on Feb 28, 2018
 @author: StarlitGhost
 """
 
+import inspect
 from fnmatch import fnmatch
 from functools import wraps, partial
-from typing import Callable, List, Optional, Tuple, Union
+from typing import Any, Callable, Coroutine, List, Optional, Tuple, Union
+
+from twisted.internet.defer import CancelledError, Deferred
 
 from desertbot.message import IRCMessage
 from desertbot.moduleinterface import BotModule
@@ -34,11 +37,20 @@ class BotCommand(BotModule):
         BotModule.__init__(self)
         self.triggerHelp = {}
 
+        self.receiveAllCommands = False
+        """
+        Set this to True in the module's class if it needs to see every command, not just its own triggers.
+        Commands are otherwise routed directly to the module that registered the trigger.
+        """
+
     def triggers(self):
         return []
 
     def actions(self) -> List[Tuple[str, int, Callable]]:
-        return super(BotCommand, self).actions() + [('botmessage', 1, self.handleCommand)]
+        actions = super(BotCommand, self).actions()
+        if self.receiveAllCommands:
+            actions.append(('botmessage', 1, self.handleCommand))
+        return actions
 
     def onLoad(self) -> None:
         pass
@@ -78,18 +90,40 @@ class BotCommand(BotModule):
             return
 
         try:
-            return self.execute(message)
+            result = self.execute(message)
         except Exception as e:
-            self.logger.exception("Python execution error while running command {!r}"
-                                  .format(message.command))
-            errorText = ("Python execution error while running command {!r}: {}: {}"
-                         .format(message.command, type(e).__name__, str(e)))
-            self.bot.output.cmdPRIVMSG(message.replyTo, errorText)
+            self._reportError(message, e)
+            return
+
+        # execute() may also be a coroutine or return a Deferred, for commands that wait on the network.
+        # The ModuleHandler waits for those on the reactor thread instead of holding a worker thread,
+        # so coroutines must not make blocking calls themselves.
+        if inspect.iscoroutine(result):
+            return self._awaitCommand(message, result)
+        if isinstance(result, Deferred):
+            result.addErrback(lambda failure: self._reportError(message, failure.value))
+        return result
+
+    async def _awaitCommand(self, message: IRCMessage, coroutine: Coroutine) -> Any:
+        try:
+            return await coroutine
+        except Exception as e:
+            self._reportError(message, e)
+
+    def _reportError(self, message: IRCMessage, e: Exception) -> None:
+        if isinstance(e, CancelledError):
+            # the dispatcher's watchdog gave up waiting on the command, and has already said so
+            return
+        self.logger.error("Python execution error while running command {!r}".format(message.command),
+                          exc_info=(type(e), e, e.__traceback__))
+        errorText = ("Python execution error while running command {!r}: {}: {}"
+                     .format(message.command, type(e).__name__, str(e)))
+        self.bot.output.cmdPRIVMSG(message.replyTo, errorText)
 
-            self.bot.reraiseIfDebug(e)
+        self.bot.reraiseIfDebug(e)
 
     def shouldExecute(self, message: IRCMessage) -> bool:
-        if message.command.lower() not in [t.lower() for t in self.triggers()]:
+        if self.bot.moduleHandler.mappedTriggers.get(message.command.lower()) is not self:
             return False
 
         return True
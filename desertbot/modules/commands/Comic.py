@@ -10,7 +10,6 @@ from io import BytesIO
 from random import choice, sample, uniform
 
 import requests
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageChops
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -19,8 +18,15 @@ from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
 from desertbot.utils import string
+from desertbot.utils.lazyimport import lazyImport
 from desertbot.utils.regex import re
 
+Image = lazyImport('PIL.Image')
+ImageChops = lazyImport('PIL.ImageChops')
+ImageDraw = lazyImport('PIL.ImageDraw')
+ImageEnhance = lazyImport('PIL.ImageEnhance')
+ImageFilter = lazyImport('PIL.ImageFilter')
+ImageFont = lazyImport('PIL.ImageFont')
 
 CHARS_PATH = 'data/comics/chars'
 BACKGROUNDS_PATH = 'data/comics/backgrounds'
@@ -3,7 +3,6 @@ Created on Jul 31, 2013
 
 @author: StarlitGhost, Emily
 """
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -11,6 +10,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -35,7 +37,7 @@ class Dinner(BotCommand):
             response = self.bot.moduleHandler.runActionUntilValue('fetch-url',
                                                                   wtfsimfd.format(options[option]))
 
-            soup = BeautifulSoup(response.content, 'lxml')
+            soup = bs4.BeautifulSoup(response.content, 'lxml')
 
             phrase = soup.find('dl').text.strip()
             item = soup.find('a')
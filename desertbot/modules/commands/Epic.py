@@ -15,15 +15,16 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
 from desertbot.utils.string import timeDeltaString
 
-import jq
+jq = lazyImport('jq')
 # I should be scheduled slightly past 16:00 each day
 
 @implementer(IPlugin, IModule)
 class Epic(BotCommand):
     url = "https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions?locale=en-US&country=US&allowCountries=US"
-    query = jq.compile("""
+    queryText = """
         def e(f): if f == "[]" then null else f end;
         [ .data.Catalog.searchStore.elements[] | . as $item |
             ({
@@ -48,7 +49,9 @@ class Epic(BotCommand):
                 future: (.future // false)
             })
         ] | reduce .[] as $item ({}; . + {($item.id): $item})
-        """)
+        """
+    # compiled the first time it's needed, so loading the module doesn't import jq
+    query = None
 
     def triggers(self):
         return ["epic"]
@@ -95,6 +98,8 @@ class Epic(BotCommand):
             self.logger.warning("Couldn't fetch the Epic games feed, maybe a temporary failure")
             return False
 
+        if self.query is None:
+            self.query = jq.compile(self.queryText)
         result = self.query.input(text=response.content.decode("utf8")).first()
 
         fresh = []
@@ -6,7 +6,6 @@ Created on Oct 11, 2018
 """
 import re
 
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
 from zope.interface import implementer
@@ -15,6 +14,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -48,7 +50,7 @@ class Etymology(BotCommand):
         results = mh.runActionUntilValue('fetch-url', searchURL,
                                          params={'q': query})
 
-        soup = BeautifulSoup(results.content, 'lxml')
+        soup = bs4.BeautifulSoup(results.content, 'lxml')
         words = soup.find_all(class_='word--C9UPa')
         if not words:
             return IRCResponse('No results found for {!r}'.format(query), message.replyTo)
@@ -63,7 +65,7 @@ class Etymology(BotCommand):
             results = mh.runActionUntilValue('fetch-url', searchURL,
                                              params={'q': query, 'page': index // len(words) + 1})
             index %= len(words)
-            soup = BeautifulSoup(results.content, 'lxml')
+            soup = bs4.BeautifulSoup(results.content, 'lxml')
             words = soup.find_all(class_='word--C9UPa')
             if index >= len(words):
                 index = len(words) - 1
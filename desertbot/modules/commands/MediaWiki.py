@@ -6,7 +6,6 @@ from twisted.plugin import IPlugin
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
 from zope.interface import implementer
 
-from bs4 import BeautifulSoup
 from furl import furl
 import regex
 
@@ -18,6 +17,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 USER_AGENT = 'DesertBot'
 SEARCH_RETURNED_RESULTS = 12
@@ -46,6 +48,11 @@ class URIError(ValueError):
 class MediaWiki(BotCommand):
     wikihandlers = {}
 
+    def __init__(self):
+        BotCommand.__init__(self)
+        # setting up the Wikipedia handler asks it for its site info
+        self.loadInThread = True
+
     # We explicitely implement the wiki alias for en.wikipedia.org, so it has a
     # help, etc which it would lack if it was handled only via .alias
     def triggers(self):
@@ -261,7 +268,7 @@ class MediaWiki(BotCommand):
 
         if not summary:
             try:
-                soup = BeautifulSoup(page.html, 'lxml')
+                soup = bs4.BeautifulSoup(page.html, 'lxml')
                 for tag in soup.find_all(class_=["toc", "infobox", regex.compile("^mw-(?!parser-output)")]):
                     tag.clear()
                 summary = soup.get_text()
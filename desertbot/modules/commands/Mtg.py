@@ -5,7 +5,6 @@ Created on Jan 21, 2013
 """
 import re
 
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -13,6 +12,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -31,7 +33,7 @@ class Mtg(BotCommand):
 
         response = self.bot.moduleHandler.runActionUntilValue('fetch-url', searchTerm)
 
-        soup = BeautifulSoup(response.content, 'lxml')
+        soup = bs4.BeautifulSoup(response.content, 'lxml')
 
         name = soup.find('div', {'id': 'ctl00_ctl00_ctl00_MainContent_SubContent_SubContent_nameRow'})
         if name is None:
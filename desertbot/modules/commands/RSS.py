@@ -1,7 +1,6 @@
 import datetime
 
 import dateutil.parser as dparser
-import feedparser
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -9,6 +8,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import admin, BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+feedparser = lazyImport('feedparser')
 
 
 @implementer(IPlugin, IModule)
@@ -24,7 +24,7 @@ class Urban(BotCommand):
         return ("urban <search term>"
                 " - returns the definition of the given search term from UrbanDictionary.com")
 
-    def execute(self, message: IRCMessage):
+    async def execute(self, message: IRCMessage):
         if len(message.parameterList) == 0:
             return IRCResponse("You didn't give a word! Usage: {0}".format(self.help), message.replyTo)
 
@@ -32,7 +32,7 @@ class Urban(BotCommand):
 
         url = 'http://api.urbandictionary.com/v0/define?term={0}'.format(search)
 
-        response = self.bot.moduleHandler.runActionUntilValue('fetch-url', url)
+        response = await self.mhRunDeferredActionUntilValue('fetch-url-async', url)
 
         j = response.json()
 
@@ -8,7 +8,7 @@ from twisted.plugin import IPlugin
 from zope.interface import implementer
 
 from desertbot.moduleinterface import IModule, BotModule
-from desertbot.response import IRCResponse
+from desertbot.response import IRCResponse, ResponseType
 from desertbot.utils import string
 
 
@@ -23,10 +23,20 @@ class AutoPaste(BotModule):
         return ("Automatic module that uploads overly "
                 "long reponses to a pastebin service and gives you a link instead")
 
+    def onLoad(self):
+        # responses that would be split over more lines than this get pasted instead
+        self.maxLines = self.bot.config.getWithDefault('autopaste_max_lines', 3)
+
     def execute(self, response: IRCResponse):
-        limit = 700  # chars
         expire = 10*60  # seconds
-        if len(response.response) > limit:
+        if response.type == ResponseType.Notice:
+            lines = self.bot.output.splitMessage('NOTICE', response.target, response.response)
+        elif response.type == ResponseType.Do:
+            lines = self.bot.output.splitMessage('PRIVMSG', response.target, response.response,
+                                                 len('\x01ACTION \x01'))
+        else:
+            lines = self.bot.output.splitMessage('PRIVMSG', response.target, response.response)
+        if len(lines) > self.maxLines:
             mh = self.bot.moduleHandler
             replaced = mh.runActionUntilValue('upload-dbco',
                                               string.stripFormatting(response.response),
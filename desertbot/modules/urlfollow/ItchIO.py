@@ -6,7 +6,6 @@ Created on Mar 14, 2019
 import json
 import re
 
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
 from zope.interface import implementer
@@ -14,6 +13,9 @@ from zope.interface import implementer
 from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -30,7 +32,7 @@ class ItchIO(BotCommand):
             return
 
         response = self.bot.moduleHandler.runActionUntilValue('fetch-url', url)
-        soup = BeautifulSoup(response.content, 'lxml')
+        soup = bs4.BeautifulSoup(response.content, 'lxml')
 
         if not soup.find('body', {'data-page_name': 'view_game'}):
             return
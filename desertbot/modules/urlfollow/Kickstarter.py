@@ -10,7 +10,6 @@ import math
 import re
 from datetime import timezone
 
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
 from zope.interface import implementer
@@ -18,6 +17,9 @@ from zope.interface import implementer
 from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -36,7 +38,7 @@ class Kickstarter(BotCommand):
         url = 'https://www.kickstarter.com/projects/{}/description'.format(ksID)
         response = self.bot.moduleHandler.runActionUntilValue('fetch-url', url)
 
-        soup = BeautifulSoup(response.content, 'lxml')
+        soup = bs4.BeautifulSoup(response.content, 'lxml')
 
         output = []
 
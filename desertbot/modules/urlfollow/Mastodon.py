@@ -10,7 +10,6 @@ from urllib.parse import urlparse
 
 import dateutil.parser
 import dateutil.tz
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
 from zope.interface import implementer
@@ -19,6 +18,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -75,7 +77,7 @@ class Mastodon(BotCommand):
         if not response:
             return
 
-        soup = BeautifulSoup(response.content, 'lxml')
+        soup = bs4.BeautifulSoup(response.content, 'lxml')
 
         toot = soup.find(class_='entry')
         if not toot:
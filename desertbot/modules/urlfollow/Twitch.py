@@ -13,24 +13,28 @@ from zope.interface import implementer
 from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
+from desertbot.utils.lazyimport import lazyImport
 from desertbot.utils.string import deltaTimeToString
 from desertbot.utils.regex import re
 
-import jq
+jq = lazyImport('jq')
 
 TWITCH_GQL = "https://gql.twitch.tv/gql#origin=twilight"
 TWITCH_URL_RE = re.compile(r'twitch\.tv/(?P<twitchChannel>[^/]+)/?(\s|$)')
-TWITCH_PARSER = jq.compile("""
+TWITCH_QUERY = """
         [.[] | .data | (.user // .userByAttribute)] |
         (.[0].lastBroadcast | { title: .title, game: .game.displayName }) +
         { since: .[1].stream.createdAt } +
         { viewers: .[2].stream.viewersCount } +
         { name: .[3].displayName } +
         { mature: .[4].broadcastSettings.isMature }
-    """)
+    """
 
 @implementer(IPlugin, IModule)
 class Twitch(BotCommand):
+    # compiled the first time it's needed, so loading the module doesn't import jq
+    parser = None
+
     def actions(self):
         return super(Twitch, self).actions() + [('urlfollow', 2, self.follow)]
 
@@ -109,7 +113,9 @@ class Twitch(BotCommand):
         response = self.bot.moduleHandler.runActionUntilValue('post-url', TWITCH_GQL,
                                                               json=query, extraHeaders=headers)
 
-        stream = TWITCH_PARSER.input(response.json()).first()
+        if self.parser is None:
+            self.parser = jq.compile(TWITCH_QUERY)
+        stream = self.parser.input(response.json()).first()
 
         if not stream["name"]:
             return
@@ -45,7 +45,6 @@ class APIKeys(BotCommand):
             try:
                 if keyname in self.keys:
                     del self.storage[keyname]
-                    self.storage.save()
                 else:
                     return IRCResponse(f"There is no API key named {keyname}!", message.replyTo)
             except Exception:
@@ -6,7 +6,6 @@ Created on May 21, 2014
 import re
 from collections import OrderedDict
 
-from bs4 import UnicodeDammit
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -14,6 +13,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand, admin
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -176,7 +178,7 @@ class Alias(BotCommand):
             return IRCResponse("Failed to open page at {}".format(url), message.replyTo)
 
         text = response.content
-        text = UnicodeDammit(text).unicode_markup
+        text = bs4.UnicodeDammit(text).unicode_markup
         lines = text.splitlines()
         numAliases = 0
         numHelpTexts = 0
@@ -278,11 +280,11 @@ class Alias(BotCommand):
 
     def _newAlias(self, alias, command):
         self.aliases[alias] = command
-        self.bot.moduleHandler.mappedTriggers[alias] = self
+        self.bot.moduleHandler.mapTrigger(alias, self)
 
     def _delAlias(self, alias):
         del self.aliases[alias]
-        del self.bot.moduleHandler.mappedTriggers[alias]
+        self.bot.moduleHandler.unmapTrigger(alias, self)
         if alias in self.aliasHelp:
             del self.aliasHelp[alias]
         self._syncAliases()
@@ -293,7 +295,9 @@ class Alias(BotCommand):
     def _syncAliases(self):
         self.storage['aliases'] = self.aliases
         self.storage['help'] = self.aliasHelp
-        self.storage.save()
+        # carry on with the store's own copies, so it notices when they're changed
+        self.aliases = self.storage['aliases']
+        self.aliasHelp = self.storage['help']
 
     def _aliasedMessage(self, message):
         if message.command.lower() not in self.aliases:
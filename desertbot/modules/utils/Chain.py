@@ -76,7 +76,7 @@ class Chain(BotCommand):
 
             if inputMessage.command.lower() in self.bot.moduleHandler.mappedTriggers:
                 command = self.bot.moduleHandler.mappedTriggers[inputMessage.command.lower()]
-                response = command.execute(inputMessage)
+                response = self.bot.moduleHandler.waitForResult(command.execute(inputMessage))
             else:
                 return IRCResponse("{!r} is not a recognized command trigger"
                                    .format(inputMessage.command), message.replyTo)
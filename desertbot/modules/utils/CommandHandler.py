@@ -21,8 +21,26 @@ class CommandHandler(BotModule):
                                                         ('message-user', 1, self.handleCommand)]
 
     def handleCommand(self, message):
-        if message.command:
-            return self.bot.moduleHandler.runGatheringAction('botmessage', message)
+        if not message.command:
+            return
+
+        moduleHandler = self.bot.moduleHandler
+        responses = []
+        # route the command straight to the module that owns the trigger
+        module = moduleHandler.mappedTriggers.get(message.command)
+        if module is not None:
+            moduleHandler.countCommand(message.command)
+        if module is not None and not module.receiveAllCommands:
+            # run as its own handler, so the command module's time budget applies and its latency is recorded
+            response = moduleHandler.runHandler('command', module.handleCommand, message)
+            if isinstance(response, list):
+                responses.extend(response)
+            elif response:
+                responses.append(response)
+
+        # modules that want to see every command still get them via the botmessage action
+        responses.extend(moduleHandler.runGatheringAction('botmessage', message))
+        return responses
 
 
 commandhandler = CommandHandler()
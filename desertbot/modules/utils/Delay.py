@@ -7,7 +7,7 @@ import datetime
 
 from pytimeparse.timeparse import timeparse
 from twisted.internet import reactor
-from twisted.internet import task
+from twisted.internet import task, threads
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -49,7 +49,7 @@ class Delay(BotCommand):
         moduleHandler = self.bot.moduleHandler
         if command in moduleHandler.mappedTriggers:
             module = moduleHandler.mappedTriggers[command].execute
-            d = task.deferLater(reactor, delay, module, newMessage)
+            d = task.deferLater(reactor, delay, threads.deferToThread, module, newMessage)
             d.addCallback(self._activate)
             d.addErrback(self._deferredError)
             return IRCResponse("OK, I'll execute that in {}".format(delayString), message.replyTo,
@@ -61,7 +61,8 @@ class Delay(BotCommand):
             if command not in moduleHandler.commands['Alias'].aliases:
                 return IRCResponse("'{}' is not a recognized command or alias".format(command), message.replyTo)
 
-            d = task.deferLater(reactor, delay, moduleHandler.commands['Alias'].execute, newMessage)
+            d = task.deferLater(reactor, delay, threads.deferToThread,
+                                moduleHandler.commands['Alias'].execute, newMessage)
             d.addCallback(self._activate)
             d.addErrback(self._deferredError)
             return IRCResponse("OK, I'll execute that in {}".format(delayString), message.replyTo)
@@ -0,0 +1,212 @@
+from typing import Dict, Optional
+
+from twisted.internet import reactor
+from twisted.plugin import IPlugin
+from twisted.web.resource import Resource
+from zope.interface import implementer
+
+from desertbot.moduleinterface import IModule, BotModule
+from desertbot.utils.lazyimport import lazyImport
+
+# only needed if metrics_port is set
+server = lazyImport('twisted.web.server')
+
+
+def _escapeLabel(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _MetricWriter(object):
+    """
+    Builds up a page in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name: str, metricType: str, helpText: str) -> None:
+        self.lines.append('# HELP {} {}'.format(name, helpText))
+        self.lines.append('# TYPE {} {}'.format(name, metricType))
+
+    def sample(self, name: str, value: Optional[float], labels: Optional[Dict[str, str]] = None) -> None:
+        if value is None:
+            return
+        if labels:
+            labelText = ','.join('{}="{}"'.format(label, _escapeLabel(labelValue))
+                                 for label, labelValue in labels.items())
+            self.lines.append('{}{{{}}} {}'.format(name, labelText, float(value)))
+        else:
+            self.lines.append('{} {}'.format(name, float(value)))
+
+    def render(self) -> bytes:
+        return ('\n'.join(self.lines) + '\n').encode('utf-8')
+
+
+class _MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, metrics: 'Metrics'):
+        Resource.__init__(self)
+        self.metrics = metrics
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+        return self.metrics.collect()
+
+
+@implementer(IPlugin, IModule)
+class Metrics(BotModule):
+    """
+    Serves the bot's internal counters for Prometheus to scrape, on a local port set by metrics_port.
+    """
+    def __init__(self):
+        BotModule.__init__(self)
+        self.listener = None
+
+    def help(self, query):
+        return ("Serves internal statistics (traffic, commands, handler latency, queues, web requests)"
+                " in Prometheus' format on a local port, if metrics_port is set in the config")
+
+    def onLoad(self):
+        port = self.bot.config.getWithDefault('metrics_port', 0)
+        if not port:
+            return
+        interface = self.bot.config.getWithDefault('metrics_interface', '127.0.0.1')
+        self.listener = reactor.listenTCP(port, server.Site(_MetricsResource(self)), interface=interface)
+        self.logger.info('Serving metrics on http://{}:{}/metrics'.format(interface, port))
+
+    def onUnload(self):
+        super(Metrics, self).onUnload()
+        if self.listener is not None:
+            self.listener.stopListening()
+            self.listener = None
+
+    def collect(self) -> bytes:
+        writer = _MetricWriter()
+        self._collectIRC(writer)
+        self._collectModules(writer)
+        self._collectThreads(writer)
+        self._collectStorage(writer)
+        self._collectWeb(writer)
+        return writer.render()
+
+    def _collectIRC(self, writer: _MetricWriter) -> None:
+        bot = self.bot
+        sendStats = bot.sendQueue.stats()
+
+        writer.metric('desertbot_irc_lines_received_total', 'counter', 'Lines received from the IRC server.')
+        writer.sample('desertbot_irc_lines_received_total', bot.linesReceived)
+        writer.metric('desertbot_irc_lines_sent_total', 'counter', 'Lines sent to the IRC server.')
+        writer.sample('desertbot_irc_lines_sent_total', sendStats['sentLines'])
+        writer.metric('desertbot_irc_writes_total', 'counter', 'Socket writes the sent lines were batched into.')
+        writer.sample('desertbot_irc_writes_total', sendStats['sentWrites'])
+        writer.metric('desertbot_irc_send_queue_lines', 'gauge', 'Lines waiting in the outgoing flood control queue.')
+        writer.sample('desertbot_irc_send_queue_lines', sendStats['queued'])
+        writer.metric('desertbot_irc_send_throttled_total', 'counter',
+                      'Times the outgoing queue had to wait for flood control.')
+        writer.sample('desertbot_irc_send_throttled_total', sendStats['throttled'])
+
+        writer.metric('desertbot_irc_connection_attempts', 'gauge',
+                      'Attempts to connect to the server since the last successful login.')
+        writer.sample('desertbot_irc_connection_attempts', bot.factory.connectionAttempts)
+        writer.metric('desertbot_irc_connections_lost_total', 'counter', 'Times the connection to the server was lost.')
+        writer.sample('desertbot_irc_connections_lost_total', bot.factory.connectionsLost)
+
+        writer.metric('desertbot_irc_channels', 'gauge', 'Channels the bot is in.')
+        writer.sample('desertbot_irc_channels', len(bot.channels))
+        writer.metric('desertbot_irc_users', 'gauge', 'Users the bot can see.')
+        writer.sample('desertbot_irc_users', len(bot.users))
+
+    def _collectModules(self, writer: _MetricWriter) -> None:
+        moduleHandler = self.bot.moduleHandler
+
+        with moduleHandler.commandCountsLock:
+            commandCounts = dict(moduleHandler.commandCounts)
+        writer.metric('desertbot_commands_total', 'counter', 'Commands used, by trigger.')
+        for trigger, count in sorted(commandCounts.items()):
+            writer.sample('desertbot_commands_total', count, {'trigger': trigger})
+        writer.metric('desertbot_commands_rate_limited_total', 'counter',
+                      'Commands turned away for being used too quickly.')
+        writer.sample('desertbot_commands_rate_limited_total', moduleHandler.rateLimiter.limited)
+
+        if moduleHandler.handlerStats is not None:
+            writer.metric('desertbot_handler_latency_seconds', 'summary',
+                          'Time spent in module action handlers, quantiles over the last one to two stats windows.')
+            for handler in moduleHandler.handlerStats.summary():
+                labels = {'action': handler['action'], 'module': handler['module']}
+                for quantile in ('p50', 'p95', 'p99'):
+                    writer.sample('desertbot_handler_latency_seconds', handler[quantile],
+                                  dict(labels, quantile='0.{}'.format(quantile[1:])))
+                writer.sample('desertbot_handler_latency_seconds_count', handler['calls'], labels)
+                writer.sample('desertbot_handler_latency_seconds_sum', handler['seconds'], labels)
+
+    def _collectThreads(self, writer: _MetricWriter) -> None:
+        dispatchStats = self.bot.moduleHandler.dispatcher.stats()
+        writer.metric('desertbot_dispatch_queued_jobs', 'gauge', 'Messages waiting for a dispatch worker.')
+        writer.sample('desertbot_dispatch_queued_jobs', dispatchStats['queued'])
+        writer.metric('desertbot_dispatch_jobs_total', 'counter', 'Messages given to the dispatch pool, by outcome.')
+        for outcome in ('dispatched', 'dropped', 'rejected'):
+            writer.sample('desertbot_dispatch_jobs_total', dispatchStats[outcome], {'outcome': outcome})
+        writer.metric('desertbot_dispatch_wait_seconds_max', 'gauge', 'Longest a message has waited for a worker.')
+        writer.sample('desertbot_dispatch_wait_seconds_max', dispatchStats['maxWait'])
+        writer.metric('desertbot_dispatch_timeouts_total', 'counter',
+                      'Handlers (or their responses) the watchdog gave up waiting on.')
+        writer.sample('desertbot_dispatch_timeouts_total', dispatchStats['overruns'])
+        writer.metric('desertbot_dispatch_abandoned_jobs', 'gauge',
+                      'Jobs the watchdog gave up on that are still holding a thread.')
+        writer.sample('desertbot_dispatch_abandoned_jobs', dispatchStats['abandoned'])
+
+        reactorPool = reactor.getThreadPool()
+        # only what ThreadPool makes public, guarded in case a Twisted release drops it
+        reactorQueue = getattr(reactorPool, 'q', None)
+        pools = [('dispatch', dispatchStats['busy'], dispatchStats['workers'], dispatchStats['queued']),
+                 ('reactor', len(getattr(reactorPool, 'working', ())), reactorPool.max,
+                  reactorQueue.qsize() if reactorQueue is not None else 0)]
+        writer.metric('desertbot_threadpool_busy_threads', 'gauge', 'Threads currently running a job.')
+        for name, busy, _, _ in pools:
+            writer.sample('desertbot_threadpool_busy_threads', busy, {'pool': name})
+        writer.metric('desertbot_threadpool_max_threads', 'gauge', 'Most threads the pool will run at once.')
+        for name, _, maxThreads, _ in pools:
+            writer.sample('desertbot_threadpool_max_threads', maxThreads, {'pool': name})
+        writer.metric('desertbot_threadpool_queued_jobs', 'gauge', 'Jobs waiting for a free thread.')
+        for name, _, _, queued in pools:
+            writer.sample('desertbot_threadpool_queued_jobs', queued, {'pool': name})
+
+    def _collectStorage(self, writer: _MetricWriter) -> None:
+        writer.metric('desertbot_datastore_save_seconds', 'summary', 'Time spent writing module data to disk.')
+        for name, module in sorted(self.bot.moduleHandler.modules.items()):
+            if module.storage is None:
+                continue
+            writer.sample('desertbot_datastore_save_seconds_count', module.storage.saveCount, {'module': name})
+            writer.sample('desertbot_datastore_save_seconds_sum', module.storage.saveSeconds, {'module': name})
+        writer.metric('desertbot_datastore_unsaved', 'gauge', 'Whether a module has data changes not yet written to disk.')
+        for name, module in sorted(self.bot.moduleHandler.modules.items()):
+            if module.storage is not None:
+                writer.sample('desertbot_datastore_unsaved', module.storage.dirty, {'module': name})
+
+        persistenceStats = self.bot.moduleHandler.persistence.stats()
+        writer.metric('desertbot_persistence_flush_seconds', 'summary',
+                      'Time taken to write each batch of data stores with unsaved changes.')
+        for quantile in ('p50', 'p95', 'p99'):
+            writer.sample('desertbot_persistence_flush_seconds', persistenceStats[quantile],
+                          {'quantile': '0.{}'.format(quantile[1:])})
+        writer.sample('desertbot_persistence_flush_seconds_count', persistenceStats['flushes'])
+        writer.sample('desertbot_persistence_flush_seconds_sum', persistenceStats['seconds'])
+        writer.metric('desertbot_persistence_stores_written_total', 'counter', 'Data stores written to disk.')
+        writer.sample('desertbot_persistence_stores_written_total', persistenceStats['written'])
+        writer.metric('desertbot_persistence_failures_total', 'counter', 'Data stores that failed to save.')
+        writer.sample('desertbot_persistence_failures_total', persistenceStats['failures'])
+        writer.metric('desertbot_persistence_dirty_stores', 'gauge', 'Data stores waiting to be written.')
+        writer.sample('desertbot_persistence_dirty_stores', persistenceStats['dirty'])
+
+    def _collectWeb(self, writer: _MetricWriter) -> None:
+        webUtils = self.bot.moduleHandler.modules.get('WebUtils')
+        if webUtils is None:
+            return
+        requestTimes = webUtils.requestTimes()
+        writer.metric('desertbot_http_request_seconds', 'summary', 'Time taken by outgoing web requests, by host.')
+        for host, (count, total) in sorted(requestTimes.items(), key=lambda item: str(item[0])):
+            writer.sample('desertbot_http_request_seconds_count', count, {'host': host})
+            writer.sample('desertbot_http_request_seconds_sum', total, {'host': host})
+
+
+metrics = Metrics()
@@ -10,11 +10,10 @@ import re
 from collections import OrderedDict
 from typing import List
 
-from croniter import croniter
 # from pytimeparse.timeparse import timeparse
 from ruamel.yaml import YAML, yaml_object
 from twisted.internet import reactor
-from twisted.internet import task
+from twisted.internet import task, threads
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -26,7 +25,9 @@ from desertbot.response import IRCResponse
 from desertbot.user import IRCUser
 
 # from desertbot.utils import string
+from desertbot.utils.lazyimport import lazyImport
 
+croniter = lazyImport('croniter')
 yaml = YAML()
 
 
@@ -71,7 +72,7 @@ class Task(object):
             'cron': self.timeStr
         }[self.type]
 
-        self.cron = croniter(self.cronStr, datetime.datetime.utcnow())
+        self.cron = croniter.croniter(self.cronStr, datetime.datetime.utcnow())
         self.nextTime = self.cron.get_next(datetime.datetime)
 
     def start(self):
@@ -93,7 +94,8 @@ class Task(object):
 
         trigger = self.bot.moduleHandler.mappedTriggers[self.command].execute
 
-        return trigger(message)
+        # commands expect to run on a worker thread, like they do when triggered from chat
+        return threads.deferToThread(trigger, message)
 
     def cycle(self, response):
         if not isinstance(response, list):
@@ -6,7 +6,6 @@ Created on Aug 31, 2015
 import re
 from html import unescape
 
-from bs4 import BeautifulSoup
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -14,6 +13,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -44,7 +46,7 @@ class Slurp(BotCommand):
             response = self.bot.moduleHandler.runActionUntilValue('fetch-url', url)
             if not response:
                 return IRCResponse("Problem fetching {}".format(url), message.replyTo)
-            soup = BeautifulSoup(response.content, 'lxml')
+            soup = bs4.BeautifulSoup(response.content, 'lxml')
 
         if prop.endswith("list"):
             tags = soup.select(selector)
@@ -94,7 +94,7 @@ class Sub(BotCommand):
             # Execute the constructed message
             if inputMessage.command.lower() in self.bot.moduleHandler.mappedTriggers:
                 module = self.bot.moduleHandler.mappedTriggers[inputMessage.command.lower()]
-                response = module.execute(inputMessage)
+                response = self.bot.moduleHandler.waitForResult(module.execute(inputMessage))
                 """@type : IRCResponse"""
             else:
                 return IRCResponse("'{}' is not a recognized command trigger"
@@ -2,7 +2,6 @@ import re
 from collections import OrderedDict
 from typing import List
 
-from bs4 import UnicodeDammit
 from twisted.plugin import IPlugin
 from zope.interface import implementer
 
@@ -10,6 +9,9 @@ from desertbot.message import IRCMessage
 from desertbot.moduleinterface import IModule
 from desertbot.modules.commandinterface import BotCommand, admin
 from desertbot.response import IRCResponse
+from desertbot.utils.lazyimport import lazyImport
+
+bs4 = lazyImport('bs4')
 
 
 @implementer(IPlugin, IModule)
@@ -177,7 +179,7 @@ class Trigger(BotCommand):
             return IRCResponse(f"Failed to open page at {url}", message.replyTo)
 
         text = response.content
-        text = UnicodeDammit(text).unicode_markup
+        text = bs4.UnicodeDammit(text).unicode_markup
         lines = text.splitlines()
         numTriggers = 0
         for lineNumber, line in enumerate(lines):
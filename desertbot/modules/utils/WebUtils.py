@@ -8,17 +8,31 @@ import ipaddress
 import json
 import re
 import socket
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
 import requests
-from apiclient.discovery import build
-from bs4 import BeautifulSoup
 from requests import Response
+from twisted.internet import defer, reactor, threads
+from twisted.internet.defer import Deferred
 from twisted.plugin import IPlugin
+from twisted.python.threadable import isInIOThread
 from zope.interface import implementer
 
 from desertbot.moduleinterface import IModule, BotModule
+from desertbot.utils.lazyimport import lazyImport
+from desertbot.utils.webclient import HTTPClient
+
+bs4 = lazyImport('bs4')
+discovery = lazyImport('apiclient.discovery')
+
+# Make sure we don't download any unwanted things
+_fetchableTypes = re.compile(r"^("
+                             r"text/.*|"  # text
+                             r"application/((rss|atom|rdf)\+)?xml(;.*)?|"  # rss/xml
+                             r"application/(.*)json(;.*)?"  # json
+                             r")$")
 
 
 @implementer(IPlugin, IModule)
@@ -27,6 +41,9 @@ class WebUtils(BotModule):
         return super(WebUtils, self).actions() + [('is-public-url', 1, self.isPublicURL),
                                                   ('fetch-url', 1, self.fetchURL),
                                                   ('post-url', 1, self.postURL),
+                                                  ('is-public-url-async', 1, self.isPublicURLAsync),
+                                                  ('fetch-url-async', 1, self.fetchURLAsync),
+                                                  ('post-url-async', 1, self.postURLAsync),
                                                   ('get-html-title', 1, self.getPageTitle),
                                                   ('shorten-url', 1, self.shortenURL),
                                                   ('search-web', 1, self.googleSearch),
@@ -41,46 +58,78 @@ class WebUtils(BotModule):
                        "application/json")
         self.lang = "en-US"
 
+        # host -> (request count, total seconds), for requests made with the 'requests' backend
+        self.hostTimes = {}
+        self.hostTimesLock = threading.Lock()
+
+        # the 'twisted' backend makes requests without blocking a thread per request,
+        # over persistent per-host connection pools
+        self.backend = self.bot.config.getWithDefault('web_backend', 'requests')
+        self.httpClient = None
+        if self.backend == 'twisted':
+            self.httpClient = HTTPClient(timeout=10,
+                                         maxBodySize=self.bot.config.getWithDefault('web_max_body_size',
+                                                                                    5 * 1024 * 1024),
+                                         maxPersistentPerHost=self.bot.config.getWithDefault('web_pool_size', 4))
+
+    def onUnload(self):
+        super(WebUtils, self).onUnload()
+        if self.httpClient:
+            self.httpClient.close()
+
+    # is-public-url, fetch-url and post-url always return their result directly, blocking until it's ready.
+    # On a worker thread with the 'twisted' backend, they wait on the reactor to make the request.
+    # On the reactor thread, or before the reactor is running (eg: during startup), they always use requests.
+    # The -async versions return a Deferred instead, for callers on the reactor thread that can wait on one
+    # (eg: coroutine commands). With the 'requests' backend they make the request on a worker thread.
+
     def isPublicURL(self, url: str) -> bool:
+        if self.httpClient and reactor.running and not isInIOThread():
+            return threads.blockingCallFromThread(reactor, self.isPublicURLAsync, url)
+
         parsed = urlparse(url)
         host = socket.gethostbyname(parsed.hostname)
         ip = ipaddress.ip_address(host)
         return ip.is_global
 
+    def isPublicURLAsync(self, url: str) -> Deferred:
+        if not isInIOThread():
+            return defer.maybeDeferred(self.isPublicURL, url)
+        if self.httpClient:
+            return defer.ensureDeferred(self._isPublicURLAsync(url))
+        return threads.deferToThread(self.isPublicURL, url)
+
+    async def _isPublicURLAsync(self, url: str) -> bool:
+        parsed = urlparse(url)
+        host = await reactor.resolve(parsed.hostname)
+        ip = ipaddress.ip_address(host)
+        return ip.is_global
+
     def fetchURL(self, url: str,
                  params: Any=None,
                  extraHeaders: Optional[Dict[str, str]]=None,
                  handleErrors: bool=True) -> Optional[Response]:
+        if self.httpClient and reactor.running and not isInIOThread():
+            return threads.blockingCallFromThread(reactor, self.fetchURLAsync, url, params, extraHeaders,
+                                                  handleErrors)
+
         # check the requested url is public
         if not self.isPublicURL(url):
             self.logger.info(f'non-public url {url} ignored')
             return
 
-        headers = {
-            "User-agent": self.ua, 
-            "Accept": self.accept, 
-            "Accept-Language": self.lang,
-            "Cache-Control": "no-cache"
-        }
-        # Make sure we don't download any unwanted things
-        check = (r"^("
-                 r"text/.*|"  # text
-                 r"application/((rss|atom|rdf)\+)?xml(;.*)?|"  # rss/xml
-                 r"application/(.*)json(;.*)?"  # json
-                 r")$")
-        check = re.compile(check)
-        if extraHeaders:
-            headers.update(extraHeaders)
+        headers = self._fetchHeaders(extraHeaders)
         try:
             response = requests.get(url, params=params, headers=headers, timeout=10)
-            self.logger.debug(f"Request: {response.request.url}")
-            self.logger.debug(f"Response: {response.content}")
+            self._recordTime(url, response.elapsed.total_seconds())
+            self.logger.debug("Request: %s", response.request.url)
+            self.logger.debug("Response: %s", response.content)
             if 'content-type' in response.headers:
                 pageType = response.headers["content-type"]
             else:
                 pageType = 'text/nothing'
 
-            if check.match(pageType):
+            if _fetchableTypes.match(pageType):
                 return response
             else:
                 response.close()
@@ -90,12 +139,78 @@ class WebUtils(BotModule):
             if not handleErrors:
                 raise e
 
+    def fetchURLAsync(self, url: str,
+                      params: Any=None,
+                      extraHeaders: Optional[Dict[str, str]]=None,
+                      handleErrors: bool=True) -> Deferred:
+        if not isInIOThread():
+            return defer.maybeDeferred(self.fetchURL, url, params, extraHeaders, handleErrors)
+        if self.httpClient:
+            return defer.ensureDeferred(self._fetchURLAsync(url, params, extraHeaders, handleErrors))
+        return threads.deferToThread(self.fetchURL, url, params, extraHeaders, handleErrors)
+
+    async def _fetchURLAsync(self, url: str,
+                             params: Any,
+                             extraHeaders: Optional[Dict[str, str]],
+                             handleErrors: bool) -> Optional[Response]:
+        # check the requested url is public
+        if not await self._isPublicURLAsync(url):
+            self.logger.info(f'non-public url {url} ignored')
+            return
+
+        headers = self._fetchHeaders(extraHeaders)
+        try:
+            response = await self.httpClient.request('GET', url, params=params, headers=headers,
+                                                     accept=_fetchableTypes.match)
+        except requests.exceptions.RequestException as e:
+            self.logger.exception("GET from {!r} failed!".format(url))
+            if not handleErrors:
+                raise e
+            return
+
+        if response is not None:
+            self.logger.debug("Request: %s", response.request.url)
+            self.logger.debug("Response: %s", response.content)
+        return response
+
+    def _recordTime(self, url: str, elapsed: float) -> None:
+        host = urlparse(url).hostname
+        with self.hostTimesLock:
+            count, total = self.hostTimes.get(host, (0, 0.0))
+            self.hostTimes[host] = (count + 1, total + elapsed)
+
+    def requestTimes(self) -> Dict[str, Tuple[int, float]]:
+        """
+        Returns host -> (request count, total seconds) for every host requested so far, with either backend.
+        """
+        with self.hostTimesLock:
+            times = dict(self.hostTimes)
+        if self.httpClient:
+            for host, (count, total) in self.httpClient.hostTimes.items():
+                previousCount, previousTotal = times.get(host, (0, 0.0))
+                times[host] = (previousCount + count, previousTotal + total)
+        return times
+
+    def _fetchHeaders(self, extraHeaders: Optional[Dict[str, str]]) -> Dict[str, str]:
+        headers = {
+            "User-agent": self.ua,
+            "Accept": self.accept,
+            "Accept-Language": self.lang,
+            "Cache-Control": "no-cache"
+        }
+        if extraHeaders:
+            headers.update(extraHeaders)
+        return headers
+
     # mostly taken directly from Heufneutje's PyHeufyBot
     # https://github.com/Heufneutje/PyHeufyBot/blob/eb10b5218cd6b9247998d8795d93b8cd0af45024/pyheufybot/utils/webutils.py#L43
     def postURL(self, url: str,
                 data: Any=None,
                 json: Any=None,
                 extraHeaders: Optional[Dict[str, str]]=None) -> Optional[Response]:
+        if self.httpClient and reactor.running and not isInIOThread():
+            return threads.blockingCallFromThread(reactor, self.postURLAsync, url, data, json, extraHeaders)
+
         # check the requested url is public
         if not self.isPublicURL(url):
             self.logger.info(f'non-public url {url} ignored')
@@ -107,12 +222,41 @@ class WebUtils(BotModule):
 
         try:
             response = requests.post(url, data=data, json=json, headers=headers, timeout=10)
+            self._recordTime(url, response.elapsed.total_seconds())
 
             return response
 
         except requests.exceptions.RequestException:
             self.logger.exception("POST to {!r} failed!".format(url))
 
+    def postURLAsync(self, url: str,
+                     data: Any=None,
+                     json: Any=None,
+                     extraHeaders: Optional[Dict[str, str]]=None) -> Deferred:
+        if not isInIOThread():
+            return defer.maybeDeferred(self.postURL, url, data, json, extraHeaders)
+        if self.httpClient:
+            return defer.ensureDeferred(self._postURLAsync(url, data, json, extraHeaders))
+        return threads.deferToThread(self.postURL, url, data, json, extraHeaders)
+
+    async def _postURLAsync(self, url: str,
+                            data: Any,
+                            json: Any,
+                            extraHeaders: Optional[Dict[str, str]]) -> Optional[Response]:
+        # check the requested url is public
+        if not await self._isPublicURLAsync(url):
+            self.logger.info(f'non-public url {url} ignored')
+            return
+
+        headers = {"User-agent": self.ua, "Accept": self.accept}
+        if extraHeaders:
+            headers.update(extraHeaders)
+
+        try:
+            return await self.httpClient.request('POST', url, data=data, json=json, headers=headers)
+        except requests.exceptions.RequestException:
+            self.logger.exception("POST to {!r} failed!".format(url))
+
     def getPageTitle(self, webpage: str) -> Optional[str]:
         def cleanTitle(title: str) -> str:
             title = re.sub('[\r\n]+', '', title)  # strip any newlines
@@ -126,7 +270,7 @@ class WebUtils(BotModule):
 
             return title
 
-        soup = BeautifulSoup(webpage, 'lxml')
+        soup = bs4.BeautifulSoup(webpage, 'lxml')
         # look for an h1 inside an article tag first, this should be the actual title on the page
         article = soup.find('article')
         if article:
@@ -166,7 +310,7 @@ class WebUtils(BotModule):
         if not googleKey:
             return None
 
-        service = build('customsearch', 'v1', developerKey=googleKey)
+        service = discovery.build('customsearch', 'v1', developerKey=googleKey)
         res = service.cse().list(
             q=query,
             cx='002603151577378558984:xiv3qbttad0'
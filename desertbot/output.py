@@ -1,4 +1,7 @@
-from typing import TYPE_CHECKING
+from typing import List, TYPE_CHECKING
+
+from desertbot.support import whoxFields, whoxToken
+from desertbot.utils.string import splitMessage
 
 if TYPE_CHECKING:
     from desertbot.desertbot import DesertBot
@@ -43,7 +46,8 @@ class OutputHandler(object):
         self.bot.sendMessage("NICK", nick)
 
     def cmdNOTICE(self, target: str, message: str) -> None:
-        self.bot.sendMessage("NOTICE", target, message)
+        for line in self.splitMessage("NOTICE", target, message):
+            self.bot.sendMessage("NOTICE", target, line)
 
     def cmdPART(self, channel: str, reason: str = "") -> None:
         self.bot.sendMessage("PART", channel, reason)
@@ -55,7 +59,8 @@ class OutputHandler(object):
         self.bot.sendMessage("PING", message)
 
     def cmdPRIVMSG(self, target: str, message: str) -> None:
-        self.bot.sendMessage("PRIVMSG", target, message)
+        for line in self.splitMessage("PRIVMSG", target, message):
+            self.bot.sendMessage("PRIVMSG", target, line)
 
     def cmdPONG(self, message: str) -> None:
         self.bot.sendMessage("PONG", message)
@@ -74,8 +79,27 @@ class OutputHandler(object):
     def cmdWHO(self, mask: str) -> None:
         if not mask:
             mask = "*"
-        self.bot.sendMessage("WHO", mask)
+        if "WHOX" in self.bot.supportHelper.rawTokens:
+            # WHOX replies also give us account names
+            self.bot.sendMessage("WHO", mask, "%{},{}".format(whoxFields, whoxToken))
+        else:
+            self.bot.sendMessage("WHO", mask)
 
     def ctcpACTION(self, target: str, action: str) -> None:
         # We're keeping most CTCP stuff out of the core, but actions are used a lot and don't really belong in CTCP.
-        self.cmdPRIVMSG(target, "\x01ACTION {}\x01".format(action))
+        for line in self.splitMessage("PRIVMSG", target, action, len("\x01ACTION \x01")):
+            self.bot.sendMessage("PRIVMSG", target, "\x01ACTION {}\x01".format(line))
+
+    def splitMessage(self, command: str, target: str, message: str, overhead: int = 0) -> List[str]:
+        """
+        Splits a message into as many lines as it takes to get it to the target without
+        the server truncating any of it, after it adds our nick!ident@host to the front.
+        """
+        user = self.bot.users.get(self.bot.nick)
+        if user is not None and user.ident and user.host:
+            prefix = user.fullUserPrefix()
+        else:
+            # we don't know what the server thinks our ident and host are (yet), assume the longest likely
+            prefix = "{}!{}@{}".format(self.bot.nick, "x" * 10, "x" * 63)
+        lineOverhead = len(":{} {} {} :\r\n".format(prefix, command, target).encode("utf-8"))
+        return splitMessage(message, 512 - lineOverhead - overhead)
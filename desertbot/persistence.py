@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Set, Tuple, TYPE_CHECKING
+
+from twisted.internet import reactor, task, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from desertbot.datastore import DataStore, backgroundSaving, syncDirectory
+from desertbot.utils.histogram import LatencyHistogram
+
+if TYPE_CHECKING:
+    from desertbot.desertbot import DesertBot
+
+
+class PersistenceService(object):
+    """
+    Writes the modules' DataStores to disk, in place of every module saving its own on a timer.
+
+    Stores tell it when they first get unsaved changes, and once a second it checks just those for any
+    that are due to be written (see DataStore.flush), then writes them all in one batch on its own thread,
+    so encoding and writing them never holds up the reactor. With storage_fsync set, each file is synced
+    as it's written, and each directory that files were replaced in is synced once at the end of the batch
+    instead of once per file.
+    """
+    # how often the stores with unsaved changes are checked for being due
+    checkInterval = 1.0
+    # batches that take longer than this many seconds to write are logged
+    slowFlush = 1.0
+
+    def __init__(self, bot: 'DesertBot'):
+        self.bot = bot
+        self.logger = logging.getLogger('desertbot.persistence')
+        self.sync = bot.config.getWithDefault('storage_fsync', True)
+
+        self.stores: Set[DataStore] = set()
+        # stores with unsaved changes, which they add themselves to from whichever thread changed them
+        self.dirtyStores: Set[DataStore] = set()
+        self.dirtyLock = threading.Lock()
+        # stores that aren't to be written until they're resumed, set by the Storage admin command
+        self.paused: Set[DataStore] = set()
+        self.flushing = False
+
+        self.flushes = 0
+        self.storesWritten = 0
+        self.failures = 0
+        self.flushTimes = LatencyHistogram()
+
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=1, name='desertbot-persistence')
+        reactor.callWhenRunning(self.threadpool.start)
+        # anything still waiting is written before the thread pool is shut down
+        reactor.addSystemEventTrigger('before', 'shutdown', self.flushAll)
+        reactor.addSystemEventTrigger('during', 'shutdown', self.threadpool.stop)
+
+        self.checker = task.LoopingCall(self._check)
+        reactor.callWhenRunning(self.checker.start, self.checkInterval, now=False)
+
+    def register(self, store: DataStore) -> None:
+        self.stores.add(store)
+        store.onDirty = self._storeDirtied
+        if store.dirty:
+            self._storeDirtied(store)
+
+    def unregister(self, store: DataStore) -> None:
+        """
+        Stops writing the given store. Anything it hasn't saved yet is left for the caller to deal with.
+        """
+        self.stores.discard(store)
+        store.onDirty = None
+        self.paused.discard(store)
+        with self.dirtyLock:
+            self.dirtyStores.discard(store)
+
+    def pause(self, store: DataStore) -> None:
+        """
+        Stops writing the given store until it's resumed. Its changes meanwhile are kept in memory,
+        and only written by flushAll (eg: at shutdown) or by saving it directly, so a crash loses them.
+        """
+        self.paused.add(store)
+
+    def resume(self, store: DataStore) -> None:
+        self.paused.discard(store)
+
+    def _storeDirtied(self, store: DataStore) -> None:
+        with self.dirtyLock:
+            self.dirtyStores.add(store)
+
+    def _check(self) -> None:
+        # only one batch at a time, anything that comes due meanwhile goes in the next one
+        if self.flushing:
+            return
+        now = time.monotonic()
+        with self.dirtyLock:
+            # forget stores that were saved some other way, they add themselves again when they're next changed
+            self.dirtyStores = {store for store in self.dirtyStores if store.dirty}
+            due = [store for store in self.dirtyStores if store not in self.paused and store.isDue(now)]
+        if not due:
+            return
+
+        self.flushing = True
+        d = threads.deferToThreadPool(reactor, self.threadpool, self._writeInBackground, due)
+        d.addCallback(self._flushed)
+        d.addErrback(self._flushFailed)
+        d.addBoth(self._flushFinished)
+
+    def flushAll(self) -> None:
+        """
+        Writes every store with unsaved changes straight away, on the calling thread, paused ones included.
+        """
+        with self.dirtyLock:
+            stores = list(self.dirtyStores)
+        if stores:
+            self._flushed(self._write(stores))
+
+    def _writeInBackground(self, stores: List[DataStore]) -> Tuple[int, float]:
+        backgroundSaving.active = True
+        try:
+            return self._write(stores)
+        finally:
+            backgroundSaving.active = False
+
+    def _write(self, stores: List[DataStore]) -> Tuple[int, float]:
+        start = time.perf_counter()
+        written = 0
+        directories = set()
+        for store in stores:
+            # stores unregistered since the batch was put together are saved by whatever unregistered them
+            if store not in self.stores:
+                continue
+            try:
+                # a failed save marks the store dirty again, so it's retried in the next batch
+                if store.flush(force=True, sync=self.sync):
+                    written += 1
+                    directories.add(os.path.dirname(store.storagePath))
+            except Exception:
+                self.failures += 1
+                self.logger.exception('Failed to save {}'.format(store.storagePath))
+        if self.sync:
+            for directory in directories:
+                syncDirectory(directory)
+        return written, time.perf_counter() - start
+
+    def _flushed(self, result: Tuple[int, float]) -> None:
+        written, elapsed = result
+        self.flushes += 1
+        self.storesWritten += written
+        self.flushTimes.record(elapsed)
+        if elapsed >= self.slowFlush:
+            self.logger.warning('Saving {} data stores took {:.2f}s'.format(written, elapsed))
+
+    def _flushFailed(self, failure: Failure) -> None:
+        self.failures += 1
+        self.logger.error('Saving data stores failed',
+                          exc_info=(failure.type, failure.value, failure.getTracebackObject()))
+
+    def _flushFinished(self, _: Any) -> None:
+        self.flushing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self.dirtyLock:
+            dirty = len(self.dirtyStores)
+        p50, p95, p99 = self.flushTimes.percentiles(50, 95, 99)
+        return {
+            'stores': len(self.stores),
+            'dirty': dirty,
+            'paused': len(self.paused),
+            'flushes': self.flushes,
+            'written': self.storesWritten,
+            'failures': self.failures,
+            'seconds': self.flushTimes.total,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': self.flushTimes.max,
+        }
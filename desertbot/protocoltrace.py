@@ -0,0 +1,50 @@
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+
+# outgoing commands whose parameters are credentials, and shouldn't end up in a dumped trace
+_redactedCommands = {b'PASS', b'AUTHENTICATE', b'OPER'}
+_redactedTargets = {b'NICKSERV', b'NS'}
+
+
+def _redact(line: bytes) -> bytes:
+    parts = line.split(b' ', 2)
+    command = parts[0].upper()
+    if command in _redactedCommands:
+        return parts[0] + b' <redacted>'
+    if command == b'PRIVMSG' and len(parts) > 2 and parts[1].upper() in _redactedTargets:
+        return b' '.join(parts[:2]) + b' <redacted>'
+    return line
+
+
+class ProtocolTrace(object):
+    """
+    Keeps the last few raw lines received from and sent to the server, so they can be dumped when something
+    goes wrong, without having to run at DEBUG log level all the time.
+    Recording a line just appends the raw bytes to a bounded deque, the decoding and formatting is left for dump().
+    """
+    def __init__(self, size: int):
+        self.lines = deque(maxlen=size)
+
+    def received(self, data: bytes) -> None:
+        self.lines.append((time.time(), True, data))
+
+    def sent(self, data: bytes) -> None:
+        self.lines.append((time.time(), False, data))
+
+    def dump(self, count: Optional[int] = None) -> List[str]:
+        lines = list(self.lines)
+        if count is not None:
+            lines = lines[-count:] if count > 0 else []
+
+        dumped = []
+        for timestamp, incoming, data in lines:
+            data = data.rstrip(b'\r\n')
+            if not incoming:
+                data = _redact(data)
+            dumped.append('{} {} {}'.format(datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3],
+                                            '<<' if incoming else '>>',
+                                            data.decode('utf-8', 'replace')))
+        return dumped
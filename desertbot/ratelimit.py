@@ -0,0 +1,126 @@
+import logging
+import time
+from fnmatch import fnmatch
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+
+from desertbot.message import IRCMessage
+from desertbot.utils.tokenbucket import TokenBucket
+
+if TYPE_CHECKING:
+    from desertbot.desertbot import DesertBot
+
+# commands that take seconds of CPU or web requests to answer
+_defaultCosts = {'comic': 5, 'rendercomic': 5, 'allsaid': 3, 'allsaidbeforetoday': 3, 'sub': 2}
+
+
+class CommandRateLimiter(object):
+    """
+    Limits how fast commands can be used, with a token bucket per user (by account, or ident@host if they
+    aren't logged in) and another per channel. A command costs its trigger's weight from command_costs
+    (1 by default) out of both buckets, and is only let through if both can pay.
+
+    The ModuleHandler checks it on the reactor thread as messages come in, before they're queued
+    for the dispatch pool, so a flood of commands is turned away without ever tying up a worker.
+    """
+    # buckets that have refilled completely are forgotten this often, so one-off users don't pile up
+    pruneInterval = 60
+
+    def __init__(self, bot: 'DesertBot', clock: Callable[[], float] = time.monotonic):
+        self.bot = bot
+        self.logger = logging.getLogger('desertbot.ratelimit')
+        self.clock = clock
+
+        config = bot.config
+        self.userRate = config.getWithDefault('command_rate_user', 0.5)
+        self.userBurst = config.getWithDefault('command_burst_user', 5)
+        self.channelRate = config.getWithDefault('command_rate_channel', 2)
+        self.channelBurst = config.getWithDefault('command_burst_channel', 15)
+        self.costs = {trigger.lower(): cost
+                      for trigger, cost in config.getWithDefault('command_costs', _defaultCosts).items()}
+        self.exempt = config.getWithDefault('command_rate_exempt', [])
+        self.notice = config.getWithDefault('command_rate_notice', True)
+
+        self.userBuckets: Dict[str, TokenBucket] = {}
+        self.channelBuckets: Dict[str, TokenBucket] = {}
+        # users who have been told they're limited, so they're only told once until their bucket recovers
+        self.noticed = set()
+        self.lastPrune = clock()
+
+        self.limited = 0
+
+    def allow(self, message: IRCMessage) -> bool:
+        """
+        Returns whether the given message may go on to be handled, taking the cost of its command if it is one.
+        """
+        if message.user is None or not message.command:
+            return True
+        # unknown commands don't do anything, so they're not worth charging for
+        trigger = message.command.lower()
+        if trigger not in self.bot.moduleHandler.mappedTriggers:
+            return True
+
+        cost = self.costs.get(trigger, 1)
+        if cost <= 0:
+            return True
+        if self.exempt and any(fnmatch(message.user.fullUserPrefix(), mask) for mask in self.exempt):
+            return True
+
+        now = self.clock()
+        if now - self.lastPrune >= self.pruneInterval:
+            self._prune(now)
+
+        userKey = self._userKey(message)
+        userBucket = self._bucket(self.userBuckets, userKey, self.userRate, self.userBurst)
+        channelBucket = None
+        if message.channel is not None:
+            channelBucket = self._bucket(self.channelBuckets, self.bot.supportHelper.caseMapping.fold(
+                message.channel.name), self.channelRate, self.channelBurst)
+
+        # only take tokens if both buckets can pay, so a limited channel doesn't drain its users' buckets
+        if ((userBucket is not None and userBucket.tokens < cost)
+                or (channelBucket is not None and channelBucket.tokens < cost)):
+            self._reject(message, trigger, userKey, userBucket, channelBucket, cost)
+            return False
+
+        if userBucket is not None:
+            userBucket.consume(cost)
+        if channelBucket is not None:
+            channelBucket.consume(cost)
+        self.noticed.discard(userKey)
+        return True
+
+    @staticmethod
+    def _userKey(message: IRCMessage) -> str:
+        account = message.tags.get('account') or message.user.account
+        if account:
+            return 'account:{}'.format(account.lower())
+        return '{}@{}'.format(message.user.ident, message.user.host).lower()
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate: float, burst: float) -> Optional[TokenBucket]:
+        if rate <= 0:
+            return None
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst, self.clock)
+            buckets[key] = bucket
+        return bucket
+
+    def _reject(self, message: IRCMessage, trigger: str, userKey: str,
+                userBucket: Optional[TokenBucket], channelBucket: Optional[TokenBucket], cost: float) -> None:
+        self.limited += 1
+        if userKey in self.noticed:
+            return
+        self.noticed.add(userKey)
+
+        wait = max(bucket.delay(cost) for bucket in (userBucket, channelBucket) if bucket is not None)
+        self.logger.info('Rate limited {!r} from {} in {}'.format(
+            trigger, message.user.fullUserPrefix(), message.replyTo))
+        if self.notice:
+            self.bot.output.cmdNOTICE(message.user.nick, "You're using commands too quickly, "
+                                      "try again in {:.0f} seconds.".format(max(wait, 1)))
+
+    def _prune(self, now: float) -> None:
+        for buckets in (self.userBuckets, self.channelBuckets):
+            for key in [key for key, bucket in buckets.items() if bucket.tokens >= bucket.capacity]:
+                del buckets[key]
+        self.lastPrune = now
@@ -0,0 +1,189 @@
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
+
+from desertbot.utils.tokenbucket import TokenBucket
+
+if TYPE_CHECKING:
+    from desertbot.desertbot import DesertBot
+
+
+# protocol traffic that must never wait behind chat output, or the server may time us out
+_priorityCommands = {'PONG', 'PING', 'CAP', 'AUTHENTICATE', 'PASS', 'NICK', 'USER'}
+# commands whose first parameter is the target, and so get a lane of their own
+_targetedCommands = {'PRIVMSG', 'NOTICE', 'TAGMSG'}
+
+
+def _commandAndTarget(line: str) -> Tuple[str, Optional[str]]:
+    if line.startswith("@"):
+        line = line.partition(" ")[2]
+    parts = line.split(" ", 2)
+    command = parts[0].upper()
+    target = parts[1] if len(parts) > 1 else None
+    return command, target
+
+
+class SendQueue(object):
+    """
+    Sits between the bot's outgoing messages and the transport.
+
+    Lines are paid for out of a token bucket, so long multi-line responses are paced out
+    instead of getting the bot disconnected for flooding.
+    Each message target gets its own lane, and lanes take turns sending a line,
+    so one long response doesn't hold up replies everywhere else.
+    Protocol traffic (PONG, CAP, etc) skips the lanes and goes out first.
+    All the lines that are ready in the same reactor tick go out in a single write.
+    """
+    def __init__(self, bot: 'DesertBot'):
+        self.bot = bot
+        self.logger = logging.getLogger('desertbot.sendqueue')
+
+        rate = bot.config.getWithDefault('send_rate', 2)
+        burst = bot.config.getWithDefault('send_burst', 10)
+        self.penaltyBytes = bot.config.getWithDefault('send_penalty_bytes', 0)
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+
+        self.priority = deque()
+        # target -> lines waiting to be sent to it
+        self.lanes = {}
+        # lanes with lines waiting, in the order they get to send
+        self.readyLanes = deque()
+        self.queued = 0
+        self.pendingCall = None
+
+        self.sentLines = 0
+        self.sentWrites = 0
+        self.throttled = 0
+
+    def enqueue(self, line: str) -> None:
+        if not isInIOThread():
+            reactor.callFromThread(self.enqueue, line)
+            return
+
+        command, target = _commandAndTarget(line)
+        if command in _priorityCommands:
+            self.priority.append(line)
+        else:
+            lane = self.bot.supportHelper.caseMapping.fold(target) if target and command in _targetedCommands else '*'
+            if lane in self.lanes:
+                self.lanes[lane].append(line)
+            else:
+                self.lanes[lane] = deque([line])
+                self.readyLanes.append(lane)
+        self.queued += 1
+
+        if self.pendingCall is None:
+            self.pendingCall = reactor.callLater(0, self._drain)
+        elif command in _priorityCommands and self.pendingCall.getTime() > reactor.seconds():
+            # don't leave protocol traffic waiting for the throttled lanes
+            self.pendingCall.reset(0)
+
+    def _cost(self, line: bytes) -> float:
+        cost = 1
+        if self.penaltyBytes > 0:
+            cost += len(line) / self.penaltyBytes
+        # a line costing more than the bucket can ever hold would never get sent
+        return min(cost, self.bucket.capacity)
+
+    def _drain(self) -> None:
+        self.pendingCall = None
+        batch = []
+
+        while self.priority:
+            line = self._encode(self.priority.popleft())
+            if self.bucket:
+                self.bucket.consume(self._cost(line), force=True)
+            batch.append(line)
+
+        delay = 0.0
+        while self.readyLanes:
+            lane = self.readyLanes[0]
+            line = self._encode(self.lanes[lane][0])
+            if self.bucket:
+                cost = self._cost(line)
+                if not self.bucket.consume(cost):
+                    delay = self.bucket.delay(cost)
+                    break
+
+            self.readyLanes.popleft()
+            self.lanes[lane].popleft()
+            if self.lanes[lane]:
+                self.readyLanes.append(lane)
+            else:
+                del self.lanes[lane]
+            batch.append(line)
+
+        self._write(batch)
+
+        if self.readyLanes:
+            self.throttled += 1
+            self.pendingCall = reactor.callLater(delay, self._drain)
+
+    def flush(self) -> None:
+        """
+        Immediately sends everything that's queued, ignoring flood control.
+        """
+        if self.pendingCall is not None and self.pendingCall.active():
+            self.pendingCall.cancel()
+        self.pendingCall = None
+
+        batch = [self._encode(line) for line in self.priority]
+        self.priority.clear()
+        while self.readyLanes:
+            lane = self.readyLanes.popleft()
+            batch.append(self._encode(self.lanes[lane].popleft()))
+            if self.lanes[lane]:
+                self.readyLanes.append(lane)
+            else:
+                del self.lanes[lane]
+        self._write(batch)
+
+    def clear(self) -> None:
+        """
+        Throws away everything that's queued, eg: when the connection is lost.
+        """
+        if self.pendingCall is not None and self.pendingCall.active():
+            self.pendingCall.cancel()
+        self.pendingCall = None
+
+        if self.queued:
+            self.logger.info('Discarding {} unsent lines'.format(self.queued))
+        self.priority.clear()
+        self.lanes.clear()
+        self.readyLanes.clear()
+        self.queued = 0
+
+    def _write(self, batch: List[bytes]) -> None:
+        if not batch:
+            return
+        self.queued -= len(batch)
+        transport = self.bot.transport
+        if transport is None:
+            self.logger.warning('Not connected, dropped {} outgoing lines'.format(len(batch)))
+            return
+        self.sentLines += len(batch)
+        self.sentWrites += 1
+        if self.bot.protocolTrace is not None:
+            for line in batch:
+                self.bot.protocolTrace.sent(line)
+        if len(batch) == 1:
+            transport.write(batch[0])
+        else:
+            transport.writeSequence(batch)
+
+    @staticmethod
+    def _encode(line: str) -> bytes:
+        return "{}\r\n".format(line).encode("utf-8")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queued,
+            'lanes': len(self.lanes),
+            'sentLines': self.sentLines,
+            'sentWrites': self.sentWrites,
+            'throttled': self.throttled,
+            'tokens': self.bucket.tokens if self.bucket else None,
+        }
@@ -1,4 +1,10 @@
 from desertbot.ircbase import ModeType
+from desertbot.utils.casemapping import CaseMapping
+
+
+# the fields we ask for in WHOX requests, and the token that marks the replies as ours
+whoxFields = "tcuhsnfdar"
+whoxToken = "745"
 
 
 class ISupport(object):
@@ -28,3 +34,5 @@ class ISupport(object):
         }
         self.statusOrder = "ov"
         self.chanTypes = "#"
+        # until the server tells us otherwise, RFC1459 casemapping is the default
+        self.caseMapping = CaseMapping("rfc1459")
@@ -1,7 +1,14 @@
-from typing import Optional
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from desertbot.channel import IRCChannel
 
 
 class IRCUser(object):
+    # users are kept in a CaseMappedWeakValueDict on the bot, hence __weakref__
+    __slots__ = ('nick', 'ident', 'host', 'gecos', 'server', 'hops', 'isOper', 'isAway', 'awayMessage', 'account',
+                 'channels', '__weakref__')
+
     def __init__(self, nick: str, ident: Optional[str] = None, host: Optional[str] = None):
         self.nick = nick
         self.ident = ident
@@ -13,6 +20,10 @@ class IRCUser(object):
         self.isAway = False
         self.awayMessage = None
         self.account = None
+        # the channels we can see this user in, kept up to date by IRCChannel.addUser/removeUser.
+        # a tuple rather than a set, shared with every other user in the same channels (see ChannelSets),
+        # so the index costs little more than this slot. users in no channels all share the empty tuple
+        self.channels: Tuple['IRCChannel', ...] = ()
 
     def fullUserPrefix(self) -> str:
         return "{}!{}@{}".format(self.nick, self.ident, self.host)
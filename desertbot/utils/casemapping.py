@@ -0,0 +1,227 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from weakref import KeyedRef, ref
+
+
+# RFC1459 treats []\~ as the upper case versions of {}|^, strict-rfc1459 leaves out ~ and ^
+_rfc1459Table = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\~', 'abcdefghijklmnopqrstuvwxyz{}|^')
+_strictRfc1459Table = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\', 'abcdefghijklmnopqrstuvwxyz{}|')
+
+
+def _foldASCII(key: str) -> str:
+    if key.isascii():
+        foldedKey = key.lower()
+    else:
+        foldedKey = ''.join([char.lower() if char.isascii() else char for char in key])
+    # hand back the key itself if it was already folded, so it's only stored once
+    return key if foldedKey == key else foldedKey
+
+
+def _foldRFC1459(key: str) -> str:
+    # str.lower is much faster than str.translate, and nicks with []\~ in them are the exception
+    if key.isascii():
+        foldedKey = key.lower()
+        if '[' in foldedKey or ']' in foldedKey or '\\' in foldedKey or '~' in foldedKey:
+            foldedKey = foldedKey.translate(_rfc1459Table)
+    else:
+        foldedKey = key.translate(_rfc1459Table)
+    return key if foldedKey == key else foldedKey
+
+
+def _foldStrictRFC1459(key: str) -> str:
+    if key.isascii():
+        foldedKey = key.lower()
+        if '[' in foldedKey or ']' in foldedKey or '\\' in foldedKey:
+            foldedKey = foldedKey.translate(_strictRfc1459Table)
+    else:
+        foldedKey = key.translate(_strictRfc1459Table)
+    return key if foldedKey == key else foldedKey
+
+
+def _foldUnicode(key: str) -> str:
+    foldedKey = key.casefold()
+    return key if foldedKey == key else foldedKey
+
+
+_foldFunctions = {
+    'ascii': _foldASCII,
+    'rfc1459': _foldRFC1459,
+    'strict-rfc1459': _foldStrictRFC1459,
+}
+
+
+class CaseMapping(object):
+    """
+    The server's rules for which nicks and channel names are the same, as given by CASEMAPPING in ISUPPORT.
+    The bot shares one of these between all of its CaseMappedDicts, so they all follow the server's rules.
+    """
+    def __init__(self, name: str = 'rfc1459'):
+        self.name = None
+        self.version = 0
+        self.setMapping(name)
+
+    def setMapping(self, name: str) -> None:
+        name = name.lower()
+        if name == self.name:
+            return
+        self.name = name
+        self.version += 1
+
+        # rfc7613 and anything we don't know, fold as much as Unicode can
+        self.fold = _foldFunctions.get(name, _foldUnicode)
+
+    def equal(self, first: str, second: str) -> bool:
+        return self.fold(first) == self.fold(second)
+
+
+class CaseMappedDict(MutableMapping):
+    """
+    A dict with nick or channel name keys, which treats keys that only differ in case
+    (according to the server's CASEMAPPING) as the same key.
+    The key given when an item was last set is kept, and is what iterating over the dict gives back.
+    """
+    # every channel has two of these, so they're kept as small as the plain dicts they hold
+    __slots__ = ('caseMapping', '_version', '_data', '_keys')
+
+    def __init__(self, caseMapping: CaseMapping, data: Optional[Dict[str, Any]] = None):
+        self.caseMapping = caseMapping
+        self._version = caseMapping.version
+        # folded key -> value
+        self._data = {}  # type: Dict[str, Any]
+        # folded key -> original key, only for the keys that aren't already folded, which most aren't
+        self._keys = {}  # type: Dict[str, str]
+        if data:
+            self.update(data)
+
+    def _fold(self, key: str) -> str:
+        if self._version != self.caseMapping.version:
+            self._refold()
+        return self.caseMapping.fold(key)
+
+    def _refold(self) -> None:
+        # the server told us about different casemapping rules after we'd already stored things
+        items = [(self._keys.get(foldedKey, foldedKey), value) for foldedKey, value in self._data.items()]
+        self._version = self.caseMapping.version
+        self._data = {}
+        self._keys = {}
+        for key, value in items:
+            self._store(self.caseMapping.fold(key), key, value)
+
+    def _store(self, foldedKey: str, key: str, value: Any) -> None:
+        self._data[foldedKey] = value
+        if key == foldedKey:
+            self._keys.pop(foldedKey, None)
+        else:
+            self._keys[foldedKey] = key
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[self._fold(key)]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._store(self._fold(key), key, value)
+
+    def __delitem__(self, key: str) -> None:
+        foldedKey = self._fold(key)
+        del self._data[foldedKey]
+        self._keys.pop(foldedKey, None)
+
+    def __contains__(self, key: Any) -> bool:
+        return isinstance(key, str) and self._fold(key) in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._keys
+        for foldedKey in list(self._data):
+            yield keys.get(foldedKey, foldedKey)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(self._fold(key), default)
+
+    # these skip folding every key again to look its value up, unlike the MutableMapping versions.
+    # they return lists, so the dict can be changed while looping over them
+    def values(self) -> List[Any]:
+        return list(self._data.values())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        keys = self._keys
+        return [(keys.get(foldedKey, foldedKey), value) for foldedKey, value in self._data.items()]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._keys.clear()
+
+    def __repr__(self) -> str:
+        return '{}({!r})'.format(self.__class__.__name__, dict(self.items()))
+
+
+class CaseMappedWeakValueDict(CaseMappedDict):
+    """
+    A CaseMappedDict that doesn't keep its values alive, like a WeakValueDictionary.
+    Items disappear by themselves once nothing else refers to their value.
+    """
+    # the removal callback only holds a weak reference to the dict
+    __slots__ = ('_remove', '__weakref__')
+
+    def __init__(self, caseMapping: CaseMapping, data: Optional[Dict[str, Any]] = None):
+        def remove(weakValue: KeyedRef, selfRef: ref = ref(self)) -> None:
+            self = selfRef()
+            if self is not None and self._data.get(weakValue.key) is weakValue:
+                del self._data[weakValue.key]
+                self._keys.pop(weakValue.key, None)
+        self._remove = remove
+        super(CaseMappedWeakValueDict, self).__init__(caseMapping, data)
+
+    def _refold(self) -> None:
+        items = [(self._keys.get(foldedKey, foldedKey), weakValue())
+                 for foldedKey, weakValue in list(self._data.items())]
+        self._version = self.caseMapping.version
+        self._data = {}
+        self._keys = {}
+        for key, value in items:
+            if value is not None:
+                self._store(self.caseMapping.fold(key), key, value)
+
+    def _store(self, foldedKey: str, key: str, value: Any) -> None:
+        super(CaseMappedWeakValueDict, self)._store(foldedKey, key, KeyedRef(value, self._remove, foldedKey))
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._data[self._fold(key)]()
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        if not isinstance(key, str):
+            return False
+        weakValue = self._data.get(self._fold(key))
+        return weakValue is not None and weakValue() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._keys
+        for foldedKey, weakValue in list(self._data.items()):
+            if weakValue() is not None:
+                yield keys.get(foldedKey, foldedKey)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def values(self) -> List[Any]:
+        return [value for value in (weakValue() for weakValue in list(self._data.values())) if value is not None]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        keys = self._keys
+        items = []
+        for foldedKey, weakValue in list(self._data.items()):
+            value = weakValue()
+            if value is not None:
+                items.append((keys.get(foldedKey, foldedKey), value))
+        return items
+
+    def get(self, key: str, default: Any = None) -> Any:
+        weakValue = self._data.get(self._fold(key))
+        if weakValue is None:
+            return default
+        value = weakValue()
+        return default if value is None else value
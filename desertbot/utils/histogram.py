@@ -0,0 +1,64 @@
+import math
+from typing import List, Optional
+
+
+class LatencyHistogram(object):
+    """
+    Counts durations (in seconds) into logarithmic buckets, from 10µs up to a few minutes,
+    each bucket about 19% wider than the one before it.
+    Percentiles are estimated from the buckets, so they're only as precise as a bucket is wide,
+    but recording a duration is just a log and a list increment, whatever the number of samples.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    minimum = 1e-5
+    growth = 2 ** 0.25
+    bucketCount = 100
+    _logGrowth = math.log(growth)
+
+    def __init__(self):
+        self.counts = [0] * self.bucketCount
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float) -> None:
+        if duration <= self.minimum:
+            index = 0
+        else:
+            index = min(int(math.log(duration / self.minimum) / self._logGrowth) + 1, self.bucketCount - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        merged = LatencyHistogram()
+        merged.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        merged.max = max(self.max, other.max)
+        return merged
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket the given percentile falls in, or None if nothing was recorded.
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucketCount in enumerate(self.counts):
+            seen += bucketCount
+            if seen >= rank and bucketCount > 0:
+                # never report more than the slowest duration actually seen
+                return min(self.minimum * self.growth ** index, self.max)
+        return self.max
+
+    def percentiles(self, *percents: float) -> List[Optional[float]]:
+        return [self.percentile(percent) for percent in percents]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
@@ -0,0 +1,45 @@
+import importlib
+import sys
+import threading
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Stands in for a module until one of its attributes is used, then imports it for real
+    and copies the real module's attributes into itself, so later lookups cost nothing extra.
+    """
+    def __init__(self, name: str):
+        super(_LazyModule, self).__init__(name)
+        self.__dict__['_lazyLock'] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        with self.__dict__['_lazyLock']:
+            # the import system has its own per-module locks, ours just stops two threads copying at once
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, name: str):
+        # only called for attributes that aren't in our __dict__ yet, ie. before the module is loaded
+        module = self._load()
+        return getattr(module, name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazyImport(name: str) -> types.ModuleType:
+    """
+    Returns the named module, but leaves importing it until one of its attributes is first used.
+    Use it in bot modules for heavy libraries that only a few commands need,
+    so they don't slow down startup (and reloads) for everyone, eg.
+        Image = lazyImport('PIL.Image')
+    in place of
+        from PIL import Image
+    If the module has already been imported, it's returned as is.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
@@ -4,6 +4,7 @@ from collections import OrderedDict
 from datetime import timedelta
 from enum import Enum
 from html.entities import name2codepoint
+from typing import Dict, List, Optional
 
 from dateutil.parser import parse
 from twisted.words.protocols.irc import assembleFormattedText as colour, attributes as A
@@ -21,11 +22,11 @@ def isNumber(s: str) -> bool:
 
 
 # From this SO answer: http://stackoverflow.com/a/6043797/331047
-def splitUTF8(s: str, n: int) -> str:
-    """Split UTF-8 s into chunks of maximum byte length n"""
+def splitUTF8(s: bytes, n: int) -> bytes:
+    """Split UTF-8 encoded s into chunks of maximum byte length n"""
     while len(s) > n:
         k = n
-        while (ord(s[k]) & 0xc0) == 0x80:
+        while (s[k] & 0xc0) == 0x80:
             k -= 1
         yield s[:k]
         s = s[k:]
@@ -52,6 +53,95 @@ def stripFormatting(text: str) -> str:
     return format_chars.sub('', text)
 
 
+def _formattingState(text: str, state: Dict[str, Optional[str]]) -> None:
+    """
+    Updates state with the formatting that is active at the end of the provided text.
+    """
+    for match in format_chars.finditer(text):
+        code = match.group(0)
+        if code == '\x0f':
+            state.clear()
+        elif code[0] == '\x03':
+            if match.group(1):
+                fg, _, bg = match.group(1).partition(',')
+                state['fg'] = fg
+                if bg:
+                    state['bg'] = bg
+            else:
+                state.pop('fg', None)
+                state.pop('bg', None)
+        elif code in state:
+            del state[code]
+        else:
+            state[code] = None
+
+
+def _formattingCodes(state: Dict[str, Optional[str]]) -> str:
+    """
+    Returns the formatting codes that re-apply the given formatting state.
+    """
+    codes = ''
+    if 'fg' in state:
+        # always 2 digits, in case the text that follows starts with a digit
+        codes += '\x03{:02d}'.format(int(state['fg']))
+        if 'bg' in state:
+            codes += ',{:02d}'.format(int(state['bg']))
+    return codes + ''.join(code for code in state if code not in ('fg', 'bg'))
+
+
+# a colour code at the very end of some text might continue past it
+_trailingColour = re.compile(r'\x03([0-9]{0,2}(,[0-9]?)?)?$')
+
+
+def splitMessage(text: str, maxBytes: int) -> List[str]:
+    """
+    Splits text into pieces of at most maxBytes bytes when UTF-8 encoded,
+    preferring to split on spaces, and never in the middle of a character or a formatting code.
+    Formatting that is active where the text is split is re-applied at the start of the next piece.
+    """
+    if len(text.encode('utf-8')) <= maxBytes:
+        return [text]
+
+    pieces = []
+    state = {}
+    remaining = text
+    while True:
+        carry = _formattingCodes(state)
+        if carry[-1:].isdigit() and remaining.startswith(','):
+            # stop a comma at the start of the text being read as part of the colour code
+            carry += '\x02\x02'
+        if len(carry.encode('utf-8')) + 4 > maxBytes:
+            # no room to re-apply the formatting and still fit any character after it
+            carry = ''
+        budget = maxBytes - len(carry.encode('utf-8'))
+        encoded = remaining.encode('utf-8')
+        if len(encoded) <= budget:
+            pieces.append(carry + remaining)
+            break
+
+        piece = next(splitUTF8(encoded, budget)).decode('utf-8')
+        trailingColour = _trailingColour.search(piece)
+        if trailingColour and trailingColour.start() > 0:
+            piece = piece[:trailingColour.start()]
+        rest = remaining[len(piece):]
+
+        space = piece.rfind(' ')
+        if space > 0 and not rest.startswith(' '):
+            rest = piece[space + 1:] + rest
+            piece = piece[:space]
+        elif not piece:
+            # not even one character fits, send it anyway rather than looping forever
+            piece = remaining[0]
+            rest = remaining[1:]
+
+        pieces.append(carry + piece)
+        _formattingState(piece, state)
+        remaining = rest.lstrip(' ')
+        if not remaining:
+            break
+    return pieces
+
+
 class colour(Enum):
     white = 0
     black = 1
@@ -0,0 +1,45 @@
+import time
+from typing import Callable
+
+
+class TokenBucket(object):
+    """
+    A token bucket holding up to capacity tokens, refilled at rate tokens per second.
+    Taking tokens out of it is how rate limited actions are paid for.
+    """
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def consume(self, cost: float = 1, force: bool = False) -> bool:
+        """
+        Takes cost tokens out of the bucket if there are enough of them, returning whether it did.
+        With force, the tokens are always taken, leaving the bucket in debt if there weren't enough.
+        """
+        self._refill()
+        if self._tokens >= cost or force:
+            self._tokens -= cost
+            return True
+        return False
+
+    def delay(self, cost: float = 1) -> float:
+        """
+        Returns how many seconds until cost tokens will be available.
+        """
+        self._refill()
+        if self._tokens >= cost:
+            return 0.0
+        return (cost - self._tokens) / self.rate
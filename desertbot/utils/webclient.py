@@ -0,0 +1,174 @@
+import datetime
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from twisted.internet import defer, error, reactor
+from twisted.internet.protocol import Protocol
+from twisted.python.failure import Failure
+from twisted.web.client import (Agent, BrowserLikeRedirectAgent, ContentDecoderAgent, FileBodyProducer,
+                                GzipDecoder, HTTPConnectionPool, ResponseDone, ResponseFailed)
+from twisted.web.http import PotentialDataLoss
+from twisted.web.http_headers import Headers
+
+try:
+    from OpenSSL.SSL import Error as _OpenSSLError
+except ImportError:
+    _OpenSSLError = None
+
+
+class _BodyReader(Protocol):
+    """
+    Collects a response body, silently truncating it at maxSize bytes.
+    A maxSize of 0 discards the body without reading it.
+    """
+    def __init__(self, finished: defer.Deferred, maxSize: int):
+        self.finished = finished
+        self.maxSize = maxSize
+        self.chunks = []
+        self.size = 0
+        self.truncated = False
+
+    def connectionMade(self):
+        if self.maxSize == 0:
+            self._stop()
+
+    def dataReceived(self, data: bytes):
+        if self.truncated:
+            return
+        if self.maxSize is not None and self.size + len(data) > self.maxSize:
+            self.chunks.append(data[:self.maxSize - self.size])
+            self.size = self.maxSize
+            self._stop()
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def _stop(self):
+        self.truncated = True
+        self.transport.stopProducing()
+
+    def connectionLost(self, reason: Failure = ResponseDone()):
+        if self.truncated or reason.check(ResponseDone, PotentialDataLoss):
+            self.finished.callback(b''.join(self.chunks))
+        else:
+            self.finished.errback(reason)
+
+
+class HTTPClient(object):
+    """
+    A non-blocking HTTP client on top of Twisted's Agent, returning requests.Response objects
+    so callers can treat its responses the same as ones from the requests library.
+    Connections are kept alive in a persistent pool per host, so repeated lookups against
+    the same API skip the TCP and TLS setup.
+    """
+    def __init__(self, timeout: float = 10, maxBodySize: Optional[int] = None, maxPersistentPerHost: int = 2):
+        self.timeout = timeout
+        self.maxBodySize = maxBodySize
+
+        self.pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = maxPersistentPerHost
+        self.pool.retryAutomatically = True
+
+        agent = Agent(reactor, connectTimeout=timeout, pool=self.pool)
+        agent = BrowserLikeRedirectAgent(agent, redirectLimit=20)
+        self.agent = ContentDecoderAgent(agent, [(b'gzip', GzipDecoder)])
+
+        self.requestCount = 0
+        self.hostTimes = {}
+
+    def close(self) -> defer.Deferred:
+        return self.pool.closeCachedConnections()
+
+    def request(self, method: str, url: str,
+                params: Any = None,
+                data: Any = None,
+                json: Any = None,
+                headers: Optional[Dict[str, str]] = None,
+                accept: Optional[Callable[[str], bool]] = None) -> defer.Deferred:
+        """
+        Makes an HTTP request, firing with a requests.Response, or with None if accept() rejected
+        the response's content type (the body is then never downloaded).
+        Failures are raised as the matching requests.exceptions types.
+        """
+        d = defer.ensureDeferred(self._request(method, url, params, data, json, headers, accept))
+        d.addTimeout(self.timeout, reactor)
+        d.addErrback(self._translateFailure, url)
+        return d
+
+    async def _request(self, method, url, params, data, json, headers, accept) -> Optional[requests.Response]:
+        # let requests do the url/param/body encoding, so the results are identical to the blocking backend
+        prepared = requests.Request(method, url, params=params, data=data, json=json, headers=headers).prepare()
+
+        requestHeaders = Headers()
+        for name, value in prepared.headers.items():
+            if name.lower() == 'content-length':
+                continue  # the body producer provides this
+            requestHeaders.addRawHeader(name.encode('latin-1'), value.encode('latin-1'))
+
+        body = prepared.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        producer = FileBodyProducer(BytesIO(body)) if body else None
+
+        started = time.monotonic()
+        response = await self.agent.request(method.encode('ascii'), prepared.url.encode('ascii'),
+                                            requestHeaders, producer)
+
+        responseHeaders = CaseInsensitiveDict()
+        for name, values in response.headers.getAllRawHeaders():
+            responseHeaders[name.decode('latin-1')] = ', '.join(v.decode('latin-1') for v in values)
+
+        contentType = responseHeaders.get('content-type', 'text/nothing')
+        if accept is not None and not accept(contentType):
+            finished = defer.Deferred()
+            response.deliverBody(_BodyReader(finished, 0))
+            return None
+
+        finished = defer.Deferred()
+        response.deliverBody(_BodyReader(finished, self.maxBodySize))
+        content = await finished
+        elapsed = time.monotonic() - started
+
+        result = requests.Response()
+        result.status_code = response.code
+        result.reason = response.phrase.decode('latin-1')
+        result.headers = responseHeaders
+        result.url = response.request.absoluteURI.decode('utf-8')
+        result.encoding = requests.utils.get_encoding_from_headers(responseHeaders)
+        result.request = prepared
+        result.elapsed = datetime.timedelta(seconds=elapsed)
+        result._content = content
+        result._content_consumed = True
+
+        self._recordTime(prepared.url, elapsed)
+        return result
+
+    def _recordTime(self, url: str, elapsed: float) -> None:
+        self.requestCount += 1
+        host = urlparse(url).hostname
+        count, total = self.hostTimes.get(host, (0, 0.0))
+        self.hostTimes[host] = (count + 1, total + elapsed)
+
+    @staticmethod
+    def _translateFailure(failure: Failure, url: str) -> Failure:
+        if failure.check(requests.exceptions.RequestException):
+            return failure
+
+        if failure.check(defer.TimeoutError, defer.CancelledError, error.TimeoutError):
+            raise requests.exceptions.Timeout('Request to {} timed out'.format(url))
+
+        reasons = [failure]
+        if failure.check(ResponseFailed):
+            reasons = failure.value.reasons
+        for reason in reasons:
+            if _OpenSSLError is not None and reason.check(_OpenSSLError):
+                raise requests.exceptions.SSLError('TLS error connecting to {}: {}'.format(url, reason.value))
+            if reason.check(error.ConnectError, error.DNSLookupError, error.ConnectionLost):
+                raise requests.exceptions.ConnectionError('Failed to connect to {}: {}'.format(url, reason.value))
+
+        raise requests.exceptions.RequestException('Request to {} failed: {}'.format(url, failure.value))
+
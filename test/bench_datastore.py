@@ -0,0 +1,125 @@
+"""
+Benchmark for the DataStore backends.
+
+Makes an OutOfContext-style store (a list of quotes per channel) and, for each storage backend, reports
+how long it takes to load, how much memory it holds once loaded, how long a single added quote takes to save,
+and how long reading a channel's quotes takes the first time. Then checks the backends all end up with the same data.
+Run from the repository root: python test/bench_datastore.py [channels] [quotes per channel] [changes]
+"""
+import gc
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.datastore import DataStore, JournalDataStore, SQLiteDataStore, storageBackends  # noqa: E402
+
+
+def makeQuotes(channelCount, quoteCount):
+    random.seed(1)
+    words = ['lol', 'what', 'the', 'bot', 'is', 'on', 'fire', 'again', 'who', 'broke', 'it', 'not', 'me']
+    return {'#channel{}'.format(c): ['<user{}> {}'.format(random.randrange(50),
+                                                         ' '.join(random.choices(words, k=random.randint(3, 20))))
+                                     for _ in range(quoteCount)]
+            for c in range(channelCount)}
+
+
+def openStore(storeClass, dataPath):
+    return storeClass(os.path.join(dataPath, 'OutOfContext.json'), os.path.join(dataPath, 'nodefaults.json'))
+
+
+def measureLoad(storeClass, dataPath):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = openStore(storeClass, dataPath)
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, elapsed, used
+
+
+def measureChanges(store, channelCount, changeCount):
+    random.seed(2)
+    times = []
+    for change in range(changeCount):
+        start = time.perf_counter()
+        store['#channel{}'.format(random.randrange(channelCount))].append('<bench> quote {}'.format(change))
+        store.flush(force=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def measureRead(storeClass, dataPath, channelCount):
+    store = openStore(storeClass, dataPath)
+    start = time.perf_counter()
+    quotes = store['#channel{}'.format(channelCount // 2)]
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, len(quotes)
+
+
+def contents(storeClass, dataPath):
+    store = openStore(storeClass, dataPath)
+    data = json.loads(json.dumps(dict(store.items())))
+    store.close()
+    return data
+
+
+def main():
+    channelCount = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    quoteCount = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    changeCount = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    quotes = makeQuotes(channelCount, quoteCount)
+    paths = {storeClass: tempfile.mkdtemp() for storeClass in storageBackends.values()}
+    try:
+        for dataPath in paths.values():
+            with open(os.path.join(dataPath, 'OutOfContext.json'), 'w') as dataFile:
+                json.dump(quotes, dataFile, indent=4)
+        jsonSize = os.path.getsize(os.path.join(paths[DataStore], 'OutOfContext.json'))
+        print('{} channels with {} quotes each, {:.1f}MB of JSON'.format(channelCount, quoteCount,
+                                                                          jsonSize / 1024 / 1024))
+
+        # the first SQLite load imports the JSON file
+        start = time.perf_counter()
+        openStore(SQLiteDataStore, paths[SQLiteDataStore]).close()
+        print('importing the JSON file into SQLite took {:.0f}ms'.format((time.perf_counter() - start) * 1000))
+
+        for label, storeClass in storageBackends.items():
+            dataPath = paths[storeClass]
+            store, loadTime, loadBytes = measureLoad(storeClass, dataPath)
+            changeTime = measureChanges(store, channelCount, changeCount)
+            store.close()
+            readTime, _ = measureRead(storeClass, dataPath, channelCount)
+            print('{:>7}: loaded in {:7.1f}ms holding {:8.1f}KB, one added quote saved in {:7.2f}ms (median of {}),'
+                  ' first read of a channel {:.2f}ms'.format(label, loadTime * 1000, loadBytes / 1024,
+                                                            changeTime * 1000, changeCount, readTime * 1000))
+
+        # the journal has every added quote in it, which loading replays
+        journalStore = openStore(JournalDataStore, paths[JournalDataStore])
+        journalSize = os.path.getsize(journalStore.journalPath)
+        start = time.perf_counter()
+        journalStore.compact()
+        print('compacting the {:.1f}KB journal into the JSON file took {:.0f}ms'.format(
+            journalSize / 1024, (time.perf_counter() - start) * 1000))
+
+        expected = contents(DataStore, paths[DataStore])
+        for label, storeClass in storageBackends.items():
+            if contents(storeClass, paths[storeClass]) != expected:
+                print('the {} store ended up with different data than the json one'.format(label))
+                sys.exit(1)
+    finally:
+        for dataPath in paths.values():
+            shutil.rmtree(dataPath)
+
+
+if __name__ == '__main__':
+    main()
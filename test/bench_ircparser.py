@@ -0,0 +1,174 @@
+"""
+Micro-benchmark for IRCBase's line parser.
+
+Feeds every line of data/irc_corpus.txt through IRCBase.lineReceived, checks that the results
+are identical to the original txircd parser's, and reports how many lines per second each manages.
+Run from the repository root: python test/bench_ircparser.py [repeats]
+"""
+import os
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.ircbase import IRCBase  # noqa: E402
+
+
+class ReferenceIRCBase(IRCBase):
+    """
+    The parser as originally taken from txircd, kept to check the optimized one against.
+    """
+    def lineReceived(self, data):
+        for lineRaw in data.split(b"\r"):
+            line = lineRaw.decode("utf-8", "replace")
+            line = unicodedata.normalize("NFC", line)
+            command, params, prefix, tags = self._parseLine(line)
+            if command:
+                self.handleCommand(command, params, prefix, tags)
+
+    def _parseLine(self, line):
+        line = line.replace("\0", "")
+        if not line:
+            return None, None, None, None
+
+        if line[0] == "@":
+            if " " not in line:
+                return None, None, None, None
+            tagLine, line = line.split(" ", 1)
+            tags = self._parseTags(tagLine[1:])
+        else:
+            tags = {}
+
+        prefix = None
+        if line[0] == ":":
+            if " " not in line:
+                return None, None, None, None
+            prefix, line = line.split(" ", 1)
+            prefix = prefix[1:]
+
+        if " :" in line:
+            linePart, lastParam = line.split(" :", 1)
+        else:
+            linePart = line
+            lastParam = None
+        if not linePart:
+            return None, None, None, None
+
+        if " " in linePart:
+            command, paramLine = linePart.split(" ", 1)
+            params = paramLine.split(" ")
+        else:
+            command = linePart
+            params = []
+        while "" in params:
+            params.remove("")
+        if lastParam is not None:
+            params.append(lastParam)
+        return command.upper(), params, prefix, tags
+
+    def _parseTags(self, tagLine):
+        tags = {}
+        for tagval in tagLine.split(";"):
+            if not tagval:
+                continue
+            if "=" in tagval:
+                tag, escapedValue = tagval.split("=", 1)
+                escaped = False
+                valueChars = []
+                for char in escapedValue:
+                    if escaped:
+                        if char == "\\":
+                            valueChars.append("\\")
+                        elif char == ":":
+                            valueChars.append(";")
+                        elif char == "r":
+                            valueChars.append("\r")
+                        elif char == "n":
+                            valueChars.append("\n")
+                        elif char == "s":
+                            valueChars.append(" ")
+                        else:
+                            valueChars.append(char)
+                        escaped = False
+                        continue
+                    if char == "\\":
+                        escaped = True
+                        continue
+                    valueChars.append(char)
+                value = "".join(valueChars)
+            else:
+                tag = tagval
+                value = None
+            tags[tag] = value
+        return tags
+
+
+class Recorder(object):
+    def __init__(self, parserClass):
+        self.parser = parserClass()
+        self.parser.handleCommand = self.handleCommand
+        self.results = []
+
+    def handleCommand(self, command, params, prefix, tags):
+        self.results.append((command, params, prefix, tags))
+
+
+def loadCorpus():
+    corpusPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'irc_corpus.txt')
+    with open(corpusPath, 'rb') as corpusFile:
+        # LineOnlyReceiver strips the \n delimiter, but leaves the \r from \r\n for lineReceived to handle
+        return [line + b'\r' for line in corpusFile.read().split(b'\n') if line]
+
+
+def checkEquivalence(lines):
+    # also cover some malformed and edge case lines that a real server shouldn't send
+    lines = lines + [b'', b'\0', b'@', b'@tag', b'@tag ', b':prefix', b':prefix ', b' :trailing only',
+                     b'@a=b\\ :p CMD', b'@a=\\\\\\:\\s\\r\\n\\q\\;b=;c :p CMD x  y   :z ',
+                     b'cmd  a\0b  :', b'PRIVMSG #chan :caf\xc3\xa9 cafe\xcc\x81', b'\xff\xfe invalid utf-8',
+                     b'CMD a\rCMD b\r\rCMD c']
+    reference = Recorder(ReferenceIRCBase)
+    optimized = Recorder(IRCBase)
+    mismatches = 0
+    for line in lines:
+        reference.results.clear()
+        optimized.results.clear()
+        try:
+            reference.parser.lineReceived(line)
+        except IndexError:
+            # the original parser crashes on a tag section followed by nothing, skip comparing those
+            continue
+        optimized.parser.lineReceived(line)
+        if reference.results != optimized.results:
+            mismatches += 1
+            print('Mismatch for {!r}:\n  reference: {!r}\n  optimized: {!r}'
+                  .format(line, reference.results, optimized.results))
+    return mismatches
+
+
+def bench(parserClass, lines, repeats):
+    parser = parserClass()
+    parser.handleCommand = lambda command, params, prefix, tags: None
+    lineReceived = parser.lineReceived
+
+    def parseAll():
+        for line in lines:
+            lineReceived(line)
+
+    return min(timeit.repeat(parseAll, number=1, repeat=repeats))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    corpus = loadCorpus()
+
+    if checkEquivalence(corpus) > 0:
+        sys.exit(1)
+
+    referenceTime = bench(ReferenceIRCBase, corpus, repeats)
+    optimizedTime = bench(IRCBase, corpus, repeats)
+    print('{} lines, best of {} runs'.format(len(corpus), repeats))
+    print('reference: {:8.2f}ms {:10.0f} lines/s'.format(referenceTime * 1000, len(corpus) / referenceTime))
+    print('optimized: {:8.2f}ms {:10.0f} lines/s'.format(optimizedTime * 1000, len(corpus) / optimizedTime))
+    print('speedup:   {:8.2f}x'.format(referenceTime / optimizedTime))
+    sys.exit(0)
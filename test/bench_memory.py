@@ -0,0 +1,212 @@
+"""
+Memory benchmark for the user and channel tracking models.
+
+Fills several large channels the way NAMES replies do, once with the original dict-based models
+and once with the current ones, and reports the memory used per tracked user.
+Then does the same for a batch of command messages, with the original IRCMessage and the current one.
+Run from the repository root: python test/bench_memory.py [users] [channels]
+"""
+import gc
+import os
+import random
+import re
+import sys
+import tracemalloc
+from weakref import WeakValueDictionary
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.channel import ChannelSets, IRCChannel  # noqa: E402
+from desertbot.message import IRCMessage, TargetTypes  # noqa: E402
+from desertbot.support import ISupport  # noqa: E402
+from desertbot.utils.casemapping import CaseMappedWeakValueDict  # noqa: E402
+from desertbot.user import IRCUser  # noqa: E402
+
+
+class ReferenceIRCUser(object):
+    """
+    IRCUser as it was before __slots__.
+    """
+    def __init__(self, nick, ident=None, host=None):
+        self.nick = nick
+        self.ident = ident
+        self.host = host
+        self.gecos = None
+        self.server = None
+        self.hops = 0
+        self.isOper = False
+        self.isAway = False
+        self.awayMessage = None
+        self.account = None
+
+
+class ReferenceIRCChannel(object):
+    """
+    IRCChannel as it was before __slots__, without the per-channel logger.
+    """
+    def __init__(self, name, bot):
+        self.name = name
+        self.bot = bot
+        self.modes = {}
+        self.users = {}
+        self.ranks = {}
+        self.topic = None
+        self.topicSetter = None
+        self.topicTimestamp = 0
+        self.creationTime = 0
+        self.userlistComplete = True
+
+
+class ReferenceIRCMessage(object):
+    """
+    IRCMessage as it was before __slots__, parsing the command as soon as it's made.
+    """
+    def __init__(self, msgType, user, channel, message, bot, metadata=None, tags=None):
+        if metadata is None:
+            metadata = {}
+        self.metadata = metadata
+        if tags is None:
+            tags = {}
+        self.tags = tags
+
+        self.type = msgType
+        self.messageList = message.strip().split(' ')
+        self.messageString = message
+        self.user = user
+
+        self.channel = None
+        if channel is None:
+            self.replyTo = self.user.nick
+            self.targetType = TargetTypes.USER
+        else:
+            self.channel = channel
+            self.replyTo = channel.name
+            self.targetType = TargetTypes.CHANNEL
+
+        self.command = ''
+        self.parameters = ''
+        self.parameterList = []
+
+        if len(self.messageList) == 1 and self.messageList[0] == bot.commandChar:
+            self.command = ''
+        elif self.messageList[0].startswith(bot.commandChar) and self.messageList[0][:3].count(bot.commandChar) == 1:
+            self.command = self.messageList[0][len(bot.commandChar):]
+            if self.command == '':
+                self.command = self.messageList[1]
+                self.parameters = u' '.join(self.messageList[2:])
+            else:
+                self.parameters = u' '.join(self.messageList[1:])
+        elif re.match('{}[:,]?'.format(re.escape(bot.nick)), self.messageList[0], re.IGNORECASE):
+            if len(self.messageList) > 1:
+                self.command = self.messageList[1]
+                self.parameters = u' '.join(self.messageList[2:])
+        self.command = self.command.lower()
+        if self.parameters.strip():
+            self.parameterList = self.parameters.split(' ')
+
+            self.parameterList = [param for param in self.parameterList if param != '']
+
+            if len(self.parameterList) == 1 and not self.parameterList[0]:
+                self.parameterList = []
+
+
+class FakeBot(object):
+    commandChar = '!'
+    nick = 'DesertBot'
+    nickMatcher = re.compile('DesertBot[:,]?', re.IGNORECASE)
+    supportHelper = ISupport()
+
+    def __init__(self):
+        self.channelSets = ChannelSets()
+
+
+def makeNames(userCount, channelCount):
+    random.seed(1)
+    users = ['{}{}'.format(random.choice(['guest', 'viewer', 'mod', 'fan', 'bus']), i) for i in range(userCount)]
+    channels = []
+    for c in range(channelCount):
+        members = random.sample(users, k=int(userCount * random.uniform(0.3, 0.9)))
+        names = []
+        for nick in members:
+            rank = random.choices(['', 'v', 'o', 'ov', 'h'], weights=[90, 6, 2, 1, 1])[0]
+            # build the rank string one character at a time, as the NAMES handler does
+            ranks = ''
+            for char in rank:
+                ranks += char
+            names.append((nick, ranks, '~{}'.format(nick[:9]), 'user/{}'.format(nick)))
+        channels.append(('#channel{}'.format(c), names))
+    return channels
+
+
+def track(userClass, channelClass, channelNames, caseMapped):
+    bot = FakeBot()
+    if caseMapped:
+        users = CaseMappedWeakValueDict(bot.supportHelper.caseMapping)
+    else:
+        users = WeakValueDictionary()
+    channels = {}
+    for channelName, names in channelNames:
+        channel = channelClass(channelName, bot)
+        for nick, ranks, ident, host in names:
+            if nick in users:
+                user = users[nick]
+            else:
+                user = userClass(nick, ident, host)
+                users[nick] = user
+            if hasattr(channel, 'addUser'):
+                channel.addUser(user, ranks)
+            else:
+                channel.users[nick] = user
+                channel.ranks[nick] = ranks
+        channels[channelName] = channel
+    return users, channels
+
+
+def measure(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func(*args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, result
+
+
+def makeMessages(messageClass, count):
+    bot = FakeBot()
+    user = IRCUser('guest1', '~guest1', 'user/guest1')
+    channel = IRCChannel('#channel0', bot)
+    messages = [messageClass('PRIVMSG', user, channel, '!command some parameters {}'.format(i), bot)
+                for i in range(count)]
+    # parse them all as dispatching would, so lazily parsed messages are compared after parsing
+    for message in messages:
+        message.parameterList
+    return messages
+
+
+if __name__ == '__main__':
+    userCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    channelCount = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    channelNames = makeNames(userCount, channelCount)
+    memberships = sum(len(names) for _, names in channelNames)
+
+    referenceBytes, referenceState = measure(track, ReferenceIRCUser, ReferenceIRCChannel, channelNames, False)
+    referenceUsers = len(referenceState[0])
+    del referenceState
+    currentBytes, currentState = measure(track, IRCUser, IRCChannel, channelNames, True)
+    currentUsers = len(currentState[0])
+    del currentState
+
+    print('{} users in {} channels, {} channel memberships'.format(currentUsers, channelCount, memberships))
+    print('reference: {:10d} bytes, {:6.1f} bytes/user'.format(referenceBytes, referenceBytes / referenceUsers))
+    print('current:   {:10d} bytes, {:6.1f} bytes/user'.format(currentBytes, currentBytes / currentUsers))
+    print('saved:     {:9.1f}%'.format((1 - currentBytes / referenceBytes) * 100))
+
+    referenceMessageBytes, messages = measure(makeMessages, ReferenceIRCMessage, 1000)
+    del messages
+    messageBytes, messages = measure(makeMessages, IRCMessage, 1000)
+    print('IRCMessage reference: {:6.1f} bytes/message'.format(referenceMessageBytes / len(messages)))
+    print('IRCMessage current:   {:6.1f} bytes/message'.format(messageBytes / len(messages)))
+    print('saved:     {:9.1f}%'.format((1 - messageBytes / referenceMessageBytes) * 100))
+    sys.exit(0)
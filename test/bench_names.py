@@ -0,0 +1,206 @@
+"""
+Benchmark for ingesting NAMES and WHO reply bursts, as when joining a busy channel or on a netjoin.
+
+Replays a NAMES burst (353s followed by 366) and a WHO burst (352s or WHOX 354s) for a channel of
+10k users through the InputHandler, checks the resulting channel state is the same as with the
+original handlers, and reports how long each takes.
+Run from the repository root: python test/bench_names.py [users] [repeats]
+"""
+import logging
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.channel import ChannelSets, IRCChannel  # noqa: E402
+from desertbot.input import InputHandler, parseUserPrefix  # noqa: E402
+from desertbot.support import ISupport, whoxToken  # noqa: E402
+from desertbot.user import IRCUser  # noqa: E402
+from desertbot.utils.casemapping import CaseMappedDict, CaseMappedWeakValueDict  # noqa: E402
+
+
+class ReferenceInputHandler(InputHandler):
+    """
+    The NAMES and WHO handlers as they were before the burst fast path.
+    """
+    def _handleNumeric352(self, prefix, params, tags):
+        if params[5] not in self.bot.users:
+            return
+        user = self.bot.users[params[5]]
+        user.ident = params[2]
+        user.host = params[3]
+        user.server = params[4]
+        flags = list(params[6])
+        if flags.pop(0) == 'G':
+            user.isAway = True
+        if len(flags) > 0 and flags[0] == '*':
+            user.isOper = True
+            flags.pop(0)
+        if params[1] in self.bot.channels:
+            channel = self.bot.channels[params[1]]
+            channel.ranks[params[5]] = ''.join(self.bot.supportHelper.statusSymbols[status] for status in flags)
+        hopsGecos = params[7].split()
+        user.hops = int(hopsGecos[0])
+        if len(hopsGecos) > 1:
+            user.gecos = hopsGecos[1]
+        else:
+            user.gecos = 'No info'
+
+    def _handleNumeric353(self, prefix, params, tags):
+        channel = self.bot.channels[params[2]]
+        if channel.userlistComplete:
+            channel.userlistComplete = False
+            channel.clearUsers()
+        for userPrefix in params[3].split():
+            parsedPrefix = parseUserPrefix(userPrefix)
+            nick = parsedPrefix[0]
+            ranks = ''
+            while nick[0] in self.bot.supportHelper.statusSymbols:
+                ranks += self.bot.supportHelper.statusSymbols[nick[0]]
+                nick = nick[1:]
+            if nick in self.bot.users:
+                user = self.bot.users[nick]
+                user.ident = parsedPrefix[1]
+                user.host = parsedPrefix[2]
+            else:
+                user = IRCUser(nick, parsedPrefix[1], parsedPrefix[2])
+                self.bot.users[nick] = user
+            channel.addUser(user, ranks)
+
+    def _handleNumeric366(self, prefix, params, tags):
+        channel = self.bot.channels[params[1]]
+        channel.userlistComplete = True
+
+
+class FakeBot(object):
+    def __init__(self):
+        self.logger = logging.getLogger('desertbot.bench')
+        self.nick = 'DesertBot'
+        self.supportHelper = ISupport()
+        self.supportHelper.statusModes = {'q': '~', 'a': '&', 'o': '@', 'h': '%', 'v': '+'}
+        self.supportHelper.statusSymbols = {symbol: mode for mode, symbol in self.supportHelper.statusModes.items()}
+        self.supportHelper.statusOrder = 'qaohv'
+        self.users = CaseMappedWeakValueDict(self.supportHelper.caseMapping)
+        self.channels = CaseMappedDict(self.supportHelper.caseMapping)
+        self.channelSets = ChannelSets()
+        self.capabilities = {'finished': ['multi-prefix', 'userhost-in-names']}
+
+
+def makeBursts(userCount):
+    random.seed(1)
+    statusPrefixes = ['', '+', '@', '@+', '%', '~@']
+    members = []
+    for i in range(userCount):
+        nick = '{}{}'.format(random.choice(['Guest', 'viewer', 'Mod', 'fan[', 'bus|']), i)
+        status = random.choices(statusPrefixes, weights=[90, 5, 2, 1, 1, 1])[0]
+        ident = '~{}'.format(nick[:9].lower())
+        host = random.choice(['user/{}'.format(nick), '192.0.2.{}'.format(i % 250), 'irc-{}.example.net'.format(i)])
+        members.append((nick, status, ident, host))
+
+    # as many names as fit in a 512 byte line, like a server would send
+    namesLines = []
+    line = []
+    lineLength = 0
+    for nick, status, ident, host in members:
+        name = '{}{}!{}@{}'.format(status, nick, ident, host)
+        if lineLength + len(name) > 400:
+            namesLines.append(['DesertBot', '=', '#busy', ' '.join(line)])
+            line = []
+            lineLength = 0
+        line.append(name)
+        lineLength += len(name) + 1
+    namesLines.append(['DesertBot', '=', '#busy', ' '.join(line)])
+
+    whoLines = []
+    whoxLines = []
+    for nick, status, ident, host in members:
+        flags = '{}{}'.format(random.choice('HHHG'), status)
+        whoLines.append(['DesertBot', '#busy', ident, host, 'irc.example.net', nick, flags,
+                         '0 {} real name'.format(nick)])
+        whoxLines.append(['DesertBot', whoxToken, '#busy', ident, host, 'irc.example.net', nick, flags, '0',
+                          random.choice(['0', nick.lower()]), '{} real name'.format(nick)])
+    return members, namesLines, whoLines, whoxLines
+
+
+def newHandler(handlerClass):
+    bot = FakeBot()
+    bot.channels['#busy'] = IRCChannel('#busy', bot)
+    return handlerClass(bot)
+
+
+def replayNames(handler, namesLines):
+    for params in namesLines:
+        handler._handleNumeric353(None, params, {})
+    handler._handleNumeric366(None, ['DesertBot', '#busy', 'End of /NAMES list.'], {})
+
+
+def replayWho(handler, whoLines, numeric):
+    handleWho = getattr(handler, '_handleNumeric{}'.format(numeric))
+    for params in whoLines:
+        handleWho(None, params, {})
+
+
+def channelRanks(handler):
+    return dict(handler.bot.channels['#busy'].ranks.items())
+
+
+def checkUsers(handler, members):
+    # the original handlers got the ident wrong for names with an @ status prefix, so these are only
+    # checked against what was sent
+    users = handler.bot.channels['#busy'].users
+    return len(users) == len(members) and all(users[nick].ident == ident and users[nick].host == host
+                                              for nick, _, ident, host in members)
+
+
+def bench(handlerClass, namesLines, whoLines, numeric, repeats):
+    handler = newHandler(handlerClass)
+    namesTime = min(timeit.repeat(lambda: replayNames(handler, namesLines), number=1, repeat=repeats))
+    whoTime = min(timeit.repeat(lambda: replayWho(handler, whoLines, numeric), number=1, repeat=repeats))
+    return namesTime, whoTime
+
+
+if __name__ == '__main__':
+    userCount = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    members, namesLines, whoLines, whoxLines = makeBursts(userCount)
+
+    reference = newHandler(ReferenceInputHandler)
+    optimized = newHandler(InputHandler)
+    whox = newHandler(InputHandler)
+    replayNames(reference, namesLines)
+    replayNames(optimized, namesLines)
+    replayNames(whox, namesLines)
+    if channelRanks(reference) != channelRanks(optimized) or not checkUsers(optimized, members):
+        print('Channel state after NAMES differs from the reference handlers')
+        sys.exit(1)
+    replayWho(reference, whoLines, 352)
+    replayWho(optimized, whoLines, 352)
+    replayWho(whox, whoxLines, 354)
+    if channelRanks(reference) != channelRanks(optimized) or not checkUsers(optimized, members):
+        print('Channel state after WHO differs from the reference handlers')
+        sys.exit(1)
+    if channelRanks(whox) != channelRanks(optimized) or not checkUsers(whox, members):
+        print('Channel state after WHOX differs from WHO')
+        sys.exit(1)
+    # a WHO reply for someone who isn't in the channel (eg: they left while it was on its way) only updates the user
+    outsider = IRCUser('outsider', '~outsider', 'old.example.net')
+    optimized.bot.users[outsider.nick] = outsider
+    replayWho(optimized, [['DesertBot', '#busy', '~outsider', 'new.example.net', 'irc.example.net', 'outsider', 'H@',
+                           '0 real name']], 352)
+    if outsider.host != 'new.example.net' or 'outsider' in optimized.bot.channels['#busy'].users \
+            or 'outsider' in optimized.bot.channels['#busy'].ranks or outsider.channels:
+        print('A WHO reply for a user outside the channel changed the channel')
+        sys.exit(1)
+
+    referenceNames, referenceWho = bench(ReferenceInputHandler, namesLines, whoLines, 352, repeats)
+    optimizedNames, optimizedWho = bench(InputHandler, namesLines, whoLines, 352, repeats)
+    _, optimizedWhox = bench(InputHandler, namesLines, whoxLines, 354, repeats)
+    print('{} users, {} NAMES lines, best of {} runs'.format(userCount, len(namesLines), repeats))
+    print('NAMES reference: {:8.2f}ms'.format(referenceNames * 1000))
+    print('NAMES optimized: {:8.2f}ms ({:.2f}x)'.format(optimizedNames * 1000, referenceNames / optimizedNames))
+    print('WHO reference:   {:8.2f}ms'.format(referenceWho * 1000))
+    print('WHO optimized:   {:8.2f}ms ({:.2f}x)'.format(optimizedWho * 1000, referenceWho / optimizedWho))
+    print('WHOX optimized:  {:8.2f}ms'.format(optimizedWhox * 1000))
+    sys.exit(0)
@@ -0,0 +1,140 @@
+"""
+Startup benchmark for the bot's modules.
+
+Imports and loads every module against a fake bot object in a fresh interpreter, once with the
+lazily imported libraries left lazy and once with them imported up front the way they used to be,
+and reports how long each took. Then runs the lazy load again under -X importtime and lists the
+slowest module imports, to show where the rest of the time goes.
+Run from the repository root: python test/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+rootDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Manhole starts an SSH server (and makes a key for it) and MediaWiki asks Wikipedia for its site info
+# when they load, neither of which is what's being measured
+_excludedModules = ['Manhole', 'MediaWiki']
+
+_loadScript = r'''
+import importlib, json, logging, os, sys, tempfile, time
+start = time.perf_counter()
+sys.path.insert(0, {rootDir!r})
+logging.disable(logging.CRITICAL)
+
+if {eager!r}:
+    # what the modules did before lazyImport, import everything as soon as the module is
+    import desertbot.utils.lazyimport
+    desertbot.utils.lazyimport.lazyImport = importlib.import_module
+
+from desertbot.config import Config
+from desertbot.modulehandler import ModuleHandler
+from desertbot.support import ISupport
+from desertbot.utils.casemapping import CaseMappedDict
+
+
+class FakeBot(object):
+    commandChar = '!'
+    nick = 'DesertBot'
+    server = 'bench'
+    protocolTrace = None
+
+    def __init__(self, dataPath):
+        configPath = os.path.join(dataPath, 'bench.yaml')
+        with open(configPath, 'w') as configFile:
+            configFile.write('server: bench\nmodules: {modules}\n')
+        self.config = Config(configPath)
+        self.config.loadConfig()
+        self.rootDir = {rootDir!r}
+        self.dataPath = dataPath
+        self.logPath = dataPath
+        self.startTime = time.time()
+        self.supportHelper = ISupport()
+        self.channels = CaseMappedDict(self.supportHelper.caseMapping)
+        self.moduleHandler = ModuleHandler(self)
+
+    def reraiseIfDebug(self, e):
+        raise e
+
+
+with tempfile.TemporaryDirectory() as dataPath:
+    bot = FakeBot(dataPath)
+    imported = time.perf_counter()
+    bot.moduleHandler.loadAll()
+    loaded = time.perf_counter()
+
+print(json.dumps({{'modules': len(bot.moduleHandler.modules), 'core': imported - start,
+                  'total': loaded - start, 'heavy': sorted(name for name in {heavy!r} if name in sys.modules)}}))
+'''
+
+# the libraries bot modules import with lazyImport.
+# bs4 is too, but mediawiki imports it whenever the MediaWiki module is imported, so it isn't checked
+_heavy = ['PIL.Image', 'apiclient.discovery', 'croniter', 'feedparser', 'jq', 'twisted.web.server']
+
+
+def runLoad(eager, extraArgs=()):
+    modules = ['all'] + ['-' + name for name in _excludedModules]
+    script = _loadScript.format(rootDir=rootDir, eager=eager, modules=json.dumps(modules), heavy=_heavy)
+    process = subprocess.run([sys.executable] + list(extraArgs) + ['-c', script], cwd=rootDir,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        print(process.stderr)
+        sys.exit(1)
+    return json.loads(process.stdout.splitlines()[-1]), process.stderr
+
+
+def slowestImports(importTimes, count):
+    """
+    Parses -X importtime output, returning the slowest top level imports made by bot modules.
+    """
+    moduleImports = []
+    stack = []
+    for line in importTimes.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        # a package is printed after everything it imported, so the parent of this line comes later
+        stack.append((depth, name, int(cumulative)))
+    for index, (depth, name, cumulative) in enumerate(stack):
+        parent = next((parentName for parentDepth, parentName, _ in stack[index + 1:] if parentDepth < depth), None)
+        if parent is not None and parent.startswith('desertbot.modules.') and not name.startswith('desertbot'):
+            moduleImports.append((cumulative, name, parent))
+    return sorted(moduleImports, reverse=True)[:count]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    results = {}
+    for eager in (True, False):
+        timings = [runLoad(eager)[0] for _ in range(runs)]
+        results[eager] = timings
+        label = 'eager' if eager else 'lazy'
+        print('{:>6}: bot core imported in {:.0f}ms, {} modules imported and loaded by {:.0f}ms (median of {}),'
+              ' heavy libraries imported: {}'
+              .format(label, statistics.median(timing['core'] for timing in timings) * 1000, timings[0]['modules'],
+                      statistics.median(timing['total'] for timing in timings) * 1000,
+                      runs, ', '.join(timings[0]['heavy']) or 'none'))
+
+    eagerTotal = statistics.median(timing['total'] for timing in results[True])
+    lazyTotal = statistics.median(timing['total'] for timing in results[False])
+    print('lazy imports save {:.0f}ms ({:.0%}) of module startup'.format(
+        (eagerTotal - lazyTotal) * 1000, (eagerTotal - lazyTotal) / eagerTotal))
+
+    _, importTimes = runLoad(False, ['-X', 'importtime'])
+    print('slowest imports still made by modules (-X importtime, cumulative):')
+    for cumulative, name, parent in slowestImports(importTimes, 10):
+        print('  {:>7.1f}ms {} (from {})'.format(cumulative / 1000, name, parent))
+
+    if results[False][0]['heavy']:
+        print('lazily imported libraries were imported at startup: {}'.format(', '.join(results[False][0]['heavy'])))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Stress test for saving DataStores while handlers change them.
+
+For each storage backend, runs several writer threads changing a store as fast as they can, the way handlers on
+the dispatch pool do, while another thread keeps saving it the way the persistence service does.
+Some writers make single changes (appending, removing, setting and deleting keys, changing nested dicts),
+others hold the store's lock to make two changes that must be saved together. After every save, the data on disk
+is read back and checked to be all there and consistent, and at the end it's checked to match what's in memory.
+Each backend is also checked to save properly when a list is changed after its key was deleted.
+Exits with 1 if any thread hits an error or any check fails.
+Run from the repository root: python test/stress_datastore.py [seconds per backend] [writers]
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.datastore import storageBackends  # noqa: E402
+
+
+def openStore(storeClass, dataPath):
+    return storeClass(os.path.join(dataPath, 'Stress.json'), os.path.join(dataPath, 'nodefaults.json'))
+
+
+def singleWriter(store, writer, stop):
+    """
+    Makes one change at a time, to its own list, dict and keys.
+    """
+    random.seed(writer)
+    entries = 'entries{}'.format(writer)
+    counters = 'counters{}'.format(writer)
+    store[entries] = []
+    store[counters] = {}
+    count = 0
+    while not stop.is_set():
+        count += 1
+        action = random.random()
+        if action < 0.4:
+            store[entries].append({'n': count, 'tags': ['a', 'b']})
+        elif action < 0.55 and store[entries] or len(store[entries]) > 500:
+            store[entries].pop(0)
+        elif action < 0.8:
+            store[counters]['c{}'.format(count % 50)] = count
+        elif action < 0.9:
+            store['scratch{}-{}'.format(writer, count % 20)] = list(range(count % 10))
+        elif 'scratch{}-{}'.format(writer, count % 20) in store:
+            del store['scratch{}-{}'.format(writer, count % 20)]
+        # handlers do other work between changes, which gives the other threads a turn
+        time.sleep(0)
+
+
+def pairedWriter(store, writer, stop):
+    """
+    Keeps a count and a list of the same length under separate keys, changing both while holding the store's lock,
+    so every save should find them matching.
+    """
+    total = 'total{}'.format(writer)
+    items = 'items{}'.format(writer)
+    with store.lock:
+        store[total] = 0
+        store[items] = []
+    while not stop.is_set():
+        with store.lock:
+            store[total] = store[total] + 1
+            store[items].append(store[total])
+            if len(store[items]) > 200:
+                del store[items][:100]
+                store[total] = len(store[items])
+        time.sleep(0)
+
+
+def checkSaved(storeClass, dataPath, pairedWriters):
+    """
+    Reads the store back from disk, returning a description of anything wrong with it.
+    """
+    saved = openStore(storeClass, dataPath)
+    try:
+        data = json.loads(json.dumps(dict(saved.items())))
+    finally:
+        saved.close()
+    for writer in pairedWriters:
+        total = data.get('total{}'.format(writer))
+        items = data.get('items{}'.format(writer))
+        if total is None and items is None:
+            continue
+        if items is None or total != len(items):
+            return 'writer {} saved a count of {} with {} items'.format(
+                writer, total, None if items is None else len(items))
+    return None
+
+
+def run(label, storeClass, seconds, writerCount):
+    dataPath = tempfile.mkdtemp()
+    errors = []
+    stop = threading.Event()
+    store = openStore(storeClass, dataPath)
+
+    def guarded(func, *args):
+        try:
+            func(*args)
+        except Exception:
+            errors.append(traceback.format_exc())
+            stop.set()
+
+    pairedWriters = list(range(writerCount // 2, writerCount))
+    threads = [threading.Thread(target=guarded, args=(singleWriter, store, writer, stop))
+               for writer in range(writerCount // 2)]
+    threads += [threading.Thread(target=guarded, args=(pairedWriter, store, writer, stop))
+                for writer in pairedWriters]
+
+    saves = 0
+    try:
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not stop.is_set():
+            try:
+                store.flush(force=True)
+            except Exception:
+                errors.append(traceback.format_exc())
+                break
+            saves += 1
+            problem = checkSaved(storeClass, dataPath, pairedWriters)
+            if problem:
+                errors.append('save {}: {}'.format(saves, problem))
+                break
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    try:
+        if not errors:
+            store.flush(force=True)
+            reloaded = openStore(storeClass, dataPath)
+            inMemory = json.loads(json.dumps(dict(store.items())))
+            onDisk = json.loads(json.dumps(dict(reloaded.items())))
+            reloaded.close()
+            if inMemory != onDisk:
+                errors.append('the data on disk after the last save is different to the data in memory')
+        store.close()
+    finally:
+        shutil.rmtree(dataPath)
+
+    print('{:>7}: {} saves in {:.0f}s with {} writers, {}'.format(
+        label, saves, seconds, writerCount, 'failed' if errors else 'ok'))
+    for error in errors:
+        print(error)
+    return not errors
+
+
+def detached(label, storeClass):
+    """
+    Changes a list read out of the store after deleting its key, which mustn't stop the other changes being saved.
+    """
+    dataPath = tempfile.mkdtemp()
+    try:
+        store = openStore(storeClass, dataPath)
+        store['a'] = [1]
+        store['b'] = 5
+        store.save()
+        old = store['a']
+        del store['a']
+        store['c'] = 6
+        store['d'] = 'new'
+        old.append(2)
+        try:
+            store.save()
+        except Exception:
+            traceback.print_exc()
+        dirty = store.dirty
+        store.close()
+        reloaded = openStore(storeClass, dataPath)
+        onDisk = json.loads(json.dumps(dict(reloaded.items())))
+        reloaded.close()
+    finally:
+        shutil.rmtree(dataPath)
+
+    ok = not dirty and onDisk == {'b': 5, 'c': 6, 'd': 'new'}
+    print('{:>7}: changing a deleted key\'s list, {}'.format(label, 'ok' if ok else 'failed'))
+    if not ok:
+        print('saved {} and left the store {}'.format(onDisk, 'dirty' if dirty else 'clean'))
+    return ok
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    writerCount = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    # switch threads more often than usual, to make the writers and the saver interleave more
+    sys.setswitchinterval(1e-4)
+
+    results = [run(label, storeClass, seconds, writerCount) for label, storeClass in storageBackends.items()]
+    results += [detached(label, storeClass) for label, storeClass in storageBackends.items()]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Tests for the command rate limiter.
+
+Runs CommandRateLimiter.allow against a fake bot with a clock the tests move forward by hand, checking bursts,
+refilling, the command cost table, exempt hostmasks, channel buckets and the one-time NOTICE.
+Run from the repository root: python test/test_ratelimit.py (or with pytest)
+"""
+import os
+import re
+import sys
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from desertbot.channel import IRCChannel  # noqa: E402
+from desertbot.message import IRCMessage  # noqa: E402
+from desertbot.ratelimit import CommandRateLimiter  # noqa: E402
+from desertbot.support import ISupport  # noqa: E402
+from desertbot.user import IRCUser  # noqa: E402
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeConfig(dict):
+    def getWithDefault(self, key, default):
+        return self.get(key, default)
+
+
+class FakeModuleHandler(object):
+    mappedTriggers = {'roll': None, 'comic': None, 'help': None, 'free': None}
+
+
+class FakeOutput(object):
+    def __init__(self):
+        self.notices = []
+
+    def cmdNOTICE(self, target, message):
+        self.notices.append((target, message))
+
+
+class FakeBot(object):
+    commandChar = '!'
+    nick = 'DesertBot'
+    nickMatcher = re.compile('DesertBot[:,]?', re.IGNORECASE)
+
+    def __init__(self, **config):
+        self.config = FakeConfig(config)
+        self.supportHelper = ISupport()
+        self.moduleHandler = FakeModuleHandler()
+        self.output = FakeOutput()
+
+
+def makeLimiter(**config):
+    # only the buckets a test is about are on, unless it turns the others on itself
+    config.setdefault('command_rate_user', 0)
+    config.setdefault('command_rate_channel', 0)
+    config.setdefault('command_costs', {'comic': 5, 'free': 0})
+    bot = FakeBot(**config)
+    clock = FakeClock()
+    return CommandRateLimiter(bot, clock), bot, clock
+
+
+def command(bot, text, nick='alice', host='alice.example.net', channel='#dev'):
+    user = IRCUser(nick, '~{}'.format(nick), host)
+    return IRCMessage('PRIVMSG', user, IRCChannel(channel, bot) if channel else None, text, bot)
+
+
+def test_burst():
+    limiter, bot, clock = makeLimiter(command_rate_user=0.5, command_burst_user=5)
+    assert all(limiter.allow(command(bot, '!roll 1d20')) for _ in range(5))
+    assert not limiter.allow(command(bot, '!roll 1d20'))
+    # other users have buckets of their own
+    assert limiter.allow(command(bot, '!roll 1d20', nick='bob', host='bob.example.net'))
+    assert limiter.limited == 1
+
+
+def test_refill():
+    limiter, bot, clock = makeLimiter(command_rate_user=0.5, command_burst_user=5)
+    for _ in range(5):
+        limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    clock.now += 1.9
+    assert not limiter.allow(command(bot, '!roll'))
+    clock.now += 0.1
+    assert limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    # a bucket never refills past its burst
+    clock.now += 3600
+    assert sum(limiter.allow(command(bot, '!roll')) for _ in range(10)) == 5
+
+
+def test_costs():
+    limiter, bot, clock = makeLimiter(command_rate_user=0.5, command_burst_user=5)
+    assert limiter.allow(command(bot, '!comic'))
+    assert not limiter.allow(command(bot, '!comic'))
+    assert not limiter.allow(command(bot, '!roll'))
+    # commands that cost nothing, unknown commands and plain chat are never limited
+    assert limiter.allow(command(bot, '!free'))
+    assert limiter.allow(command(bot, '!nosuchcommand'))
+    assert limiter.allow(command(bot, 'just chatting'))
+    clock.now += 2
+    assert limiter.allow(command(bot, '!ROLL'))
+    assert limiter.limited == 2
+
+
+def test_exempt():
+    limiter, bot, clock = makeLimiter(command_rate_user=0.5, command_burst_user=1, command_rate_channel=1,
+                                      command_burst_channel=1, command_rate_exempt=['*!*@admin.example.net'])
+    assert all(limiter.allow(command(bot, '!comic', nick='admin', host='admin.example.net')) for _ in range(20))
+    assert limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+
+
+def test_channel():
+    limiter, bot, clock = makeLimiter(command_rate_user=0.5, command_burst_user=5, command_rate_channel=2,
+                                      command_burst_channel=3)
+    nicks = ['alice', 'bob', 'carol', 'dave']
+    results = [limiter.allow(command(bot, '!roll', nick=nick, host=nick)) for nick in nicks]
+    assert results == [True, True, True, False]
+    # the limited channel didn't take dave's tokens, so he can still use commands elsewhere
+    assert all(limiter.allow(command(bot, '!roll', nick='dave', host='dave', channel=None)) for _ in range(5))
+    # channels are told apart by the server's casemapping
+    assert not limiter.allow(command(bot, '!roll', nick='erin', host='erin', channel='#DEV'))
+    assert limiter.allow(command(bot, '!roll', nick='erin', host='erin', channel='#other'))
+
+
+def test_notice():
+    limiter, bot, clock = makeLimiter(command_rate_user=1, command_burst_user=1)
+    assert limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    assert len(bot.output.notices) == 1
+    assert bot.output.notices[0][0] == 'alice'
+    # once they get a command through again, the next time they're limited they're told again
+    clock.now += 1
+    assert limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    assert len(bot.output.notices) == 2
+
+    limiter, bot, clock = makeLimiter(command_rate_user=1, command_burst_user=1, command_rate_notice=False)
+    limiter.allow(command(bot, '!roll'))
+    assert not limiter.allow(command(bot, '!roll'))
+    assert bot.output.notices == []
+
+
+def test_disabled():
+    limiter, bot, clock = makeLimiter()
+    assert all(limiter.allow(command(bot, '!comic')) for _ in range(100))
+    assert limiter.limited == 0
+
+
+if __name__ == '__main__':
+    failed = 0
+    for name, test in [(name, value) for name, value in sorted(globals().items()) if name.startswith('test_')]:
+        try:
+            test()
+        except Exception:
+            failed += 1
+            print('{} failed:'.format(name))
+            traceback.print_exc()
+    if failed:
+        sys.exit(1)
+    print('all rate limiter tests passed')